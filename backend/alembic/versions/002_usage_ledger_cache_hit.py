@@ -0,0 +1,28 @@
+"""usage ledger cache hit marker
+
+Revision ID: 002_usage_ledger_cache_hit
+Revises: 001_initial_schema
+Create Date: 2026-10-18 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "002_usage_ledger_cache_hit"
+down_revision = "001_initial_schema"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "usage_ledger",
+        sa.Column("cache_hit", sa.Boolean(), nullable=False, server_default=sa.text("false")),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("usage_ledger", "cache_hit")
@@ -0,0 +1,32 @@
+"""prompt cache tokens and session provider affinity
+
+Revision ID: 004_prompt_cache_affinity
+Revises: 003_batch_jobs
+Create Date: 2026-10-18 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "004_prompt_cache_affinity"
+down_revision = "003_batch_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "usage_ledger",
+        sa.Column("cached_input_tokens", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column("sessions", sa.Column("affinity_provider", sa.String(length=30), nullable=True))
+    op.add_column("sessions", sa.Column("affinity_model", sa.String(length=100), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("sessions", "affinity_model")
+    op.drop_column("sessions", "affinity_provider")
+    op.drop_column("usage_ledger", "cached_input_tokens")
@@ -0,0 +1,28 @@
+"""usage ledger coalesced flag
+
+Revision ID: 005_usage_ledger_coalesced
+Revises: 004_prompt_cache_affinity
+Create Date: 2026-10-18 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "005_usage_ledger_coalesced"
+down_revision = "004_prompt_cache_affinity"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "usage_ledger",
+        sa.Column("coalesced", sa.Boolean(), nullable=False, server_default=sa.text("false")),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("usage_ledger", "coalesced")
@@ -9,9 +9,13 @@ from redis.asyncio import Redis
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import get_settings
 from app.core.security import verify_token
+from app.core.tracing import tracer
 from app.db.models import User
 from app.db.session import get_session_factory
+from app.providers.factory import ProviderFactory
+from app.services.orchestrator import Orchestrator, build_orchestrator
 
 bearer_scheme = HTTPBearer(auto_error=True)
 
@@ -47,8 +51,28 @@ async def get_current_user(
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Użytkownik nie istnieje")
 
+    tracer.tag(user_id=user.id)
     return user
 
 
 async def get_redis(request: Request) -> Redis | None:
     return getattr(request.app.state, "redis", None)
+
+
+def get_provider_factory(request: Request) -> ProviderFactory:
+    factory: ProviderFactory | None = getattr(request.app.state, "provider_factory", None)
+    if factory is None:
+        factory = ProviderFactory(get_settings())
+        request.app.state.provider_factory = factory
+    return factory
+
+
+def get_orchestrator(
+    request: Request,
+    provider_factory: ProviderFactory = Depends(get_provider_factory),
+) -> Orchestrator:
+    orchestrator: Orchestrator | None = getattr(request.app.state, "orchestrator", None)
+    if orchestrator is None:
+        orchestrator = build_orchestrator(provider_factory)
+        request.app.state.orchestrator = orchestrator
+    return orchestrator
@@ -2,6 +2,7 @@ from fastapi import APIRouter
 
 from app.api.v1.routes_admin import router as admin_router
 from app.api.v1.routes_auth import router as auth_router
+from app.api.v1.routes_batch import router as batch_router
 from app.api.v1.routes_chat import router as chat_router
 from app.api.v1.routes_health import router as health_router
 from app.api.v1.routes_invite import router as invite_router
@@ -12,6 +13,7 @@ api_router = APIRouter()
 api_router.include_router(health_router)
 api_router.include_router(auth_router)
 api_router.include_router(chat_router)
+api_router.include_router(batch_router)
 api_router.include_router(usage_router)
 api_router.include_router(payments_router)
 
@@ -6,9 +6,10 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_current_user, get_db
+from app.api.deps import get_current_user, get_db, get_provider_factory
 from app.core.config import get_settings
 from app.db.models import User, UserRole
+from app.providers.factory import ProviderFactory
 from app.services.admin_service import admin_service
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -96,3 +97,12 @@ async def delete_user(
     if not deleted:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Użytkownik nie istnieje.")
     return {"success": True}
+
+
+@router.post("/providers/reload")
+async def reload_providers(
+    _: User = Depends(require_admin),
+    factory: ProviderFactory = Depends(get_provider_factory),
+) -> dict[str, list[str]]:
+    get_settings.cache_clear()
+    return await factory.reload(get_settings(), broadcast=True)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from collections.abc import AsyncIterator
+from datetime import datetime
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_current_user, get_db
+from app.api.v1.schemas import BatchItemResponse, BatchJobRequest, BatchJobResponse, BatchResultsResponse
+from app.api.v1.sse import format_sse
+from app.core.config import get_settings
+from app.core.exceptions import JarvisBaseError
+from app.db.models import BatchItem, BatchJob, User
+from app.db.session import get_session_factory
+from app.services.batch_service import TERMINAL_STATUSES, batch_service
+from app.workers.batch import enqueue_batch_job
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/batch", tags=["batch"])
+
+
+def _iso(value: datetime | None) -> str | None:
+    return value.isoformat() if value else None
+
+
+def _job_response(job: BatchJob) -> BatchJobResponse:
+    return BatchJobResponse(
+        id=str(job.id),
+        status=job.status,
+        mode=job.mode,
+        provider=job.provider_pref,
+        total=job.total,
+        completed=job.completed,
+        failed=job.failed,
+        cost_usd=float(job.cost_usd or 0),
+        error=job.error,
+        created_at=_iso(job.created_at),
+        started_at=_iso(job.started_at),
+        finished_at=_iso(job.finished_at),
+    )
+
+
+def _item_response(item: BatchItem) -> BatchItemResponse:
+    return BatchItemResponse(
+        position=item.position,
+        status=item.status,
+        prompt=item.prompt,
+        response=item.response,
+        provider=item.provider,
+        model=item.model,
+        input_tokens=item.input_tokens,
+        output_tokens=item.output_tokens,
+        cost_usd=float(item.cost_usd or 0),
+        latency_ms=item.latency_ms,
+        attempts=item.attempts,
+        error=item.error,
+    )
+
+
+async def _owned_job(job_id: str, user: User, db: AsyncSession) -> BatchJob:
+    try:
+        parsed = uuid.UUID(job_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nieprawidłowe ID zadania") from exc
+    job = await batch_service.get_job(parsed, user, db)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Nie znaleziono zadania")
+    return job
+
+
+@router.post("/jobs", response_model=BatchJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+    payload: BatchJobRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> BatchJobResponse:
+    job = await batch_service.submit(
+        user=current_user,
+        prompts=payload.prompts,
+        mode=payload.mode,
+        provider_pref=payload.provider,
+        db=db,
+    )
+    try:
+        await asyncio.to_thread(enqueue_batch_job, job.id)
+    except Exception as exc:
+        logger.exception("Nie udało się zlecić zadania wsadowego %s.", job.id)
+        await batch_service.mark_failed(job, "Kolejka zadań jest niedostępna", db)
+        raise JarvisBaseError("Kolejka zadań jest niedostępna", 503) from exc
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=BatchJobResponse)
+async def get_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> BatchJobResponse:
+    return _job_response(await _owned_job(job_id, current_user, db))
+
+
+@router.get("/jobs/{job_id}/results", response_model=BatchResultsResponse)
+async def get_results(
+    job_id: str,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> BatchResultsResponse:
+    job = await _owned_job(job_id, current_user, db)
+    items = await batch_service.list_items(job.id, offset, limit, db)
+    next_offset = offset + len(items) if offset + len(items) < job.total else None
+    return BatchResultsResponse(
+        job=_job_response(job),
+        items=[_item_response(item) for item in items],
+        next_offset=next_offset,
+    )
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=BatchJobResponse)
+async def cancel_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> BatchJobResponse:
+    job = await _owned_job(job_id, current_user, db)
+    return _job_response(await batch_service.cancel(job, db))
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> StreamingResponse:
+    job_uuid = (await _owned_job(job_id, current_user, db)).id
+    poll_seconds = get_settings().BATCH_STATUS_POLL_SECONDS
+
+    async def event_source() -> AsyncIterator[str]:
+        last: dict[str, Any] | None = None
+        while True:
+            async with get_session_factory()() as session:
+                job = await batch_service.get_job(job_uuid, current_user, session)
+            if job is None:
+                yield format_sse("error", {"type": "JarvisBaseError", "detail": "Nie znaleziono zadania"})
+                return
+            snapshot = _job_response(job).model_dump()
+            if snapshot != last:
+                last = snapshot
+                yield format_sse("done" if job.status in TERMINAL_STATUSES else "progress", snapshot)
+            if job.status in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(poll_seconds)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,16 +1,23 @@
 from __future__ import annotations
 
+import logging
 import uuid
+from collections.abc import AsyncIterator
 
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_current_user, get_db
+from app.api.deps import get_current_user, get_db, get_orchestrator, get_provider_factory
 from app.api.v1.schemas import ChatRequest, ChatResponse, ProvidersResponse
-from app.core.config import get_settings
+from app.api.v1.sse import format_sse
+from app.core.exceptions import JarvisBaseError
 from app.db.models import User
+from app.db.session import get_session_factory
 from app.providers.factory import ProviderFactory
-from app.services.orchestrator import build_orchestrator
+from app.services.orchestrator import Orchestrator
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -20,8 +27,8 @@ async def chat(
     payload: ChatRequest,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
+    orchestrator: Orchestrator = Depends(get_orchestrator),
 ) -> ChatResponse:
-    orchestrator = build_orchestrator()
     sid = uuid.UUID(payload.session_id) if payload.session_id else None
     data = await orchestrator.process_chat(
         user=current_user,
@@ -34,7 +41,40 @@ async def chat(
     return ChatResponse(**data)
 
 
+@router.post("/stream")
+async def chat_stream(
+    payload: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    orchestrator: Orchestrator = Depends(get_orchestrator),
+) -> StreamingResponse:
+    sid = uuid.UUID(payload.session_id) if payload.session_id else None
+
+    async def event_source() -> AsyncIterator[str]:
+        async with get_session_factory()() as db:
+            try:
+                events = await orchestrator.stream_chat(
+                    user=current_user,
+                    prompt=payload.prompt,
+                    session_id=sid,
+                    provider_pref=payload.provider,
+                    mode=payload.mode,
+                    db=db,
+                )
+                async for event, data in events:
+                    yield format_sse(event, data)
+            except JarvisBaseError as exc:
+                yield format_sse("error", {"type": exc.__class__.__name__, "detail": exc.detail})
+            except Exception:
+                logger.exception("Błąd podczas strumieniowania odpowiedzi czatu.")
+                yield format_sse("error", {"type": "JarvisBaseError", "detail": "Błąd strumieniowania odpowiedzi"})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/providers", response_model=ProvidersResponse)
-async def providers() -> ProvidersResponse:
-    factory = ProviderFactory(get_settings())
+async def providers(factory: ProviderFactory = Depends(get_provider_factory)) -> ProvidersResponse:
     return ProvidersResponse(providers=factory.list_available())
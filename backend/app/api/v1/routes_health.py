@@ -10,6 +10,11 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_db
+from app.core.circuit_breaker import circuit_breaker
+from app.providers.http_pool import provider_http_pool
+from app.providers.retry import provider_retry_policy
+from app.services.provider_health import provider_health_prober
+from app.services.semantic_cache import semantic_cache
 
 router = APIRouter(tags=["health"])
 
@@ -51,7 +56,9 @@ async def health_check(
     started_at: datetime = getattr(request.app.state, "started_at", datetime.now(tz=timezone.utc))
     uptime_seconds = (datetime.now(tz=timezone.utc) - started_at).total_seconds()
 
-    overall_status = "healthy" if db_status == "ok" and redis_status == "ok" else "degraded"
+    providers = provider_health_prober.results()
+    providers_ok = not providers or any(result["ok"] for result in providers.values())
+    overall_status = "healthy" if db_status == "ok" and redis_status == "ok" and providers_ok else "degraded"
 
     return {
         "status": overall_status,
@@ -59,5 +66,29 @@ async def health_check(
             "db": db_status,
             "redis": redis_status,
         },
+        "providers": {name: "ok" if result["ok"] else result["error"] for name, result in providers.items()},
         "uptime_seconds": uptime_seconds,
     }
+
+
+@router.get("/health/providers")
+async def providers_health() -> dict[str, Any]:
+    return {
+        "providers": provider_health_prober.results(),
+        "circuit_breakers": circuit_breaker.snapshot(),
+    }
+
+
+@router.get("/health/http-pool")
+async def http_pool_stats() -> dict[str, Any]:
+    return {"providers": provider_http_pool.stats()}
+
+
+@router.get("/health/retries")
+async def retry_stats() -> dict[str, Any]:
+    return {"providers": provider_retry_policy.stats()}
+
+
+@router.get("/health/cache")
+async def cache_stats() -> dict[str, Any]:
+    return {"semantic": semantic_cache.stats()}
@@ -69,6 +69,10 @@ class ChatMeta(BaseModel):
     output_tokens: int
     latency_ms: int
     fallback_used: bool
+    hedged: bool = False
+    cache_hit: bool = False
+    coalesced: bool = False
+    cached_input_tokens: int = 0
 
 
 class ChatResponse(BaseModel):
@@ -87,6 +91,7 @@ class UsageSummaryResponse(BaseModel):
     total_cost_usd: float
     total_input_tokens: int
     total_output_tokens: int
+    total_cached_input_tokens: int = 0
     by_provider: dict[str, dict[str, float | int]]
 
 
@@ -129,3 +134,45 @@ class PaymentSubscriptionResponse(BaseModel):
     tier: str
     expires_at: str | None
     plan_details: dict[str, Any] | None
+
+
+class BatchJobRequest(BaseModel):
+    prompts: list[str] = Field(min_length=1)
+    provider: str | None = None
+    mode: str = "eco"
+
+
+class BatchJobResponse(BaseModel):
+    id: str
+    status: str
+    mode: str
+    provider: str | None
+    total: int
+    completed: int
+    failed: int
+    cost_usd: float
+    error: str | None
+    created_at: str | None
+    started_at: str | None
+    finished_at: str | None
+
+
+class BatchItemResponse(BaseModel):
+    position: int
+    status: str
+    prompt: str
+    response: str | None
+    provider: str | None
+    model: str | None
+    input_tokens: int
+    output_tokens: int
+    cost_usd: float
+    latency_ms: int | None
+    attempts: int
+    error: str | None
+
+
+class BatchResultsResponse(BaseModel):
+    job: BatchJobResponse
+    items: list[BatchItemResponse]
+    next_offset: int | None
@@ -0,0 +1,8 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+
+def format_sse(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
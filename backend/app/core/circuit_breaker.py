@@ -1,45 +1,298 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from typing import Any
 
+from redis.asyncio import Redis
 
-class CircuitBreaker:
-    _state: dict[str, dict[str, object]] = {}
+from app.core.config import Settings
+from app.core.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_TRANSITION_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local op = ARGV[1]
+local threshold = tonumber(ARGV[2])
+local recovery = tonumber(ARGV[3])
+local probe_limit = tonumber(ARGV[4])
+local data = redis.call('HMGET', KEYS[1], 'status', 'failures', 'opened_at', 'probes')
+local status = data[1] or 'closed'
+local failures = tonumber(data[2]) or 0
+local opened_at = tonumber(data[3]) or 0
+local probes = tonumber(data[4]) or 0
+local previous = status
+local allowed = 1
+
+if op == 'allow' then
+  if status == 'open' then
+    if now - opened_at >= recovery then
+      status = 'half_open'
+      opened_at = now
+      probes = 1
+    else
+      allowed = 0
+    end
+  elseif status == 'half_open' then
+    if probes < probe_limit then
+      probes = probes + 1
+    elseif now - opened_at >= recovery then
+      opened_at = now
+      probes = 1
+    else
+      allowed = 0
+    end
+  end
+elseif op == 'success' then
+  status = 'closed'
+  failures = 0
+  probes = 0
+  opened_at = 0
+elseif op == 'failure' then
+  failures = failures + 1
+  if status == 'half_open' or (status == 'closed' and failures >= threshold) then
+    status = 'open'
+    opened_at = now
+    probes = 0
+  end
+elseif op == 'open' then
+  if status ~= 'open' then
+    opened_at = now
+  end
+  status = 'open'
+  probes = 0
+elseif op == 'close' then
+  status = 'closed'
+  failures = 0
+  probes = 0
+  opened_at = 0
+end
 
-    def __init__(self, name: str, failure_threshold: int = 3, recovery_timeout: int = 300) -> None:
-        self.name = name
+redis.call('HSET', KEYS[1], 'status', status, 'failures', failures, 'opened_at', opened_at, 'probes', probes)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+if status ~= previous then
+  redis.call('PUBLISH', ARGV[6], cjson.encode({name = ARGV[7], status = status, failures = failures}))
+end
+return {allowed, status, failures}
+"""
+
+
+@dataclass(slots=True)
+class BreakerState:
+    status: str = CLOSED
+    failures: int = 0
+    opened_at: float = 0.0
+    probes: int = 0
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        redis: Redis | None = None,
+        failure_threshold: int = 3,
+        recovery_timeout: float = 300.0,
+        half_open_probes: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        key_prefix: str = "circuit_breaker",
+        channel: str = "circuit_breaker:events",
+    ) -> None:
+        self._redis = redis
         self.failure_threshold = failure_threshold
         self.recovery_timeout = recovery_timeout
-        if name not in self._state:
-            self._state[name] = {
-                "failures": 0,
-                "opened_at": None,
-                "status": "closed",
-            }
-
-    def record_failure(self) -> None:
-        data = self._state[self.name]
-        failures = int(data["failures"]) + 1
-        data["failures"] = failures
-        if failures >= self.failure_threshold:
-            data["status"] = "open"
-            data["opened_at"] = datetime.now(timezone.utc)
-
-    def record_success(self) -> None:
-        data = self._state[self.name]
-        data["failures"] = 0
-        data["status"] = "closed"
-        data["opened_at"] = None
-
-    def is_open(self) -> bool:
-        data = self._state[self.name]
-        status = str(data["status"])
-        if status != "open":
-            return False
-
-        opened_at = data["opened_at"]
-        if isinstance(opened_at, datetime):
-            if datetime.now(timezone.utc) - opened_at >= timedelta(seconds=self.recovery_timeout):
-                data["status"] = "half-open"
-                return False
-        return True
+        self.half_open_probes = half_open_probes
+        self._clock = clock
+        self._key_prefix = key_prefix
+        self._channel = channel
+        self._script: Any = None
+        self._local: dict[str, BreakerState] = {}
+        self._listener: asyncio.Task[None] | None = None
+
+    def configure(self, settings: Settings) -> None:
+        self.failure_threshold = settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD
+        self.recovery_timeout = settings.CIRCUIT_BREAKER_RECOVERY_SECONDS
+        self.half_open_probes = max(settings.CIRCUIT_BREAKER_HALF_OPEN_PROBES, 1)
+
+    def bind(self, redis: Redis | None) -> None:
+        self._redis = redis
+        self._script = redis.register_script(_TRANSITION_SCRIPT) if redis is not None else None
+
+    def reset(self) -> None:
+        self._local.clear()
+
+    async def start(self) -> None:
+        if self._redis is None or self._listener is not None:
+            return
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is None:
+            return
+        self._listener.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._listener
+        self._listener = None
+
+    def status(self, name: str) -> str:
+        return self._state(name).status
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        return {name: asdict(state) for name, state in sorted(self._local.items())}
+
+    async def allow(self, name: str) -> bool:
+        name = name.lower()
+        if self._listener is not None and not self._listener.done() and self.status(name) == CLOSED:
+            return True
+        return await self._transition(name, "allow")
+
+    async def record_success(self, name: str) -> None:
+        name = name.lower()
+        state = self._state(name)
+        if self._script is None and state.status == CLOSED and state.failures == 0:
+            return
+        await self._transition(name, "success")
+
+    async def record_failure(self, name: str) -> None:
+        await self._transition(name.lower(), "failure")
+
+    async def force_open(self, name: str) -> None:
+        await self._transition(name.lower(), "open")
+
+    async def force_close(self, name: str) -> None:
+        await self._transition(name.lower(), "close")
+
+    async def _transition(self, name: str, op: str) -> bool:
+        if self._script is not None:
+            try:
+                allowed, status, failures = await self._script(
+                    keys=[f"{self._key_prefix}:{name}"],
+                    args=[
+                        op,
+                        self.failure_threshold,
+                        self.recovery_timeout,
+                        self.half_open_probes,
+                        max(int(self.recovery_timeout * 4), 60),
+                        self._channel,
+                        name,
+                    ],
+                )
+                self._apply(name, str(status), int(failures))
+                return bool(int(allowed))
+            except Exception:
+                logger.warning("Nie udało się zaktualizować bezpiecznika %s w Redis.", name, exc_info=True)
+        return self._transition_local(name, op)
+
+    def _transition_local(self, name: str, op: str) -> bool:
+        state = self._state(name)
+        now = self._clock()
+        previous = state.status
+        allowed = True
+        if op == "allow":
+            if state.status == OPEN:
+                if now - state.opened_at >= self.recovery_timeout:
+                    state.status, state.opened_at, state.probes = HALF_OPEN, now, 1
+                else:
+                    allowed = False
+            elif state.status == HALF_OPEN:
+                if state.probes < self.half_open_probes:
+                    state.probes += 1
+                elif now - state.opened_at >= self.recovery_timeout:
+                    state.opened_at, state.probes = now, 1
+                else:
+                    allowed = False
+        elif op in {"success", "close"}:
+            state.status, state.failures, state.opened_at, state.probes = CLOSED, 0, 0.0, 0
+        elif op == "failure":
+            state.failures += 1
+            if state.status == HALF_OPEN or (state.status == CLOSED and state.failures >= self.failure_threshold):
+                state.status, state.opened_at, state.probes = OPEN, now, 0
+        elif op == "open":
+            if state.status != OPEN:
+                state.opened_at = now
+            state.status, state.probes = OPEN, 0
+
+        if state.status != previous:
+            logger.info("Bezpiecznik providera %s: %s -> %s", name, previous, state.status)
+        return allowed
+
+    def _apply(self, name: str, status: str, failures: int) -> None:
+        state = self._state(name)
+        if state.status != status:
+            logger.info("Bezpiecznik providera %s: %s -> %s", name, state.status, status)
+            state.opened_at = self._clock() if status != CLOSED else 0.0
+        state.status = status
+        state.failures = failures
+
+    def _handle_event(self, raw: str) -> None:
+        try:
+            event = json.loads(raw)
+            self._apply(str(event["name"]), str(event["status"]), int(event.get("failures", 0)))
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Nieprawidłowe zdarzenie bezpiecznika: %s", raw)
+
+    async def _listen(self) -> None:
+        assert self._redis is not None
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self._channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._handle_event(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Utracono subskrypcję zdarzeń bezpiecznika, ponawiam.", exc_info=True)
+                self._local.clear()
+                await asyncio.sleep(1.0)
+            finally:
+                with contextlib.suppress(Exception):
+                    await pubsub.aclose()
+
+    def _state(self, name: str) -> BreakerState:
+        state = self._local.get(name)
+        if state is None:
+            state = BreakerState()
+            self._local[name] = state
+        return state
+
+
+circuit_breaker = CircuitBreaker()
+
+
+def _breaker_states() -> dict[tuple[str, ...], float]:
+    return {
+        (name, status): float(state.status == status)
+        for name, state in circuit_breaker._local.items()
+        for status in (CLOSED, OPEN, HALF_OPEN)
+    }
+
+
+def _breaker_failures() -> dict[tuple[str, ...], float]:
+    return {(name,): float(state.failures) for name, state in circuit_breaker._local.items()}
+
+
+metrics_registry.gauge(
+    "jarvis_circuit_breaker_state",
+    "Stan circuit breakera providera (1 dla bieżącego stanu)",
+    ("provider", "state"),
+    _breaker_states,
+    multiprocess_mode="livemax",
+)
+metrics_registry.gauge(
+    "jarvis_circuit_breaker_failures",
+    "Liczba kolejnych błędów providera",
+    ("provider",),
+    _breaker_failures,
+    multiprocess_mode="livemax",
+)
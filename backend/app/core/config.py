@@ -39,6 +39,103 @@ class Settings(BaseSettings):
     FULL_DAILY_USD_CAP: float = 5.0
     RATE_LIMIT_PER_MINUTE: int = 30
 
+    PROVIDER_HTTP_MAX_CONNECTIONS: int = 20
+    PROVIDER_HTTP_MAX_KEEPALIVE: int = 10
+    PROVIDER_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    PROVIDER_HTTP_TIMEOUT: float = 60.0
+    PROVIDER_HTTP_CONNECT_TIMEOUT: float = 10.0
+    PROVIDER_HTTP2_ENABLED: bool = True
+
+    PROVIDER_RETRY_MAX_ATTEMPTS: int = 3
+    PROVIDER_RETRY_BASE_DELAY_MS: int = 250
+    PROVIDER_RETRY_MAX_DELAY_MS: int = 8000
+    PROVIDER_RETRY_BUDGET_RATIO: float = 0.1
+    PROVIDER_RETRY_BUDGET_CAPACITY: float = 10.0
+    PROVIDER_REQUEST_DEADLINE_SECONDS: float = 45.0
+
+    PROVIDER_RATE_LIMITER_ENABLED: bool = True
+
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 3
+    CIRCUIT_BREAKER_RECOVERY_SECONDS: float = 300.0
+    CIRCUIT_BREAKER_HALF_OPEN_PROBES: int = 1
+
+    PROVIDER_PROBE_ENABLED: bool = True
+    PROVIDER_PROBE_INTERVAL_SECONDS: float = 30.0
+    PROVIDER_PROBE_TIMEOUT_SECONDS: float = 5.0
+    PROVIDER_PROBE_FAILURE_THRESHOLD: int = 2
+
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_PROFILES: str = "eco"
+    RESPONSE_CACHE_MAX_TEMPERATURE: float = 0.7
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_PROFILES: str = "eco"
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 5000
+    SEMANTIC_CACHE_TTL_SECONDS: int = 86400
+    SEMANTIC_CACHE_DIM: int = 1024
+    SEMANTIC_CACHE_VERIFY_RATE: float = 0.02
+    SEMANTIC_CACHE_SNAPSHOT_PATH: str = "data/semantic_cache.npz"
+    SEMANTIC_CACHE_SNAPSHOT_INTERVAL_SECONDS: float = 300.0
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_DISTRIBUTED: bool = False
+    SINGLE_FLIGHT_LOCK_TTL_SECONDS: float = 60.0
+    SINGLE_FLIGHT_WAIT_SECONDS: float = 45.0
+    CONTEXT_HISTORY_MAX_MESSAGES: int = 50
+    CONTEXT_BUDGET_ECO_TOKENS: int = 2000
+    CONTEXT_BUDGET_SMART_TOKENS: int = 6000
+    CONTEXT_BUDGET_DEEP_TOKENS: int = 16000
+    CONTEXT_PREFIX_STEP_MESSAGES: int = 4
+    SESSION_SUMMARY_ENABLED: bool = True
+    SESSION_SUMMARY_TRIGGER_TOKENS: int = 3000
+    SESSION_SUMMARY_KEEP_RECENT_MESSAGES: int = 6
+    SESSION_SUMMARY_MAX_WORDS: int = 250
+    SESSION_SUMMARY_PROVIDER: str = ""
+    CELERY_BROKER_URL: str = ""
+    BATCH_QUEUE: str = "batch"
+    BATCH_MAX_ITEMS: int = 5000
+    BATCH_CHUNK_SIZE: int = 50
+    BATCH_PROVIDER_CONCURRENCY: int = 4
+    BATCH_ITEM_MAX_ATTEMPTS: int = 3
+    BATCH_RETRY_DELAY_SECONDS: float = 2.0
+    BATCH_STATUS_POLL_SECONDS: float = 1.0
+
+    HEDGING_ENABLED: bool = False
+    HEDGE_LATENCY_PERCENTILE: float = 0.9
+    HEDGE_MIN_SAMPLES: int = 20
+    HEDGE_MIN_DELAY_MS: int = 500
+    HEDGE_DEFAULT_DELAY_MS: int = 8000
+
+    ADAPTIVE_ROUTING_ENABLED: bool = True
+    ADAPTIVE_ROUTING_ALPHA: float = 0.2
+    ADAPTIVE_ROUTING_MIN_SAMPLES: int = 5
+    ADAPTIVE_ROUTING_REFRESH_SECONDS: float = 2.0
+    PROVIDER_AFFINITY_ENABLED: bool = True
+    PROVIDER_BASE_URL_OVERRIDES: str = ""
+
+    METRICS_ENABLED: bool = True
+    METRICS_FLUSH_SECONDS: float = 5.0
+
+    TRACING_ENABLED: bool = True
+    TRACING_SERVICE_NAME: str = "jarvis-backend"
+    TRACING_EXPORT_FILE: str = ""
+    TRACING_OTLP_ENDPOINT: str = ""
+    TRACING_FLUSH_SECONDS: float = 2.0
+    TRACING_BUFFER_SIZE: int = 10000
+
+    DB_QUERY_STATS_ENABLED: bool = True
+    DB_QUERY_STATS_HEADERS: bool = False
+    DB_QUERY_REPEAT_THRESHOLD: int = 3
+
+    LEDGER_WRITE_BEHIND_ENABLED: bool = True
+    LEDGER_WAL_DIR: str = "data/ledger_wal"
+    LEDGER_FLUSH_SECONDS: float = 1.0
+    LEDGER_FLUSH_BATCH_SIZE: int = 500
+    LEDGER_CLAIM_IDLE_SECONDS: float = 30.0
+    LEDGER_MAX_PENDING: int = 10000
+
     VOICE_ENABLED: bool = True
     GITHUB_ENABLED: bool = True
     VERTEX_ENABLED: bool = False
@@ -5,6 +5,8 @@ import logging
 from datetime import datetime, timezone
 from typing import Any
 
+from app.core.tracing import current_trace
+
 
 class JSONFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
@@ -14,6 +16,7 @@ class JSONFormatter(logging.Formatter):
             "logger": record.name,
             "message": record.getMessage(),
             "request_id": getattr(record, "request_id", None),
+            "trace_id": getattr(record, "trace_id", None),
             "user_id": getattr(record, "user_id", None),
             "session_id": getattr(record, "session_id", None),
         }
@@ -22,6 +25,16 @@ class JSONFormatter(logging.Formatter):
         return json.dumps(payload, ensure_ascii=False)
 
 
+class TraceContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace = current_trace()
+        if trace is not None:
+            for attr in ("request_id", "trace_id", "user_id", "session_id"):
+                if getattr(record, attr, None) is None:
+                    setattr(record, attr, getattr(trace, attr))
+        return True
+
+
 def setup_logging(level: str, json_mode: bool) -> None:
     root_logger = logging.getLogger()
     root_logger.handlers.clear()
@@ -37,6 +50,7 @@ def setup_logging(level: str, json_mode: bool) -> None:
             ),
         )
 
+    handler.addFilter(TraceContextFilter())
     root_logger.addHandler(handler)
 
     for logger_name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
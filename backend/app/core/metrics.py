@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, disable_created_metrics, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector, mark_process_dead
+from redis.asyncio import Redis
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import Settings
+
+if TYPE_CHECKING:
+    from app.providers.base import ProviderResult
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536, 262144)
+COST_BUCKETS = (0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+GaugeCallback = Callable[[], dict[tuple[str, ...], float]]
+MetricT = TypeVar("MetricT", Counter, Histogram, Gauge)
+
+disable_created_metrics()
+
+
+def multiprocess_dir() -> str | None:
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR") or None
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True, flush_seconds: float = 5.0) -> None:
+        self.enabled = enabled
+        self.registry = CollectorRegistry()
+        self._flush_seconds = flush_seconds
+        self._labelled: list[Counter | Histogram | Gauge] = []
+        self._gauges: list[tuple[str, Gauge, GaugeCallback]] = []
+        self._flusher: asyncio.Task[None] | None = None
+
+    def configure(self, settings: Settings) -> None:
+        self.enabled = settings.METRICS_ENABLED
+        self._flush_seconds = settings.METRICS_FLUSH_SECONDS
+
+    def reset(self) -> None:
+        for metric in self._labelled:
+            metric.clear()
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: tuple[str, ...], buckets: tuple[float, ...]
+    ) -> Histogram:
+        return self._track(Histogram(name, documentation, labelnames, buckets=buckets, registry=self.registry))
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...]) -> Counter:
+        return self._track(Counter(name, documentation, labelnames, registry=self.registry))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...],
+        callback: GaugeCallback,
+        multiprocess_mode: str = "liveall",
+    ) -> Gauge:
+        gauge = self._track(
+            Gauge(name, documentation, labelnames, registry=self.registry, multiprocess_mode=multiprocess_mode)
+        )
+        self._gauges.append((name, gauge, callback))
+        return gauge
+
+    def start(self) -> None:
+        if multiprocess_dir() is None or self._flusher is not None:
+            return
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._flusher is None:
+            return
+        self._flusher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._flusher
+        self._flusher = None
+        mark_process_dead(os.getpid())
+
+    def refresh_gauges(self) -> None:
+        for name, gauge, callback in self._gauges:
+            try:
+                values = callback()
+            except Exception:
+                logger.debug("Nie udało się odczytać metryki %s.", name, exc_info=True)
+                continue
+            for labels, value in values.items():
+                (gauge.labels(*labels) if labels else gauge).set(value)
+
+    def exposition(self) -> bytes:
+        self.refresh_gauges()
+        if multiprocess_dir() is None:
+            return generate_latest(self.registry)
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        return generate_latest(registry)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_seconds)
+            self.refresh_gauges()
+
+    def _track(self, metric: MetricT) -> MetricT:
+        if metric._labelnames:
+            self._labelled.append(metric)
+        return metric
+
+
+metrics_registry = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = metrics_registry.histogram(
+    "jarvis_http_request_duration_seconds",
+    "Czas obsługi żądania HTTP",
+    ("method", "route", "status"),
+    LATENCY_BUCKETS,
+)
+PROVIDER_LATENCY = metrics_registry.histogram(
+    "jarvis_provider_latency_seconds",
+    "Czas odpowiedzi providera",
+    ("provider", "model", "profile"),
+    LATENCY_BUCKETS,
+)
+PROVIDER_TOKENS = metrics_registry.histogram(
+    "jarvis_provider_tokens",
+    "Liczba tokenów w odpowiedzi providera",
+    ("provider", "model", "kind"),
+    TOKEN_BUCKETS,
+)
+PROVIDER_COST = metrics_registry.histogram(
+    "jarvis_provider_cost_usd",
+    "Koszt pojedynczego wywołania providera",
+    ("provider", "model"),
+    COST_BUCKETS,
+)
+PROVIDER_RESPONSES = metrics_registry.counter(
+    "jarvis_provider_responses_total",
+    "Odpowiedzi providerów",
+    ("provider", "model", "fallback", "hedged", "cache_hit", "coalesced"),
+)
+PROVIDER_FALLBACKS = metrics_registry.counter(
+    "jarvis_provider_fallbacks_total",
+    "Odpowiedzi udzielone przez providera zapasowego",
+    ("provider",),
+)
+POLICY_DENIALS = metrics_registry.counter(
+    "jarvis_policy_denials_total",
+    "Odmowy dostępu w PolicyEngine",
+    ("reason",),
+)
+DB_POOL_CHECKOUT = metrics_registry.histogram(
+    "jarvis_db_pool_checkout_seconds",
+    "Czas oczekiwania na połączenie z puli SQLAlchemy",
+    (),
+    FAST_BUCKETS,
+)
+REDIS_COMMAND_DURATION = metrics_registry.histogram(
+    "jarvis_redis_command_duration_seconds",
+    "Czas wykonania polecenia Redis",
+    ("command",),
+    FAST_BUCKETS,
+)
+
+
+def observe_provider_result(result: ProviderResult, profile: str) -> None:
+    if not metrics_registry.enabled:
+        return
+    provider, model = result.provider, result.model
+    PROVIDER_RESPONSES.labels(
+        provider,
+        model,
+        _flag(result.fallback_used),
+        _flag(result.hedged),
+        _flag(result.cache_hit),
+        _flag(result.coalesced),
+    ).inc()
+    if result.cache_hit or result.coalesced:
+        return
+    if result.fallback_used:
+        PROVIDER_FALLBACKS.labels(provider).inc()
+    PROVIDER_LATENCY.labels(provider, model, profile).observe(result.latency_ms / 1000)
+    PROVIDER_TOKENS.labels(provider, model, "input").observe(result.input_tokens)
+    PROVIDER_TOKENS.labels(provider, model, "output").observe(result.output_tokens)
+    if result.cached_input_tokens:
+        PROVIDER_TOKENS.labels(provider, model, "cached_input").observe(result.cached_input_tokens)
+    PROVIDER_COST.labels(provider, model).observe(result.cost_usd)
+
+
+def _flag(value: bool) -> str:
+    return "true" if value else "false"
+
+
+def route_template(scope: Scope) -> str:
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    path: str = scope["path"]
+    regex = getattr(route, "path_regex", None)
+    if regex is None or regex.match(path):
+        return template
+    # Trasy z include_router(prefix=...) zachowują ścieżkę bez prefiksu; odtwarzamy go z URL.
+    for index, char in enumerate(path):
+        if char == "/" and index and regex.match(path[index:]):
+            return path[:index] + template
+    return template
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not metrics_registry.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = "500"
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            path = route_template(scope)
+            if path != "/metrics":
+                HTTP_REQUEST_DURATION.labels(scope["method"], path, status).observe(time.perf_counter() - started)
+
+
+class InstrumentedRedis(Redis):
+    async def execute_command(self, *args: Any, **options: Any) -> Any:
+        if not metrics_registry.enabled:
+            return await super().execute_command(*args, **options)
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            command = str(args[0]).upper() if args else "UNKNOWN"
+            REDIS_COMMAND_DURATION.labels(command).observe(time.perf_counter() - started)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self) -> ConnectionPoolEntry:
+        if not metrics_registry.enabled:
+            return super()._do_get()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT.observe(time.perf_counter() - started)
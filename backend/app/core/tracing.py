@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+import re
+import secrets
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import httpx
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import Settings
+
+logger = logging.getLogger(__name__)
+
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    duration_ms: float | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class Trace:
+    trace_id: str
+    request_id: str
+    user_id: str | None = None
+    session_id: str | None = None
+    spans: list[Span] = field(default_factory=list)
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[str | None] = ContextVar("current_span", default=None)
+
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str] | None:
+    match = _TRACEPARENT.match((value or "").strip().lower())
+    if match is None or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None
+    return match.group(1), match.group(2)
+
+
+def format_traceparent(trace_id: str, span_id: str) -> str:
+    return f"00-{trace_id}-{span_id}-01"
+
+
+def server_timing(trace: Trace) -> str:
+    totals: dict[str, float] = {}
+    for span in trace.spans:
+        if span.duration_ms is not None:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+    if trace.spans:
+        totals["total"] = (time.time_ns() - trace.spans[0].start_ns) / 1_000_000
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in totals.items())
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.enabled = True
+        self._service_name = "jarvis-backend"
+        self._export_file: Path | None = None
+        self._otlp_endpoint = ""
+        self._flush_seconds = 2.0
+        self._buffer: deque[dict[str, Any]] = deque(maxlen=10000)
+        self._flusher: asyncio.Task[None] | None = None
+        self._client: httpx.AsyncClient | None = None
+
+    def configure(self, settings: Settings) -> None:
+        self.enabled = settings.TRACING_ENABLED
+        self._service_name = settings.TRACING_SERVICE_NAME
+        self._export_file = Path(settings.TRACING_EXPORT_FILE) if settings.TRACING_EXPORT_FILE else None
+        self._otlp_endpoint = settings.TRACING_OTLP_ENDPOINT
+        self._flush_seconds = settings.TRACING_FLUSH_SECONDS
+        self._buffer = deque(self._buffer, maxlen=max(settings.TRACING_BUFFER_SIZE, 1))
+
+    def reset(self) -> None:
+        self._buffer.clear()
+
+    @property
+    def exporting(self) -> bool:
+        return self._export_file is not None or bool(self._otlp_endpoint)
+
+    def begin(self, traceparent: str | None = None, request_id: str | None = None) -> tuple[Trace, str | None]:
+        parent = parse_traceparent(traceparent)
+        trace_id, parent_id = parent if parent is not None else (secrets.token_hex(16), None)
+        if not request_id or not _REQUEST_ID.match(request_id):
+            request_id = secrets.token_hex(8)
+        return Trace(trace_id=trace_id, request_id=request_id), parent_id
+
+    @contextlib.contextmanager
+    def activate(self, trace: Trace, parent_id: str | None = None) -> Iterator[None]:
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(parent_id)
+        try:
+            yield
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span | None]:
+        trace = _current_trace.get()
+        if trace is None:
+            yield None
+            return
+        span = Span(
+            name=name,
+            trace_id=trace.trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=_current_span.get(),
+            start_ns=time.time_ns(),
+            attributes=attributes,
+        )
+        trace.spans.append(span)
+        token = _current_span.set(span.span_id)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as exc:
+            span.attributes["error"] = exc.__class__.__name__
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - started) * 1000
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                _current_span.set(span.parent_id)
+
+    def tag(self, user_id: Any = None, session_id: Any = None) -> None:
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        if user_id is not None:
+            trace.user_id = str(user_id)
+        if session_id is not None:
+            trace.session_id = str(session_id)
+
+    def finish(self, trace: Trace) -> None:
+        if not self.exporting:
+            return
+        for span in trace.spans:
+            if span.duration_ms is None:
+                continue
+            self._buffer.append(
+                {
+                    "trace_id": span.trace_id,
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "name": span.name,
+                    "start_ns": span.start_ns,
+                    "duration_ms": round(span.duration_ms, 3),
+                    "attributes": span.attributes,
+                    "request_id": trace.request_id,
+                    "user_id": trace.user_id,
+                    "session_id": trace.session_id,
+                }
+            )
+
+    def start(self) -> None:
+        if not self.exporting or self._flusher is not None:
+            return
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flusher
+            self._flusher = None
+        await self.flush()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_seconds)
+            await self.flush()
+
+    async def flush(self) -> None:
+        batch = [self._buffer.popleft() for _ in range(len(self._buffer))]
+        if not batch:
+            return
+        if self._export_file is not None:
+            try:
+                await asyncio.to_thread(self._write_file, self._export_file, batch)
+            except OSError:
+                logger.warning("Nie udało się zapisać spanów do pliku %s.", self._export_file, exc_info=True)
+        if self._otlp_endpoint:
+            if self._client is None:
+                self._client = httpx.AsyncClient(timeout=5.0)
+            try:
+                response = await self._client.post(self._otlp_endpoint, json=self._otlp_payload(batch))
+                response.raise_for_status()
+            except httpx.HTTPError:
+                logger.warning("Nie udało się wysłać spanów do kolektora %s.", self._otlp_endpoint, exc_info=True)
+
+    def _write_file(self, path: Path, batch: list[dict[str, Any]]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a", encoding="utf-8") as handle:
+            for item in batch:
+                handle.write(json.dumps({"service": self._service_name, **item}, ensure_ascii=False, default=str))
+                handle.write("\n")
+
+    def _otlp_payload(self, batch: list[dict[str, Any]]) -> dict[str, Any]:
+        spans = []
+        for item in batch:
+            attributes = {
+                **item["attributes"],
+                "request_id": item["request_id"],
+                "user_id": item["user_id"],
+                "session_id": item["session_id"],
+            }
+            span: dict[str, Any] = {
+                "traceId": item["trace_id"],
+                "spanId": item["span_id"],
+                "name": item["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(item["start_ns"]),
+                "endTimeUnixNano": str(item["start_ns"] + int(item["duration_ms"] * 1_000_000)),
+                "attributes": [
+                    {"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None
+                ],
+                "status": {"code": 2 if "error" in attributes else 1},
+            }
+            if item["parent_id"]:
+                span["parentSpanId"] = item["parent_id"]
+            spans.append(span)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self._service_name}}]},
+                    "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": spans}],
+                }
+            ]
+        }
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+tracer = Tracer()
+
+
+class TracingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        trace, parent_id = tracer.begin(headers.get("traceparent"), headers.get("x-request-id"))
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response_headers = MutableHeaders(scope=message)
+                response_headers["X-Request-ID"] = trace.request_id
+                timing = server_timing(trace)
+                if timing:
+                    response_headers.append("Server-Timing", timing)
+            await send(message)
+
+        try:
+            with tracer.activate(trace, parent_id), tracer.span("http", method=scope["method"], path=scope["path"]):
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            tracer.finish(trace)
@@ -1,4 +1,5 @@
 from app.db.models.audit_log import AuditLog
+from app.db.models.batch_job import BatchItem, BatchJob
 from app.db.models.invite_code import InviteCode
 from app.db.models.ledger import UsageLedger
 from app.db.models.message import Message
@@ -11,6 +12,8 @@ from app.db.models.user_memory import UserMemory
 
 __all__ = [
     "AuditLog",
+    "BatchItem",
+    "BatchJob",
     "ChatSession",
     "InviteCode",
     "Message",
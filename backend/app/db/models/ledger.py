@@ -28,10 +28,13 @@ class UsageLedger(Base):
     difficulty: Mapped[str | None] = mapped_column(String(10), nullable=True)
     input_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     output_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    cached_input_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     cost_usd: Mapped[Decimal] = mapped_column(Numeric(12, 6), default=Decimal("0"), nullable=False)
     tool_costs: Mapped[dict[str, Any]] = mapped_column(JSON, default=dict, nullable=False)
     latency_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
     fallback_used: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    cache_hit: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    coalesced: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     user: Mapped["User"] = relationship(back_populates="usage_ledgers")
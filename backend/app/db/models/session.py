@@ -24,6 +24,8 @@ class ChatSession(Base):
     name: Mapped[str | None] = mapped_column(String(100), nullable=True)
     mode: Mapped[str] = mapped_column(String(10), default="eco", nullable=False)
     provider_pref: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    affinity_provider: Mapped[str | None] = mapped_column(String(30), nullable=True)
+    affinity_model: Mapped[str | None] = mapped_column(String(100), nullable=True)
     active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
     snapshot_text: Mapped[str | None] = mapped_column(Text, nullable=True)
     snapshot_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -12,6 +12,7 @@ from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
 
 if TYPE_CHECKING:
+    from app.db.models.batch_job import BatchJob
     from app.db.models.ledger import UsageLedger
     from app.db.models.payment import Payment
     from app.db.models.rag_item import RagItem
@@ -56,3 +57,4 @@ class User(Base):
     rag_items: Mapped[list["RagItem"]] = relationship(back_populates="user")
     memories: Mapped[list["UserMemory"]] = relationship(back_populates="user", cascade="all, delete-orphan")
     payments: Mapped[list["Payment"]] = relationship(back_populates="user", cascade="all, delete-orphan")
+    batch_jobs: Mapped[list[BatchJob]] = relationship(back_populates="user", cascade="all, delete-orphan")
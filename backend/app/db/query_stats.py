@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import Settings
+from app.core.metrics import metrics_registry, route_template
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_BUCKETS = (1, 2, 3, 5, 8, 12, 20, 35, 60, 100)
+DB_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+DB_STATEMENTS = metrics_registry.histogram(
+    "jarvis_db_statements_per_request",
+    "Liczba zapytań SQL w jednym żądaniu HTTP",
+    ("route",),
+    STATEMENT_BUCKETS,
+)
+DB_TIME = metrics_registry.histogram(
+    "jarvis_db_time_per_request_seconds",
+    "Łączny czas zapytań SQL w jednym żądaniu HTTP",
+    ("route",),
+    DB_TIME_BUCKETS,
+)
+DB_REPEATED = metrics_registry.counter(
+    "jarvis_db_repeated_statements_total",
+    "Zapytania SQL powtórzone w obrębie jednego żądania (podejrzenie N+1)",
+    ("route", "kind"),
+)
+
+
+@dataclass(slots=True)
+class QueryStats:
+    statements: int = 0
+    round_trips: int = 0
+    db_time_ms: float = 0.0
+    by_sql: Counter[str] = field(default_factory=Counter)
+    by_call: Counter[tuple[str, str]] = field(default_factory=Counter)
+
+    @property
+    def duplicates(self) -> int:
+        return sum(count - 1 for count in self.by_call.values() if count > 1)
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [(sql, count) for sql, count in self.by_sql.most_common() if count >= threshold]
+
+
+_active: ContextVar[tuple[QueryStats, ...]] = ContextVar("db_query_stats", default=())
+
+
+@contextlib.contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    stats = QueryStats()
+    token = _active.set((*_active.get(), stats))
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+
+
+def _before_cursor_execute(
+    conn: Connection, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+) -> None:
+    if _active.get():
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Connection, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+) -> None:
+    active = _active.get()
+    started = conn.info.get("query_started")
+    if not active or not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+    call = (statement, repr(parameters))
+    for stats in active:
+        stats.statements += 1
+        stats.round_trips += 1
+        stats.db_time_ms += elapsed_ms
+        stats.by_sql[statement] += 1
+        stats.by_call[call] += 1
+
+
+def _handle_error(context: Any) -> None:
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _transaction_end(conn: Connection) -> None:
+    for stats in _active.get():
+        stats.round_trips += 1
+
+
+def instrument_engine(engine: AsyncEngine | Engine) -> None:
+    target = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+    if event.contains(target, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+    event.listen(target, "handle_error", _handle_error)
+    event.listen(target, "commit", _transaction_end)
+    event.listen(target, "rollback", _transaction_end)
+
+
+class QueryProfiler:
+    def __init__(self) -> None:
+        self.enabled = True
+        self.headers = False
+        self.repeat_threshold = 3
+
+    def configure(self, settings: Settings) -> None:
+        self.enabled = settings.DB_QUERY_STATS_ENABLED
+        self.headers = settings.DB_QUERY_STATS_HEADERS
+        self.repeat_threshold = max(settings.DB_QUERY_REPEAT_THRESHOLD, 2)
+
+    def report(self, stats: QueryStats, method: str, route: str) -> None:
+        if metrics_registry.enabled:
+            DB_STATEMENTS.labels(route).observe(stats.statements)
+            DB_TIME.labels(route).observe(stats.db_time_ms / 1000)
+            if stats.duplicates:
+                DB_REPEATED.labels(route, "identical").inc(stats.duplicates)
+        for sql, count in stats.repeated(self.repeat_threshold):
+            if metrics_registry.enabled:
+                DB_REPEATED.labels(route, "n_plus_one").inc(count)
+            logger.warning(
+                "Zapytanie SQL wykonane %d razy w jednym żądaniu %s %s (możliwe N+1): %s",
+                count,
+                method,
+                route,
+                " ".join(sql.split())[:300],
+            )
+
+
+query_profiler = QueryProfiler()
+
+
+class QueryStatsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not query_profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and query_profiler.headers:
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Queries"] = str(stats.statements)
+                headers["X-DB-Round-Trips"] = str(stats.round_trips)
+                headers["X-DB-Time-Ms"] = f"{stats.db_time_ms:.1f}"
+                headers["X-DB-Duplicate-Queries"] = str(stats.duplicates)
+                headers.append("Server-Timing", f"db;dur={stats.db_time_ms:.1f}")
+            await send(message)
+
+        with count_queries() as stats:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                query_profiler.report(stats, scope["method"], route_template(scope))
@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import logging
 import os
+from typing import Any
 
+from sqlalchemy.engine import make_url
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
@@ -10,8 +12,11 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
+from app.core.metrics import InstrumentedQueuePool, metrics_registry
 from app.db.base import Base
+from app.db.query_stats import instrument_engine
 
 logger = logging.getLogger(__name__)
 _engine: AsyncEngine | None = None
@@ -25,6 +30,33 @@ def should_create_all(database_url: str) -> bool:
     return database_url.startswith("sqlite")
 
 
+def _engine_options(database_url: str) -> dict[str, Any]:
+    url = make_url(database_url)
+    if url.get_dialect().get_pool_class(url) is AsyncAdaptedQueuePool:
+        return {"poolclass": InstrumentedQueuePool}
+    return {}
+
+
+def _pool_connections() -> dict[tuple[str, ...], float]:
+    pool = _engine.pool if _engine is not None else None
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {
+        ("size",): float(pool.size()),
+        ("checked_out",): float(pool.checkedout()),
+        ("checked_in",): float(pool.checkedin()),
+        ("overflow",): float(max(pool.overflow(), 0)),
+    }
+
+
+metrics_registry.gauge(
+    "jarvis_db_pool_connections",
+    "Stan puli połączeń SQLAlchemy",
+    ("state",),
+    _pool_connections,
+)
+
+
 def _ensure_initialized() -> None:
     global _engine, _session_factory
     if _engine is None:
@@ -32,7 +64,13 @@ def _ensure_initialized() -> None:
 
         settings = get_settings()
         try:
-            _engine = create_async_engine(settings.DATABASE_URL, echo=False, pool_pre_ping=True)
+            _engine = create_async_engine(
+                settings.DATABASE_URL,
+                echo=False,
+                pool_pre_ping=True,
+                **_engine_options(settings.DATABASE_URL),
+            )
+            instrument_engine(_engine)
             _session_factory = async_sessionmaker(_engine, expire_on_commit=False)
         except SQLAlchemyError:
             logger.exception("Nie udało się zainicjalizować silnika bazy danych.")
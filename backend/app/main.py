@@ -6,37 +6,113 @@ from datetime import datetime, timezone
 from typing import Any, AsyncGenerator
 
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST
 from redis.asyncio import Redis
 
 from app.api.v1.router import api_router
+from app.core.circuit_breaker import circuit_breaker
 from app.core.config import get_settings
 from app.core.exceptions import JarvisBaseError
 from app.core.logging_config import setup_logging
+from app.core.metrics import InstrumentedRedis, MetricsMiddleware, metrics_registry
+from app.core.tracing import TracingMiddleware, tracer
+from app.db.query_stats import QueryStatsMiddleware, query_profiler
 from app.db.session import get_engine, init_db
+from app.providers.factory import ProviderFactory
+from app.providers.http_pool import provider_http_pool
+from app.providers.rate_limiter import provider_rate_limiter
+from app.providers.retry import provider_retry_policy
+from app.services.orchestrator import build_orchestrator
+from app.services.provider_health import provider_health_prober
+from app.services.provider_scoreboard import provider_scoreboard
+from app.services.response_cache import response_cache
+from app.services.semantic_cache import semantic_cache
+from app.services.session_summarizer import session_summarizer
+from app.services.single_flight import single_flight
+from app.services.usage_ledger import ledger_buffer
 
 logger = logging.getLogger(__name__)
 
 
+async def _sync_http_pool(added: list[str], removed: list[str]) -> None:
+    for name in removed:
+        await provider_http_pool.close_client(name)
+    provider_http_pool.warm_up(added)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     settings = get_settings()
     setup_logging(level=settings.LOG_LEVEL, json_mode=settings.LOG_JSON)
     app.state.started_at = datetime.now(tz=timezone.utc)
     app.state.redis = None
+    metrics_registry.configure(settings)
+    metrics_registry.start()
+    tracer.configure(settings)
+    tracer.start()
+    query_profiler.configure(settings)
 
     try:
-        app.state.redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        app.state.redis = InstrumentedRedis.from_url(settings.REDIS_URL, decode_responses=True)
         await app.state.redis.ping()
     except Exception:
         logger.warning("Nie udało się połączyć z Redis podczas uruchamiania.", exc_info=True)
         app.state.redis = None
 
+    provider_scoreboard.configure(settings)
+    provider_scoreboard.bind(app.state.redis)
+    provider_rate_limiter.configure(settings)
+    provider_rate_limiter.bind(app.state.redis)
+    circuit_breaker.configure(settings)
+    circuit_breaker.bind(app.state.redis)
+    await circuit_breaker.start()
+    response_cache.configure(settings)
+    response_cache.bind(app.state.redis)
+    semantic_cache.configure(settings)
+    if settings.SEMANTIC_CACHE_ENABLED:
+        semantic_cache.load()
+    single_flight.configure(settings)
+    single_flight.bind(app.state.redis)
+    session_summarizer.configure(settings)
+    ledger_buffer.configure(settings)
+    ledger_buffer.bind(app.state.redis)
+
+    provider_retry_policy.configure(settings)
+    provider_http_pool.open(settings)
+    provider_factory = ProviderFactory(settings)
+    provider_factory.add_reload_hook(_sync_http_pool)
+    provider_factory.bind(app.state.redis)
+    await provider_factory.start()
+    provider_http_pool.warm_up(provider_factory.list_available())
+    app.state.http_pool = provider_http_pool
+    app.state.provider_factory = provider_factory
+    app.state.orchestrator = build_orchestrator(provider_factory)
+    provider_health_prober.configure(settings)
+
     try:
         await init_db()
+        provider_health_prober.start(provider_factory)
+        await ledger_buffer.start()
         logger.info("Backend started")
         yield
     finally:
+        await provider_health_prober.stop()
+        await metrics_registry.stop()
+        await tracer.stop()
+        await session_summarizer.drain()
+        await ledger_buffer.stop()
+        if settings.SEMANTIC_CACHE_ENABLED:
+            await semantic_cache.snapshot()
+        provider_scoreboard.bind(None)
+        provider_rate_limiter.bind(None)
+        await circuit_breaker.stop()
+        circuit_breaker.bind(None)
+        await provider_factory.stop()
+        provider_factory.bind(None)
+        response_cache.bind(None)
+        single_flight.bind(None)
+        ledger_buffer.bind(None)
         redis_client: Redis | None = getattr(app.state, "redis", None)
         if redis_client is not None:
             try:
@@ -44,6 +120,8 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
             except Exception:
                 logger.warning("Nie udało się poprawnie zamknąć połączenia Redis.", exc_info=True)
 
+        await provider_http_pool.aclose()
+
         try:
             await get_engine().dispose()
         except Exception:
@@ -59,6 +137,13 @@ def create_app() -> FastAPI:
         lifespan=lifespan,
     )
     app.include_router(api_router, prefix="/api/v1")
+    app.add_middleware(QueryStatsMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics() -> Response:
+        return Response(content=metrics_registry.exposition(), media_type=CONTENT_TYPE_LATEST)
 
     @app.exception_handler(JarvisBaseError)
     async def jarvis_error_handler(request: Request, exc: JarvisBaseError) -> JSONResponse:
@@ -0,0 +1 @@
+"""Mock provider server package."""
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+
+import uvicorn
+
+from app.mock_provider.server import MockProviderServer, create_mock_app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Serwer udający API providerów (OpenAI i Gemini) do testów obciążenia."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--config", type=Path, help="Plik JSON z profilami tras: {default, routes, seed}")
+    args = parser.parse_args()
+
+    data = json.loads(args.config.read_text(encoding="utf-8")) if args.config else {}
+    uvicorn.run(
+        create_mock_app(MockProviderServer.from_dict(data)), host=args.host, port=args.port, log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter
+from collections.abc import AsyncIterator
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Any
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from app.providers.tokenizer import estimate_messages_tokens
+
+LATENCY_DISTRIBUTIONS = frozenset({"fixed", "uniform", "lognormal"})
+
+
+@dataclass(slots=True)
+class RouteProfile:
+    latency: str = "fixed"
+    latency_ms: float = 50.0
+    latency_spread_ms: float = 0.0
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    error_status: int = 500
+    rate_limit_rate: float = 0.0
+    retry_after_seconds: float = 1.0
+    timeout_rate: float = 0.0
+    timeout_seconds: float = 120.0
+    input_tokens: int | None = None
+    output_tokens: int = 32
+    cached_input_tokens: int = 0
+    stream_chunks: int = 4
+    chunk_interval_ms: float = 20.0
+    reply: str = "Odpowiedź z serwera testowego."
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], base: RouteProfile | None = None) -> RouteProfile:
+        known = {field.name for field in fields(cls)}
+        unknown = sorted(set(data) - known)
+        if unknown:
+            raise ValueError(f"Nieznane pola profilu: {', '.join(unknown)}")
+        profile = replace(base or cls(), **data)
+        if profile.latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Nieznany rozkład opóźnień: {profile.latency}")
+        if profile.timeout_rate + profile.rate_limit_rate + profile.error_rate > 1.0:
+            raise ValueError("Suma prawdopodobieństw błędów przekracza 1")
+        return profile
+
+
+class MockProviderServer:
+    def __init__(
+        self,
+        default: RouteProfile | None = None,
+        routes: dict[str, RouteProfile] | None = None,
+        seed: int | None = None,
+    ) -> None:
+        self.default = default or RouteProfile()
+        self.routes: dict[str, RouteProfile] = {name.lower(): profile for name, profile in (routes or {}).items()}
+        self.stats: dict[str, Counter[str]] = {}
+        self._rng = random.Random(seed)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> MockProviderServer:
+        default = RouteProfile.from_dict(data.get("default") or {})
+        routes = {
+            name: RouteProfile.from_dict(profile, base=default) for name, profile in (data.get("routes") or {}).items()
+        }
+        return cls(default=default, routes=routes, seed=data.get("seed"))
+
+    def profile(self, route: str) -> RouteProfile:
+        return self.routes.get(route.lower(), self.default)
+
+    def update(self, route: str, data: dict[str, Any]) -> RouteProfile:
+        profile = RouteProfile.from_dict(data, base=self.profile(route))
+        self.routes[route.lower()] = profile
+        return profile
+
+    def reset_stats(self) -> None:
+        self.stats.clear()
+
+    def record(self, route: str, outcome: str) -> None:
+        self.stats.setdefault(route.lower(), Counter())[outcome] += 1
+
+    def sample_latency(self, profile: RouteProfile) -> float:
+        if profile.latency == "uniform":
+            low = profile.latency_ms - profile.latency_spread_ms
+            high = profile.latency_ms + profile.latency_spread_ms
+            return max(self._rng.uniform(low, high), 0.0) / 1000
+        if profile.latency == "lognormal" and profile.latency_ms > 0:
+            return self._rng.lognormvariate(math.log(profile.latency_ms), profile.latency_sigma) / 1000
+        return max(profile.latency_ms, 0.0) / 1000
+
+    async def fault(self, route: str, profile: RouteProfile) -> Response | None:
+        roll = self._rng.random()
+        if roll < profile.timeout_rate:
+            self.record(route, "timeout")
+            await asyncio.sleep(profile.timeout_seconds)
+            return JSONResponse({"error": {"message": "Upstream timeout"}}, status_code=504)
+        roll -= profile.timeout_rate
+        if roll < profile.rate_limit_rate:
+            self.record(route, "rate_limited")
+            return JSONResponse(
+                {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                status_code=429,
+                headers={"Retry-After": f"{profile.retry_after_seconds:g}"},
+            )
+        roll -= profile.rate_limit_rate
+        if roll < profile.error_rate:
+            self.record(route, "error")
+            return JSONResponse({"error": {"message": "Injected failure"}}, status_code=profile.error_status)
+        return None
+
+
+def _chunks(text: str, count: int) -> list[str]:
+    count = max(min(count, len(text)), 1)
+    size = math.ceil(len(text) / count)
+    return [text[index : index + size] for index in range(0, len(text), size)] or [""]
+
+
+def _openai_usage(profile: RouteProfile, prompt_tokens: int) -> dict[str, Any]:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": profile.output_tokens,
+        "total_tokens": prompt_tokens + profile.output_tokens,
+        "prompt_tokens_details": {"cached_tokens": min(profile.cached_input_tokens, prompt_tokens)},
+    }
+
+
+def _gemini_usage(profile: RouteProfile, prompt_tokens: int) -> dict[str, Any]:
+    return {
+        "promptTokenCount": prompt_tokens,
+        "candidatesTokenCount": profile.output_tokens,
+        "totalTokenCount": prompt_tokens + profile.output_tokens,
+        "cachedContentTokenCount": min(profile.cached_input_tokens, prompt_tokens),
+    }
+
+
+def _sse(payload: dict[str, Any] | str) -> str:
+    data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+    return f"data: {data}\n\n"
+
+
+def create_mock_app(server: MockProviderServer | None = None) -> FastAPI:
+    mock = server or MockProviderServer()
+    app = FastAPI(title="Mock provider")
+    app.state.mock = mock
+
+    async def prepare(route: str, prompt_tokens: int) -> tuple[RouteProfile, int, Response | None]:
+        profile = mock.profile(route)
+        failure = await mock.fault(route, profile)
+        if failure is None:
+            await asyncio.sleep(mock.sample_latency(profile))
+            mock.record(route, "ok")
+        tokens = profile.input_tokens if profile.input_tokens is not None else prompt_tokens
+        return profile, tokens, failure
+
+    @app.get("/_mock/config")
+    async def get_config() -> dict[str, Any]:
+        return {
+            "default": asdict(mock.default),
+            "routes": {name: asdict(profile) for name, profile in sorted(mock.routes.items())},
+        }
+
+    @app.put("/_mock/routes/{route}")
+    async def update_route(route: str, request: Request) -> dict[str, Any]:
+        try:
+            profile = mock.update(route, await request.json())
+        except (ValueError, TypeError) as exc:
+            raise HTTPException(status_code=422, detail=str(exc)) from exc
+        return asdict(profile)
+
+    @app.get("/_mock/stats")
+    async def get_stats() -> dict[str, dict[str, int]]:
+        return {name: dict(counter) for name, counter in sorted(mock.stats.items())}
+
+    @app.post("/_mock/reset")
+    async def reset_stats() -> dict[str, bool]:
+        mock.reset_stats()
+        return {"ok": True}
+
+    @app.get("/{route}/models")
+    async def list_models(route: str) -> dict[str, Any]:
+        return {"object": "list", "data": [], "models": []}
+
+    @app.post("/{route}/chat/completions")
+    async def chat_completions(route: str, request: Request) -> Response:
+        body = await request.json()
+        messages = body.get("messages") or []
+        model = str(body.get("model") or "mock")
+        profile, prompt_tokens, failure = await prepare(route, estimate_messages_tokens(messages))
+        if failure is not None:
+            return failure
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        usage = _openai_usage(profile, prompt_tokens)
+        if not body.get("stream"):
+            return JSONResponse(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": profile.reply},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                }
+            )
+
+        async def events() -> AsyncIterator[str]:
+            for index, piece in enumerate(_chunks(profile.reply, profile.stream_chunks)):
+                if index:
+                    await asyncio.sleep(profile.chunk_interval_ms / 1000)
+                yield _sse(
+                    {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                    }
+                )
+            yield _sse(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": usage,
+                }
+            )
+            yield _sse("[DONE]")
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/{route}/models/{target}")
+    async def generate_content(route: str, target: str, request: Request) -> Response:
+        _, _, method = target.partition(":")
+        if method not in {"generateContent", "streamGenerateContent"}:
+            raise HTTPException(status_code=404, detail="Nieznana metoda")
+        body = await request.json()
+        messages = [
+            {"role": str(item.get("role", "user")), "content": "".join(str(part.get("text", "")) for part in parts)}
+            for item in [body.get("systemInstruction") or {}, *(body.get("contents") or [])]
+            if (parts := item.get("parts"))
+        ]
+        profile, prompt_tokens, failure = await prepare(route, estimate_messages_tokens(messages))
+        if failure is not None:
+            return failure
+
+        usage = _gemini_usage(profile, prompt_tokens)
+        if method == "generateContent":
+            return JSONResponse(
+                {
+                    "candidates": [
+                        {"content": {"role": "model", "parts": [{"text": profile.reply}]}, "finishReason": "STOP"}
+                    ],
+                    "usageMetadata": usage,
+                }
+            )
+
+        async def events() -> AsyncIterator[str]:
+            pieces = _chunks(profile.reply, profile.stream_chunks)
+            for index, piece in enumerate(pieces):
+                if index:
+                    await asyncio.sleep(profile.chunk_interval_ms / 1000)
+                event: dict[str, Any] = {"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}]}
+                if index == len(pieces) - 1:
+                    event["candidates"][0]["finishReason"] = "STOP"
+                    event["usageMetadata"] = usage
+                yield _sse(event)
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
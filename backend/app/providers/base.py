@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
 from dataclasses import dataclass
 
 
@@ -14,6 +15,16 @@ class ProviderResult:
     cost_usd: float
     latency_ms: int
     fallback_used: bool = False
+    hedged: bool = False
+    cache_hit: bool = False
+    coalesced: bool = False
+    cached_input_tokens: int = 0
+
+
+@dataclass(slots=True)
+class ProviderStreamChunk:
+    text: str = ""
+    result: ProviderResult | None = None
 
 
 class AbstractProvider(ABC):
@@ -32,6 +43,30 @@ class AbstractProvider(ABC):
     ) -> ProviderResult:
         raise NotImplementedError
 
+    async def stream(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> AsyncIterator[ProviderStreamChunk]:
+        result = await self.generate(
+            messages=messages,
+            profile=profile,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        yield ProviderStreamChunk(text=result.text, result=result)
+
+    def resolve_model(self, profile: str) -> str:
+        return ""
+
+    def use_base_url(self, base_url: str) -> None:
+        raise NotImplementedError(f"Provider {self.name} nie obsługuje zmiany adresu API")
+
+    async def acquire_capacity(self, messages: list[dict[str, str]], profile: str, max_tokens: int) -> bool:
+        return True
+
     @abstractmethod
     async def health_check(self) -> bool:
         raise NotImplementedError
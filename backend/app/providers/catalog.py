@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+
+@dataclass(slots=True, frozen=True)
+class ModelSpec:
+    provider: str
+    model: str
+    context_window: int
+    input_usd_per_million: float
+    output_usd_per_million: float
+    cached_input_usd_per_million: float | None = None
+
+    @property
+    def cached_input_rate(self) -> float:
+        if self.cached_input_usd_per_million is None:
+            return self.input_usd_per_million
+        return self.cached_input_usd_per_million
+
+    def estimate_cost(self, input_tokens: int, output_tokens: int, cached_input_tokens: int = 0) -> float:
+        cached = min(max(cached_input_tokens, 0), input_tokens)
+        return (
+            (input_tokens - cached) * self.input_usd_per_million
+            + cached * self.cached_input_rate
+            + output_tokens * self.output_usd_per_million
+        ) / 1_000_000
+
+
+_SPECS: tuple[ModelSpec, ...] = (
+    ModelSpec("gemini", "gemini-2.0-flash-lite", 1_048_576, 0.075, 0.30, 0.01875),
+    ModelSpec("gemini", "gemini-2.0-flash", 1_048_576, 0.10, 0.40, 0.025),
+    ModelSpec("gemini", "gemini-2.0-pro", 2_097_152, 1.25, 5.00, 0.3125),
+    ModelSpec("deepseek", "deepseek-chat", 64_000, 0.14, 0.28, 0.014),
+    ModelSpec("deepseek", "deepseek-reasoner", 64_000, 0.55, 2.19, 0.14),
+    ModelSpec("groq", "llama-3.3-70b-versatile", 128_000, 0.0, 0.0),
+    ModelSpec("groq", "mixtral-8x7b-32768", 32_768, 0.0, 0.0),
+    ModelSpec("groq", "gemma2-9b-it", 8_192, 0.0, 0.0),
+    ModelSpec("openrouter", "google/gemma-2-9b-it:free", 8_192, 0.0, 0.0),
+    ModelSpec("openrouter", "meta-llama/llama-3.3-70b-instruct:free", 131_072, 0.0, 0.0),
+    ModelSpec("openrouter", "qwen/qwen-2.5-72b-instruct:free", 32_768, 0.0, 0.0),
+    ModelSpec("grok", "grok-2", 131_072, 5.0, 15.0, 1.25),
+)
+
+MODEL_CATALOG: dict[tuple[str, str], ModelSpec] = {(spec.provider, spec.model): spec for spec in _SPECS}
+
+
+def get_model_spec(provider: str, model: str) -> ModelSpec | None:
+    return MODEL_CATALOG.get((provider.lower(), model))
+
+
+def model_costs(provider: str) -> dict[str, tuple[float, float]]:
+    return {
+        spec.model: (spec.input_usd_per_million, spec.output_usd_per_million)
+        for spec in _SPECS
+        if spec.provider == provider.lower()
+    }
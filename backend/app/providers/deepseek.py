@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from app.core.config import Settings
+from app.providers.catalog import model_costs
 from app.providers.openai_compat import OpenAICompatibleProvider
 
 
@@ -15,9 +16,7 @@ class DeepSeekProvider(OpenAICompatibleProvider):
                 "smart": "deepseek-chat",
                 "deep": "deepseek-reasoner",
             },
-            costs={
-                "deepseek-chat": (0.14, 0.28),
-                "deepseek-reasoner": (0.55, 2.19),
-            },
+            costs=model_costs("deepseek"),
             default_headers=None,
+            max_connections=30,
         )
@@ -1,27 +1,34 @@
 from __future__ import annotations
 
-from app.core.config import Settings
+import asyncio
+import contextlib
+import logging
+import uuid
+from collections.abc import Awaitable, Callable
+
+from redis.asyncio import Redis
+
+from app.core.config import Settings, get_settings
 from app.providers.base import AbstractProvider
 from app.providers.deepseek import DeepSeekProvider
 from app.providers.gemini import GeminiProvider
-from app.providers.groq import GroqProvider
 from app.providers.grok import GrokProvider
+from app.providers.groq import GroqProvider
 from app.providers.openrouter import OpenRouterProvider
 
+logger = logging.getLogger(__name__)
+
+ReloadHook = Callable[[list[str], list[str]], Awaitable[None]]
+
 
 class ProviderFactory:
-    def __init__(self, settings: Settings) -> None:
-        self._registry: dict[str, AbstractProvider] = {}
-        if settings.GEMINI_API_KEY.strip():
-            self.register("gemini", GeminiProvider(settings=settings))
-        if settings.DEEPSEEK_API_KEY.strip():
-            self.register("deepseek", DeepSeekProvider(settings=settings))
-        if settings.GROQ_API_KEY.strip():
-            self.register("groq", GroqProvider(settings=settings))
-        if settings.OPENROUTER_API_KEY.strip():
-            self.register("openrouter", OpenRouterProvider(settings=settings))
-        if settings.XAI_API_KEY.strip():
-            self.register("grok", GrokProvider(settings=settings))
+    def __init__(self, settings: Settings, channel: str = "provider_factory:reload") -> None:
+        self._registry: dict[str, AbstractProvider] = self._build_registry(settings)
+        self._reload_hooks: list[ReloadHook] = []
+        self._channel = channel
+        self._origin = uuid.uuid4().hex
+        self._redis: Redis | None = None
+        self._listener: asyncio.Task[None] | None = None
 
     def register(self, name: str, provider: AbstractProvider) -> None:
         self._registry[name.lower()] = provider
@@ -31,3 +38,86 @@ class ProviderFactory:
 
     def list_available(self) -> list[str]:
         return sorted(self._registry.keys())
+
+    def add_reload_hook(self, hook: ReloadHook) -> None:
+        self._reload_hooks.append(hook)
+
+    def bind(self, redis: Redis | None) -> None:
+        self._redis = redis
+
+    async def start(self) -> None:
+        if self._redis is None or self._listener is not None:
+            return
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is None:
+            return
+        self._listener.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._listener
+        self._listener = None
+
+    async def reload(self, settings: Settings, broadcast: bool = False) -> dict[str, list[str]]:
+        previous = set(self._registry)
+        self._registry = self._build_registry(settings)
+        current = set(self._registry)
+        added = sorted(current - previous)
+        removed = sorted(previous - current)
+        for hook in self._reload_hooks:
+            await hook(added, removed)
+        if broadcast and self._redis is not None:
+            try:
+                await self._redis.publish(self._channel, self._origin)
+            except Exception:
+                logger.warning("Nie udało się rozesłać przeładowania providerów.", exc_info=True)
+        return {"added": added, "removed": removed, "available": self.list_available()}
+
+    async def _listen(self) -> None:
+        assert self._redis is not None
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self._channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message" and message["data"] != self._origin:
+                        get_settings.cache_clear()
+                        result = await self.reload(get_settings())
+                        logger.info("Przeładowano providerów na żądanie innego workera: %s", result["available"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Utracono subskrypcję przeładowań providerów, ponawiam.", exc_info=True)
+                await asyncio.sleep(1.0)
+            finally:
+                with contextlib.suppress(Exception):
+                    await pubsub.aclose()
+
+    @staticmethod
+    def _build_registry(settings: Settings) -> dict[str, AbstractProvider]:
+        registry: dict[str, AbstractProvider] = {}
+        if settings.GEMINI_API_KEY.strip():
+            registry["gemini"] = GeminiProvider(settings=settings)
+        if settings.DEEPSEEK_API_KEY.strip():
+            registry["deepseek"] = DeepSeekProvider(settings=settings)
+        if settings.GROQ_API_KEY.strip():
+            registry["groq"] = GroqProvider(settings=settings)
+        if settings.OPENROUTER_API_KEY.strip():
+            registry["openrouter"] = OpenRouterProvider(settings=settings)
+        if settings.XAI_API_KEY.strip():
+            registry["grok"] = GrokProvider(settings=settings)
+        overrides = parse_base_url_overrides(settings.PROVIDER_BASE_URL_OVERRIDES)
+        for name, provider in registry.items():
+            base_url = overrides.get(name) or (f"{overrides['*'].rstrip('/')}/{name}" if "*" in overrides else None)
+            if base_url:
+                provider.use_base_url(base_url)
+        return registry
+
+
+def parse_base_url_overrides(raw_value: str) -> dict[str, str]:
+    overrides: dict[str, str] = {}
+    for item in raw_value.split(","):
+        name, separator, url = item.partition("=")
+        if separator and name.strip() and url.strip():
+            overrides[name.strip().lower()] = url.strip()
+    return overrides
@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import contextlib
+import json
 import time
+from collections.abc import AsyncIterator
+from typing import Any
 
 import httpx
 
 from app.core.config import Settings
 from app.core.exceptions import ProviderError
-from app.providers.base import AbstractProvider, ProviderResult
+from app.providers.base import AbstractProvider, ProviderResult, ProviderStreamChunk
+from app.providers.catalog import MODEL_CATALOG, get_model_spec
+from app.providers.http_pool import provider_http_pool
+from app.providers.retry import provider_retry_policy
+from app.providers.sse import iter_sse_data
 
 
 class GeminiProvider(AbstractProvider):
@@ -15,10 +23,12 @@ class GeminiProvider(AbstractProvider):
         "smart": "gemini-2.0-flash",
         "deep": "gemini-2.0-pro",
     }
+    MAX_CONNECTIONS = 50
 
     def __init__(self, settings: Settings) -> None:
         self._settings = settings
         self._base_url = "https://generativelanguage.googleapis.com/v1beta/models"
+        provider_http_pool.configure(self.name, max_connections=self.MAX_CONNECTIONS, http2=True)
 
     @property
     def name(self) -> str:
@@ -31,42 +41,122 @@ class GeminiProvider(AbstractProvider):
         max_tokens: int,
         temperature: float,
     ) -> ProviderResult:
-        model = self.PROFILE_MODEL_MAP.get(profile, self.PROFILE_MODEL_MAP["eco"])
+        model = self.resolve_model(profile)
+        start = time.perf_counter()
+        endpoint = f"{self._base_url}/{model}:generateContent"
+        client = provider_http_pool.get_client(self.name)
+        payload = self._build_payload(messages, max_tokens, temperature)
+        try:
+            response = await provider_retry_policy.execute(
+                self.name,
+                lambda: client.post(endpoint, params={"key": self._settings.GEMINI_API_KEY}, json=payload),
+            )
+            response.raise_for_status()
+            data = response.json()
+        except (httpx.HTTPError, ValueError) as exc:
+            raise ProviderError("Błąd wywołania providera Gemini") from exc
+
+        return self._build_result(
+            text=self._extract_text(data),
+            usage=data.get("usageMetadata", {}),
+            model=model,
+            start=start,
+        )
+
+    def resolve_model(self, profile: str) -> str:
+        return self.PROFILE_MODEL_MAP.get(profile, self.PROFILE_MODEL_MAP["eco"])
+
+    def use_base_url(self, base_url: str) -> None:
+        self._base_url = f"{base_url.rstrip('/')}/models"
+
+    async def stream(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> AsyncIterator[ProviderStreamChunk]:
+        model = self.resolve_model(profile)
+        start = time.perf_counter()
+        endpoint = f"{self._base_url}/{model}:streamGenerateContent"
+        client = provider_http_pool.get_client(self.name)
+        parts: list[str] = []
+        usage: dict[str, Any] = {}
+        request = client.build_request(
+            "POST",
+            endpoint,
+            params={"key": self._settings.GEMINI_API_KEY, "alt": "sse"},
+            json=self._build_payload(messages, max_tokens, temperature),
+        )
+        try:
+            response = await provider_retry_policy.execute(self.name, lambda: client.send(request, stream=True))
+            async with contextlib.aclosing(response):
+                if response.status_code >= 400:
+                    await response.aread()
+                    response.raise_for_status()
+                async for data in iter_sse_data(response):
+                    event = json.loads(data)
+                    if isinstance(event.get("usageMetadata"), dict):
+                        usage = event["usageMetadata"]
+                    delta = self._extract_text(event)
+                    if delta:
+                        parts.append(delta)
+                        yield ProviderStreamChunk(text=delta)
+        except (httpx.HTTPError, ValueError, TypeError, AttributeError) as exc:
+            raise ProviderError("Błąd strumieniowania providera Gemini") from exc
+
+        yield ProviderStreamChunk(result=self._build_result(text="".join(parts), usage=usage, model=model, start=start))
+
+    async def health_check(self) -> bool:
+        client = provider_http_pool.get_client(self.name)
+        try:
+            response = await client.get(self._base_url, params={"key": self._settings.GEMINI_API_KEY, "pageSize": 1})
+        except httpx.HTTPError:
+            return False
+        return response.status_code == 200
+
+    def _build_payload(
+        self,
+        messages: list[dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+    ) -> dict[str, Any]:
         contents = [
             {
                 "role": "model" if message.get("role") == "assistant" else "user",
                 "parts": [{"text": message.get("content", "")}],
             }
             for message in messages
+            if message.get("role") != "system"
         ]
-
-        start = time.perf_counter()
-        endpoint = f"{self._base_url}/{model}:generateContent"
-        payload = {
+        payload: dict[str, Any] = {
             "contents": contents,
             "generationConfig": {
                 "temperature": temperature,
                 "maxOutputTokens": max_tokens,
             },
         }
-        try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    endpoint,
-                    params={"key": self._settings.GEMINI_API_KEY},
-                    json=payload,
-                )
-                response.raise_for_status()
-                data = response.json()
-        except httpx.HTTPError as exc:
-            raise ProviderError("Błąd wywołania providera Gemini") from exc
+        system = [{"text": message.get("content", "")} for message in messages if message.get("role") == "system"]
+        if system:
+            payload["systemInstruction"] = {"parts": system}
+        return payload
 
+    def _extract_text(self, data: dict[str, Any]) -> str:
+        candidates = data.get("candidates") or [{}]
+        parts = candidates[0].get("content", {}).get("parts") or [{}]
+        return "".join(str(part.get("text", "")) for part in parts)
+
+    def _build_result(self, text: str, usage: dict[str, Any], model: str, start: float) -> ProviderResult:
         latency_ms = int((time.perf_counter() - start) * 1000)
-        text = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-        usage = data.get("usageMetadata", {})
         input_tokens = int(usage.get("promptTokenCount", 0))
         output_tokens = int(usage.get("candidatesTokenCount", 0))
-        cost = self._calculate_cost(model=model, input_tokens=input_tokens, output_tokens=output_tokens)
+        cached_input_tokens = min(int(usage.get("cachedContentTokenCount", 0)), input_tokens)
+        cost = self._calculate_cost(
+            model=model,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cached_input_tokens=cached_input_tokens,
+        )
 
         return ProviderResult(
             text=text,
@@ -77,25 +167,9 @@ class GeminiProvider(AbstractProvider):
             cost_usd=cost,
             latency_ms=latency_ms,
             fallback_used=False,
+            cached_input_tokens=cached_input_tokens,
         )
 
-    async def health_check(self) -> bool:
-        try:
-            result = await self.generate(
-                messages=[{"role": "user", "content": "ping"}],
-                profile="eco",
-                max_tokens=5,
-                temperature=0.0,
-            )
-            return bool(result.text)
-        except ProviderError:
-            return False
-
-    def _calculate_cost(self, model: str, input_tokens: int, output_tokens: int) -> float:
-        rates = {
-            "gemini-2.0-flash-lite": (0.075 / 1_000_000, 0.30 / 1_000_000),
-            "gemini-2.0-flash": (0.10 / 1_000_000, 0.40 / 1_000_000),
-            "gemini-2.0-pro": (1.25 / 1_000_000, 5.00 / 1_000_000),
-        }
-        in_rate, out_rate = rates.get(model, rates["gemini-2.0-flash-lite"])
-        return (input_tokens * in_rate) + (output_tokens * out_rate)
+    def _calculate_cost(self, model: str, input_tokens: int, output_tokens: int, cached_input_tokens: int = 0) -> float:
+        spec = get_model_spec(self.name, model) or MODEL_CATALOG[(self.name, self.PROFILE_MODEL_MAP["eco"])]
+        return spec.estimate_cost(input_tokens, output_tokens, cached_input_tokens)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from app.core.config import Settings
+from app.providers.catalog import model_costs
 from app.providers.openai_compat import OpenAICompatibleProvider
 
 
@@ -15,6 +16,7 @@ class GrokProvider(OpenAICompatibleProvider):
                 "smart": "grok-2",
                 "deep": "grok-2",
             },
-            costs={"grok-2": (5.0, 15.0)},
+            costs=model_costs("grok"),
             default_headers=None,
+            max_connections=10,
         )
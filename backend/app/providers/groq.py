@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from app.core.config import Settings
+from app.providers.catalog import model_costs
 from app.providers.openai_compat import OpenAICompatibleProvider
 
 
@@ -17,10 +18,12 @@ class GroqProvider(OpenAICompatibleProvider):
                 "smart": "llama-3.3-70b-versatile",
                 "deep": "llama-3.3-70b-versatile",
             },
-            costs={
-                "llama-3.3-70b-versatile": (0.0, 0.0),
-                "mixtral-8x7b-32768": (0.0, 0.0),
-                "gemma2-9b-it": (0.0, 0.0),
+            costs=model_costs("groq"),
+            rate_limits={
+                "llama-3.3-70b-versatile": (30, 12_000),
+                "mixtral-8x7b-32768": (30, 5_000),
+                "gemma2-9b-it": (30, 15_000),
             },
             default_headers=None,
+            max_connections=10,
         )
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import importlib.util
+import logging
+from dataclasses import dataclass, replace
+from typing import Any
+
+import httpx
+
+from app.core.config import Settings
+
+logger = logging.getLogger(__name__)
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+@dataclass(frozen=True, slots=True)
+class HTTPPoolLimits:
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    timeout: float = 60.0
+    connect_timeout: float = 10.0
+    http2: bool = True
+
+
+class ProviderHTTPPool:
+    def __init__(self) -> None:
+        self._defaults = HTTPPoolLimits()
+        self._overrides: dict[str, dict[str, Any]] = {}
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._requests: dict[str, int] = {}
+
+    def open(self, settings: Settings) -> None:
+        self._defaults = HTTPPoolLimits(
+            max_connections=settings.PROVIDER_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.PROVIDER_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.PROVIDER_HTTP_KEEPALIVE_EXPIRY,
+            timeout=settings.PROVIDER_HTTP_TIMEOUT,
+            connect_timeout=settings.PROVIDER_HTTP_CONNECT_TIMEOUT,
+            http2=settings.PROVIDER_HTTP2_ENABLED,
+        )
+
+    def configure(self, name: str, max_connections: int | None = None, http2: bool | None = None) -> None:
+        key = name.lower()
+        if key in self._clients:
+            return
+        overrides: dict[str, Any] = {}
+        if max_connections is not None:
+            overrides["max_connections"] = max_connections
+        if http2 is not None:
+            overrides["http2"] = http2
+        self._overrides[key] = overrides
+
+    def limits_for(self, name: str) -> HTTPPoolLimits:
+        limits = replace(self._defaults, **self._overrides.get(name.lower(), {}))
+        if limits.max_keepalive_connections > limits.max_connections:
+            limits = replace(limits, max_keepalive_connections=limits.max_connections)
+        return limits
+
+    def get_client(self, name: str) -> httpx.AsyncClient:
+        key = name.lower()
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = self._build_client(key)
+            self._clients[key] = client
+        return client
+
+    def warm_up(self, names: list[str]) -> None:
+        for name in names:
+            self.get_client(name)
+
+    async def close_client(self, name: str) -> None:
+        client = self._clients.pop(name.lower(), None)
+        if client is not None:
+            await client.aclose()
+
+    async def aclose(self) -> None:
+        clients = list(self._clients.items())
+        self._clients.clear()
+        for name, client in clients:
+            try:
+                await client.aclose()
+            except Exception:
+                logger.warning("Nie udało się zamknąć klienta HTTP providera %s.", name, exc_info=True)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        result: dict[str, dict[str, Any]] = {}
+        for name, client in self._clients.items():
+            limits = self.limits_for(name)
+            connections = self._pool_connections(client)
+            result[name] = {
+                "max_connections": limits.max_connections,
+                "max_keepalive_connections": limits.max_keepalive_connections,
+                "http2": limits.http2 and HTTP2_AVAILABLE,
+                "connections": len(connections),
+                "idle": sum(1 for conn in connections if conn.is_idle()),
+                "active": sum(1 for conn in connections if not conn.is_idle() and not conn.is_closed()),
+                "http2_connections": sum(1 for conn in connections if self._is_http2(conn)),
+                "requests": self._requests.get(name, 0),
+            }
+        return result
+
+    def _build_client(self, name: str) -> httpx.AsyncClient:
+        limits = self.limits_for(name)
+        http2 = limits.http2 and HTTP2_AVAILABLE
+        if limits.http2 and not HTTP2_AVAILABLE:
+            logger.info("Pakiet h2 nie jest zainstalowany, provider %s użyje HTTP/1.1.", name)
+
+        async def count_request(_: httpx.Request) -> None:
+            self._requests[name] = self._requests.get(name, 0) + 1
+
+        return httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(limits.timeout, connect=limits.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=limits.max_connections,
+                max_keepalive_connections=limits.max_keepalive_connections,
+                keepalive_expiry=limits.keepalive_expiry,
+            ),
+            event_hooks={"request": [count_request]},
+        )
+
+    @staticmethod
+    def _pool_connections(client: httpx.AsyncClient) -> list[Any]:
+        transport = getattr(client, "_transport", None)
+        pool = getattr(transport, "_pool", None)
+        return list(getattr(pool, "connections", []) or [])
+
+    @staticmethod
+    def _is_http2(connection: Any) -> bool:
+        inner = getattr(connection, "_connection", None)
+        return type(inner).__name__ == "AsyncHTTP2Connection"
+
+
+provider_http_pool = ProviderHTTPPool()
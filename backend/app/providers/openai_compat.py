@@ -1,13 +1,30 @@
 from __future__ import annotations
 
-import asyncio
+import contextlib
+import json
 import time
+from collections.abc import AsyncIterator
 from typing import Any
 
 import httpx
 
 from app.core.exceptions import ProviderError
-from app.providers.base import AbstractProvider, ProviderResult
+from app.providers.base import AbstractProvider, ProviderResult, ProviderStreamChunk
+from app.providers.catalog import get_model_spec
+from app.providers.http_pool import provider_http_pool
+from app.providers.rate_limiter import RateLimits, estimate_request_tokens, provider_rate_limiter
+from app.providers.retry import provider_retry_policy
+from app.providers.sse import iter_sse_data
+from app.providers.tokenizer import estimate_messages_tokens, estimate_tokens
+
+
+def cached_prompt_tokens(usage: dict[str, Any]) -> int:
+    if "prompt_cache_hit_tokens" in usage:
+        return int(usage["prompt_cache_hit_tokens"] or 0)
+    details = usage.get("prompt_tokens_details")
+    if isinstance(details, dict):
+        return int(details.get("cached_tokens") or 0)
+    return int(usage.get("cache_read_input_tokens") or 0)
 
 
 class OpenAICompatibleProvider(AbstractProvider):
@@ -19,6 +36,9 @@ class OpenAICompatibleProvider(AbstractProvider):
         models: dict[str, str],
         costs: dict[str, tuple[float, float]],
         default_headers: dict[str, str] | None = None,
+        max_connections: int | None = None,
+        http2: bool | None = None,
+        rate_limits: RateLimits | None = None,
     ) -> None:
         self._name = name
         self._api_key = api_key
@@ -26,6 +46,8 @@ class OpenAICompatibleProvider(AbstractProvider):
         self._models = models
         self._costs = costs
         self._default_headers = default_headers or {}
+        self._rate_limits = rate_limits or {}
+        provider_http_pool.configure(name, max_connections=max_connections, http2=http2)
 
     @property
     def name(self) -> str:
@@ -40,13 +62,14 @@ class OpenAICompatibleProvider(AbstractProvider):
     ) -> ProviderResult:
         model_candidates = self._get_model_candidates(profile)
         last_error: ProviderError | None = None
-        for model_name in model_candidates:
+        for index, model_name in enumerate(model_candidates):
             try:
                 return await self._generate_with_model(
                     messages=messages,
                     model=model_name,
                     max_tokens=max_tokens,
                     temperature=temperature,
+                    reserved=index == 0,
                 )
             except ProviderError as exc:
                 last_error = exc
@@ -54,62 +77,171 @@ class OpenAICompatibleProvider(AbstractProvider):
 
         raise last_error or ProviderError("Nie udało się uzyskać odpowiedzi od providera")
 
+    def resolve_model(self, profile: str) -> str:
+        return self._get_model_candidates(profile)[0]
+
+    def use_base_url(self, base_url: str) -> None:
+        self._base_url = base_url.rstrip("/")
+
+    async def acquire_capacity(self, messages: list[dict[str, str]], profile: str, max_tokens: int) -> bool:
+        return await self._acquire_model(messages, self.resolve_model(profile), max_tokens)
+
+    async def _acquire_model(self, messages: list[dict[str, str]], model: str, max_tokens: int) -> bool:
+        tokens = estimate_request_tokens(messages, max_tokens, self.name)
+        return await provider_rate_limiter.acquire(self.name, model, self._rate_limits, tokens)
+
+    async def _reserve_model(self, messages: list[dict[str, str]], model: str, max_tokens: int, reserved: bool) -> None:
+        if not reserved and not await self._acquire_model(messages, model, max_tokens):
+            raise ProviderError(f"Model {model} providera {self.name} osiągnął limit zapytań")
+
+    async def stream(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> AsyncIterator[ProviderStreamChunk]:
+        model_candidates = self._get_model_candidates(profile)
+        last_error: ProviderError | None = None
+        for index, model_name in enumerate(model_candidates):
+            started = False
+            try:
+                async for chunk in self._stream_with_model(
+                    messages=messages,
+                    model=model_name,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    reserved=index == 0,
+                ):
+                    started = True
+                    yield chunk
+                return
+            except ProviderError as exc:
+                if started:
+                    raise
+                last_error = exc
+                continue
+
+        raise last_error or ProviderError("Nie udało się uzyskać odpowiedzi od providera")
+
     async def _generate_with_model(
         self,
         messages: list[dict[str, str]],
         model: str,
         max_tokens: int,
         temperature: float,
+        reserved: bool = False,
     ) -> ProviderResult:
+        await self._reserve_model(messages, model, max_tokens, reserved)
+        endpoint = f"{self._base_url}/chat/completions"
+        headers = self._build_headers()
+        payload = self._build_payload(messages, model, max_tokens, temperature)
+
+        client = provider_http_pool.get_client(self.name)
+        start = time.perf_counter()
+        try:
+            response = await provider_retry_policy.execute(
+                self.name, lambda: client.post(endpoint, json=payload, headers=headers)
+            )
+            response.raise_for_status()
+            data = response.json()
+        except httpx.TimeoutException as exc:
+            raise ProviderError("Przekroczono limit czasu odpowiedzi providera") from exc
+        except (httpx.HTTPError, ValueError) as exc:
+            raise ProviderError(f"Błąd wywołania providera {self.name}") from exc
+
+        return self._parse_result(data=data, model=model, start=start)
+
+    async def _stream_with_model(
+        self,
+        messages: list[dict[str, str]],
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        reserved: bool = False,
+    ) -> AsyncIterator[ProviderStreamChunk]:
+        await self._reserve_model(messages, model, max_tokens, reserved)
         endpoint = f"{self._base_url}/chat/completions"
-        headers = {
+        payload = self._build_payload(messages, model, max_tokens, temperature)
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+
+        client = provider_http_pool.get_client(self.name)
+        start = time.perf_counter()
+        parts: list[str] = []
+        usage: dict[str, Any] = {}
+        request = client.build_request("POST", endpoint, json=payload, headers=self._build_headers())
+        try:
+            response = await provider_retry_policy.execute(self.name, lambda: client.send(request, stream=True))
+            async with contextlib.aclosing(response):
+                if response.status_code >= 400:
+                    await response.aread()
+                    response.raise_for_status()
+                async for data in iter_sse_data(response):
+                    if data.strip() == "[DONE]":
+                        break
+                    event = json.loads(data)
+                    if isinstance(event.get("usage"), dict):
+                        usage = event["usage"]
+                    for choice in event.get("choices") or []:
+                        delta = (choice.get("delta") or {}).get("content")
+                        if delta:
+                            parts.append(delta)
+                            yield ProviderStreamChunk(text=delta)
+        except httpx.TimeoutException as exc:
+            raise ProviderError("Przekroczono limit czasu odpowiedzi providera") from exc
+        except (httpx.HTTPError, ValueError, TypeError, AttributeError) as exc:
+            raise ProviderError(f"Błąd strumieniowania providera {self.name}") from exc
+
+        text = "".join(parts).strip()
+        if not usage:
+            usage = {
+                "prompt_tokens": estimate_messages_tokens(messages, self.name),
+                "completion_tokens": estimate_tokens(text, self.name),
+            }
+        yield ProviderStreamChunk(result=self._build_result(text=text, usage=usage, model=model, start=start))
+
+    def _build_headers(self) -> dict[str, str]:
+        return {
             "Authorization": f"Bearer {self._api_key}",
             "Content-Type": "application/json",
             **self._default_headers,
         }
-        payload: dict[str, Any] = {
+
+    def _build_payload(
+        self,
+        messages: list[dict[str, str]],
+        model: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> dict[str, Any]:
+        return {
             "model": model,
             "messages": messages,
             "max_tokens": max_tokens,
             "temperature": temperature,
         }
 
-        start = time.perf_counter()
-        last_exc: Exception | None = None
-        for attempt in range(2):
-            try:
-                async with httpx.AsyncClient(timeout=60.0) as client:
-                    response = await client.post(endpoint, json=payload, headers=headers)
-                if response.status_code in {429, 500, 502, 503} and attempt == 0:
-                    await asyncio.sleep(0.2)
-                    continue
-                response.raise_for_status()
-                data = response.json()
-                return self._parse_result(data=data, model=model, start=start)
-            except httpx.TimeoutException as exc:
-                raise ProviderError("Przekroczono limit czasu odpowiedzi providera") from exc
-            except (httpx.HTTPError, ValueError, KeyError, TypeError) as exc:
-                last_exc = exc
-                if isinstance(exc, httpx.HTTPStatusError):
-                    code = exc.response.status_code
-                    if code in {429, 500, 502, 503} and attempt == 0:
-                        await asyncio.sleep(0.2)
-                        continue
-                break
-
-        raise ProviderError(f"Błąd wywołania providera {self.name}") from last_exc
-
     def _parse_result(self, data: dict[str, Any], model: str, start: float) -> ProviderResult:
         try:
             text = str(data["choices"][0]["message"]["content"]).strip()
         except (KeyError, IndexError, TypeError) as exc:
             raise ProviderError("Provider zwrócił nieprawidłowy format odpowiedzi") from exc
 
-        usage = data.get("usage", {})
+        return self._build_result(text=text, usage=data.get("usage") or {}, model=model, start=start)
+
+    def _build_result(self, text: str, usage: dict[str, Any], model: str, start: float) -> ProviderResult:
         input_tokens = int(usage.get("prompt_tokens", 0))
         output_tokens = int(usage.get("completion_tokens", 0))
+        cached_input_tokens = min(cached_prompt_tokens(usage), input_tokens)
         in_rate, out_rate = self._costs.get(model, (0.0, 0.0))
-        cost_usd = (input_tokens * in_rate / 1_000_000) + (output_tokens * out_rate / 1_000_000)
+        spec = get_model_spec(self.name, model)
+        cached_rate = spec.cached_input_rate if spec is not None else in_rate
+        cost_usd = (
+            (input_tokens - cached_input_tokens) * in_rate
+            + cached_input_tokens * cached_rate
+            + output_tokens * out_rate
+        ) / 1_000_000
         latency_ms = int((time.perf_counter() - start) * 1000)
 
         return ProviderResult(
@@ -121,6 +253,7 @@ class OpenAICompatibleProvider(AbstractProvider):
             cost_usd=cost_usd,
             latency_ms=latency_ms,
             fallback_used=False,
+            cached_input_tokens=cached_input_tokens,
         )
 
     def _get_model_candidates(self, profile: str) -> list[str]:
@@ -131,13 +264,9 @@ class OpenAICompatibleProvider(AbstractProvider):
         return [selected, *[model for model in fallback_models if model != selected]]
 
     async def health_check(self) -> bool:
+        client = provider_http_pool.get_client(self.name)
         try:
-            result = await self.generate(
-                messages=[{"role": "user", "content": "ping"}],
-                profile="eco",
-                max_tokens=5,
-                temperature=0.0,
-            )
-            return bool(result.text)
-        except ProviderError:
+            response = await client.get(f"{self._base_url}/models", headers=self._build_headers())
+        except httpx.HTTPError:
             return False
+        return response.status_code == 200
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from app.core.config import Settings
+from app.providers.catalog import model_costs
 from app.providers.openai_compat import OpenAICompatibleProvider
 
 
@@ -15,13 +16,11 @@ class OpenRouterProvider(OpenAICompatibleProvider):
                 "smart": "meta-llama/llama-3.3-70b-instruct:free",
                 "deep": "qwen/qwen-2.5-72b-instruct:free",
             },
-            costs={
-                "google/gemma-2-9b-it:free": (0.0, 0.0),
-                "meta-llama/llama-3.3-70b-instruct:free": (0.0, 0.0),
-                "qwen/qwen-2.5-72b-instruct:free": (0.0, 0.0),
-            },
+            costs=model_costs("openrouter"),
+            rate_limits={"*": (20, None)},
             default_headers={
                 "HTTP-Referer": "https://jarvis-ai.app",
                 "X-Title": "Jarvis AI Aggregator",
             },
+            max_connections=10,
         )
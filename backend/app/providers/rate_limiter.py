@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any
+
+from redis.asyncio import Redis
+
+from app.core.config import Settings
+from app.providers.tokenizer import estimate_messages_tokens
+
+logger = logging.getLogger(__name__)
+
+RateLimits = dict[str, tuple[int | None, int | None]]
+PROVIDER_WIDE = "*"
+WINDOW_SECONDS = 60.0
+
+_ACQUIRE_SCRIPT = """
+local now = redis.call('TIME')
+local now_s = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local window = tonumber(ARGV[1])
+local levels = {}
+for i = 1, #KEYS do
+  local capacity = tonumber(ARGV[i * 2])
+  local cost = tonumber(ARGV[i * 2 + 1])
+  local data = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+  local tokens = tonumber(data[1]) or capacity
+  local ts = tonumber(data[2]) or now_s
+  tokens = math.min(capacity, tokens + math.max(now_s - ts, 0) * capacity / window)
+  if tokens < cost then
+    return 0
+  end
+  levels[i] = tokens - cost
+end
+for i = 1, #KEYS do
+  redis.call('HSET', KEYS[i], 'tokens', levels[i], 'ts', now_s)
+  redis.call('EXPIRE', KEYS[i], math.ceil(window * 2))
+end
+return 1
+"""
+
+
+def estimate_request_tokens(messages: list[dict[str, str]], max_tokens: int, provider: str | None = None) -> int:
+    return estimate_messages_tokens(messages, provider) + max_tokens
+
+
+class ProviderRateLimiter:
+    def __init__(
+        self, redis: Redis | None = None, enabled: bool = True, key_prefix: str = "provider_ratelimit"
+    ) -> None:
+        self._redis = redis
+        self._enabled = enabled
+        self._key_prefix = key_prefix
+        self._script: Any = None
+        self._local: dict[str, tuple[float, float]] = {}
+
+    def configure(self, settings: Settings) -> None:
+        self._enabled = settings.PROVIDER_RATE_LIMITER_ENABLED
+
+    def bind(self, redis: Redis | None) -> None:
+        self._redis = redis
+        self._script = redis.register_script(_ACQUIRE_SCRIPT) if redis is not None else None
+
+    def reset(self) -> None:
+        self._local.clear()
+
+    async def acquire(self, provider: str, model: str, limits: RateLimits, tokens: int) -> bool:
+        if not self._enabled or not limits:
+            return True
+        buckets = self._buckets(provider.lower(), model, limits, tokens)
+        if not buckets:
+            return True
+
+        if self._script is not None:
+            try:
+                allowed = await self._script(
+                    keys=[key for key, _, _ in buckets],
+                    args=[WINDOW_SECONDS, *[value for _, capacity, cost in buckets for value in (capacity, cost)]],
+                )
+                return bool(int(allowed))
+            except Exception:
+                logger.warning("Nie udało się sprawdzić limitu providera %s w Redis.", provider, exc_info=True)
+        return self._acquire_local(buckets)
+
+    def _buckets(self, provider: str, model: str, limits: RateLimits, tokens: int) -> list[tuple[str, int, int]]:
+        buckets: list[tuple[str, int, int]] = []
+        for scope in (PROVIDER_WIDE, model):
+            rpm, tpm = limits.get(scope, (None, None))
+            base = f"{self._key_prefix}:{provider}:{scope}"
+            if rpm:
+                buckets.append((f"{base}:rpm", rpm, 1))
+            if tpm:
+                buckets.append((f"{base}:tpm", tpm, min(max(tokens, 0), tpm)))
+        return buckets
+
+    def _acquire_local(self, buckets: list[tuple[str, int, int]]) -> bool:
+        now = time.monotonic()
+        levels: list[float] = []
+        for key, capacity, cost in buckets:
+            tokens, updated_at = self._local.get(key, (float(capacity), now))
+            tokens = min(float(capacity), tokens + max(now - updated_at, 0.0) * capacity / WINDOW_SECONDS)
+            if tokens < cost:
+                return False
+            levels.append(tokens - cost)
+        for (key, _, _), level in zip(buckets, levels, strict=True):
+            self._local[key] = (level, now)
+        return True
+
+
+provider_rate_limiter = ProviderRateLimiter()
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import re
+import time
+from collections import defaultdict
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+import httpx
+
+from app.core.config import Settings
+from app.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+RATE_LIMIT_RESET_HEADERS = ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens", "x-ratelimit-reset")
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+_deadline: ContextVar[float | None] = ContextVar("provider_request_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[None]:
+    deadline = time.monotonic() + seconds if seconds > 0 else None
+    current = _deadline.get()
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        try:
+            _deadline.reset(token)
+        except ValueError:
+            _deadline.set(current)
+
+
+def remaining_deadline() -> float | None:
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def parse_retry_after(headers: httpx.Headers) -> float | None:
+    value = headers.get("retry-after")
+    if value:
+        value = value.strip()
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            moment = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            moment = None
+        if moment is not None:
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=UTC)
+            return max((moment - datetime.now(tz=UTC)).total_seconds(), 0.0)
+
+    hints = [_parse_duration(headers[name]) for name in RATE_LIMIT_RESET_HEADERS if headers.get(name)]
+    known = [hint for hint in hints if hint is not None]
+    return max(known) if known else None
+
+
+def _parse_duration(value: str) -> float | None:
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts or "".join(number + unit for number, unit in parts) != value:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+@dataclass(slots=True)
+class RetryBudget:
+    ratio: float = 0.1
+    capacity: float = 10.0
+    balance: float = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.balance = self.capacity
+
+    def deposit(self) -> None:
+        self.balance = min(self.balance + self.ratio, self.capacity)
+
+    def withdraw(self) -> bool:
+        if self.balance < 1.0:
+            return False
+        self.balance -= 1.0
+        return True
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.25,
+        max_delay: float = 8.0,
+        budget_ratio: float = 0.1,
+        budget_capacity: float = 10.0,
+        sleep: Callable[[float], Awaitable[Any]] | None = None,
+        rng: random.Random | None = None,
+    ) -> None:
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._budget_ratio = budget_ratio
+        self._budget_capacity = budget_capacity
+        self._sleep = sleep or asyncio.sleep
+        self._rng = rng or random.Random()
+        self._budgets: dict[str, RetryBudget] = {}
+        self._attempts: dict[tuple[str, str], int] = defaultdict(int)
+        self._outcomes: dict[tuple[str, str], int] = defaultdict(int)
+        self._sleep_seconds: dict[str, float] = defaultdict(float)
+
+    def configure(self, settings: Settings) -> None:
+        self._max_attempts = max(settings.PROVIDER_RETRY_MAX_ATTEMPTS, 1)
+        self._base_delay = settings.PROVIDER_RETRY_BASE_DELAY_MS / 1000
+        self._max_delay = settings.PROVIDER_RETRY_MAX_DELAY_MS / 1000
+        self._budget_ratio = settings.PROVIDER_RETRY_BUDGET_RATIO
+        self._budget_capacity = settings.PROVIDER_RETRY_BUDGET_CAPACITY
+        self._budgets.clear()
+
+    def reset(self) -> None:
+        self._budgets.clear()
+        self._attempts.clear()
+        self._outcomes.clear()
+        self._sleep_seconds.clear()
+
+    def backoff(self, attempt: int, hint: float | None = None) -> float:
+        ceiling = min(self._max_delay, self._base_delay * (2**attempt))
+        jitter = self._rng.uniform(0.0, ceiling)
+        if hint is None:
+            return jitter
+        return hint + self._rng.uniform(0.0, min(self._base_delay, ceiling))
+
+    async def execute(self, provider: str, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        budget = self._budget(provider)
+        budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                with tracer.span("provider_http", provider=provider, attempt=attempt) as span:
+                    async with asyncio.timeout(remaining_deadline()):
+                        response = await send()
+                    if span is not None:
+                        span.attributes["status"] = response.status_code
+            except TimeoutError as exc:
+                self._record_attempt(provider, "timeout")
+                self._outcomes[(provider, "deadline")] += 1
+                raise httpx.TimeoutException("Przekroczono termin żądania do providera") from exc
+            except httpx.TransportError as exc:
+                if isinstance(exc, httpx.TimeoutException):
+                    self._record_attempt(provider, "timeout")
+                    self._outcomes[(provider, "error")] += 1
+                    raise
+                self._record_attempt(provider, "transport_error")
+                delay = self._next_delay(provider, attempt, None, budget)
+                if delay is None:
+                    raise
+            else:
+                status = response.status_code
+                self._record_attempt(provider, str(status))
+                if status not in RETRYABLE_STATUS_CODES:
+                    self._outcomes[(provider, "success" if status < 400 else "error")] += 1
+                    return response
+                delay = self._next_delay(provider, attempt, response, budget)
+                if delay is None:
+                    return response
+                await response.aclose()
+
+            attempt += 1
+            self._sleep_seconds[provider] += delay
+            logger.debug("Ponawiam wywołanie providera %s za %.2f s (próba %d).", provider, delay, attempt + 1)
+            await self._sleep(delay)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        result: dict[str, dict[str, Any]] = {}
+        for (provider, status), count in self._attempts.items():
+            entry = result.setdefault(provider, {"attempts": {}, "outcomes": {}, "sleep_seconds": 0.0})
+            entry["attempts"][status] = count
+        for (provider, outcome), count in self._outcomes.items():
+            entry = result.setdefault(provider, {"attempts": {}, "outcomes": {}, "sleep_seconds": 0.0})
+            entry["outcomes"][outcome] = count
+        for provider, entry in result.items():
+            entry["sleep_seconds"] = round(self._sleep_seconds.get(provider, 0.0), 3)
+            budget = self._budgets.get(provider)
+            entry["budget"] = round(budget.balance, 2) if budget is not None else self._budget_capacity
+        return result
+
+    def _next_delay(
+        self,
+        provider: str,
+        attempt: int,
+        response: httpx.Response | None,
+        budget: RetryBudget,
+    ) -> float | None:
+        if attempt + 1 >= self._max_attempts:
+            self._outcomes[(provider, "exhausted")] += 1
+            return None
+
+        hint = parse_retry_after(response.headers) if response is not None else None
+        if hint is not None and hint > self._max_delay:
+            self._outcomes[(provider, "retry_after_too_long")] += 1
+            return None
+
+        delay = self.backoff(attempt, hint)
+        remaining = remaining_deadline()
+        if remaining is not None and delay >= remaining:
+            self._outcomes[(provider, "deadline")] += 1
+            return None
+
+        if not budget.withdraw():
+            self._outcomes[(provider, "budget_exhausted")] += 1
+            return None
+
+        self._outcomes[(provider, "retried")] += 1
+        return delay
+
+    def _record_attempt(self, provider: str, status: str) -> None:
+        self._attempts[(provider, status)] += 1
+
+    def _budget(self, provider: str) -> RetryBudget:
+        budget = self._budgets.get(provider)
+        if budget is None:
+            budget = RetryBudget(ratio=self._budget_ratio, capacity=self._budget_capacity)
+            self._budgets[provider] = budget
+        return budget
+
+
+provider_retry_policy = RetryPolicy()
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+
+
+@dataclass(slots=True, frozen=True)
+class TokenizerProfile:
+    ascii_chars_per_token: float
+    other_chars_per_token: float
+    message_overhead: int
+
+
+DEFAULT_TOKENIZER = TokenizerProfile(ascii_chars_per_token=3.5, other_chars_per_token=1.8, message_overhead=4)
+
+TOKENIZERS: dict[str, TokenizerProfile] = {
+    "gemini": TokenizerProfile(ascii_chars_per_token=4.0, other_chars_per_token=2.5, message_overhead=3),
+    "deepseek": TokenizerProfile(ascii_chars_per_token=3.6, other_chars_per_token=1.8, message_overhead=4),
+    "groq": TokenizerProfile(ascii_chars_per_token=3.9, other_chars_per_token=2.0, message_overhead=4),
+    "openrouter": TokenizerProfile(ascii_chars_per_token=3.5, other_chars_per_token=1.8, message_overhead=4),
+    "grok": TokenizerProfile(ascii_chars_per_token=3.8, other_chars_per_token=2.0, message_overhead=4),
+}
+
+
+def tokenizer_for(provider: str | None) -> TokenizerProfile:
+    return TOKENIZERS.get((provider or "").lower(), DEFAULT_TOKENIZER)
+
+
+def estimate_tokens(text: str, provider: str | None = None) -> int:
+    if not text:
+        return 0
+    profile = tokenizer_for(provider)
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    other_chars = len(text) - ascii_chars
+    return math.ceil(ascii_chars / profile.ascii_chars_per_token + other_chars / profile.other_chars_per_token)
+
+
+def estimate_message_tokens(message: dict[str, str], provider: str | None = None) -> int:
+    return estimate_tokens(message.get("content", ""), provider) + tokenizer_for(provider).message_overhead
+
+
+def estimate_messages_tokens(messages: list[dict[str, str]], provider: str | None = None) -> int:
+    return sum(estimate_message_tokens(message, provider) for message in messages) + 3
@@ -0,0 +1,349 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import uuid
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import Settings, get_settings
+from app.core.exceptions import AllProvidersFailedError, JarvisBaseError, PolicyDeniedError
+from app.core.metrics import observe_provider_result
+from app.db.models import BatchItem, BatchJob, UsageLedger, User
+from app.providers.base import ProviderResult
+from app.services.model_router import ModelRouter
+from app.services.orchestrator import Orchestrator, provider_slot_scope
+from app.services.policy_engine import PolicyEngine, policy_engine
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL_STATUSES = frozenset({COMPLETED, FAILED, CANCELLED})
+
+ItemOutcome = tuple[str, ProviderResult | str]
+
+
+@dataclass(slots=True)
+class ChunkAllowance:
+    budget_usd: float
+    grok_calls: int | None = None
+    smart_credits: int | None = None
+
+    def denial(self, provider: str) -> str | None:
+        if self.budget_usd <= 0:
+            return "Przekroczono limit: wyczerpany dzienny budżet"
+        if self.grok_calls is not None and provider == "grok" and self.grok_calls <= 0:
+            return "Przekroczono limit: wyczerpany dzienny limit grok"
+        if self.smart_credits is not None and self.smart_credits <= 0:
+            return "Przekroczono limit: wyczerpane kredyty smart"
+        return None
+
+    def consume(self, result: ProviderResult, smart_credits: int) -> None:
+        self.budget_usd -= result.cost_usd
+        if self.grok_calls is not None and result.provider == "grok":
+            self.grok_calls -= 1
+        if self.smart_credits is not None:
+            self.smart_credits -= smart_credits
+
+
+class BatchService:
+    def __init__(
+        self,
+        policy_engine_instance: PolicyEngine | None = None,
+        max_items: int = 5000,
+        chunk_size: int = 50,
+        provider_concurrency: int = 4,
+        max_attempts: int = 3,
+        retry_delay_seconds: float = 2.0,
+    ) -> None:
+        self._policy_engine = policy_engine_instance or policy_engine
+        self._model_router = ModelRouter()
+        self._max_items = max_items
+        self._chunk_size = chunk_size
+        self._provider_concurrency = provider_concurrency
+        self._max_attempts = max_attempts
+        self._retry_delay_seconds = retry_delay_seconds
+        self._slots: dict[str, asyncio.Semaphore] = {}
+
+    def configure(self, settings: Settings) -> None:
+        self._max_items = settings.BATCH_MAX_ITEMS
+        self._chunk_size = max(settings.BATCH_CHUNK_SIZE, 1)
+        self._provider_concurrency = max(settings.BATCH_PROVIDER_CONCURRENCY, 1)
+        self._max_attempts = max(settings.BATCH_ITEM_MAX_ATTEMPTS, 1)
+        self._retry_delay_seconds = settings.BATCH_RETRY_DELAY_SECONDS
+        self._slots.clear()
+
+    def reset(self) -> None:
+        self._slots.clear()
+
+    async def submit(
+        self,
+        user: User,
+        prompts: Sequence[str],
+        mode: str,
+        provider_pref: str | None,
+        db: AsyncSession,
+    ) -> BatchJob:
+        cleaned = [prompt.strip() for prompt in prompts]
+        if not cleaned or not all(cleaned):
+            raise JarvisBaseError("Lista promptów nie może być pusta ani zawierać pustych wpisów", 422)
+        if len(cleaned) > self._max_items:
+            raise JarvisBaseError(f"Zadanie może zawierać najwyżej {self._max_items} promptów", 422)
+
+        access = await self._policy_engine.check_access(user, provider_pref, db, get_settings())
+        if not access.allowed:
+            raise PolicyDeniedError(access.denied_reason or "Brak dostępu")
+
+        job = BatchJob(
+            user_id=user.id,
+            status=QUEUED,
+            mode=mode.lower(),
+            provider_pref=provider_pref.lower() if provider_pref else None,
+            total=len(cleaned),
+            completed=0,
+            failed=0,
+            cost_usd=Decimal(0),
+        )
+        job.items = [BatchItem(position=position, prompt=prompt) for position, prompt in enumerate(cleaned)]
+        try:
+            db.add(job)
+            await db.commit()
+        except SQLAlchemyError as exc:
+            await db.rollback()
+            raise JarvisBaseError("Nie udało się utworzyć zadania wsadowego", 500) from exc
+        return job
+
+    async def get_job(self, job_id: uuid.UUID, user: User, db: AsyncSession) -> BatchJob | None:
+        result = await db.execute(select(BatchJob).where(BatchJob.id == job_id, BatchJob.user_id == user.id))
+        return result.scalar_one_or_none()
+
+    async def list_items(self, job_id: uuid.UUID, offset: int, limit: int, db: AsyncSession) -> list[BatchItem]:
+        result = await db.execute(
+            select(BatchItem).where(BatchItem.job_id == job_id).order_by(BatchItem.position).offset(offset).limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def cancel(self, job: BatchJob, db: AsyncSession) -> BatchJob:
+        if job.status in TERMINAL_STATUSES:
+            return job
+        job.status = CANCELLED
+        job.finished_at = datetime.now(tz=UTC)
+        await db.commit()
+        return job
+
+    async def mark_failed(self, job: BatchJob, reason: str, db: AsyncSession) -> None:
+        job.status = FAILED
+        job.error = reason
+        job.finished_at = datetime.now(tz=UTC)
+        await db.commit()
+
+    async def process(self, job_id: uuid.UUID, orchestrator: Orchestrator, db: AsyncSession) -> BatchJob | None:
+        job = await db.get(BatchJob, job_id)
+        if job is None or job.status in TERMINAL_STATUSES:
+            return job
+        user = await db.get(User, job.user_id)
+        if user is None:
+            await self.mark_failed(job, "Użytkownik nie istnieje", db)
+            return job
+
+        job.status = RUNNING
+        job.started_at = job.started_at or datetime.now(tz=UTC)
+        await db.commit()
+        logger.info("Start zadania wsadowego %s (%d promptów).", job.id, job.total)
+
+        settings = get_settings()
+        while True:
+            await db.refresh(job, ["status"])
+            if job.status == CANCELLED:
+                break
+
+            access = await self._policy_engine.check_access(user, job.provider_pref, db, settings)
+            if not access.allowed:
+                await self._fail_pending(job, access.denied_reason or "Brak dostępu", db)
+                break
+
+            result = await db.execute(
+                select(BatchItem)
+                .where(BatchItem.job_id == job.id, BatchItem.status == "pending")
+                .order_by(BatchItem.position)
+                .limit(self._chunk_size)
+            )
+            items = list(result.scalars().all())
+            if not items:
+                break
+
+            allowance = await self._allowance(user, access.budget_remaining, db, settings)
+            await db.commit()
+            outcomes = await asyncio.gather(
+                *(self._run_item(orchestrator, user, job, item, allowance) for item in items)
+            )
+            await self._flush(job, user, items, outcomes, db)
+
+        if job.status == RUNNING:
+            job.status = COMPLETED
+            job.finished_at = datetime.now(tz=UTC)
+            await db.commit()
+        logger.info(
+            "Zadanie wsadowe %s zakończone: %s (%d ok, %d błędów).", job.id, job.status, job.completed, job.failed
+        )
+        return job
+
+    async def _run_item(
+        self,
+        orchestrator: Orchestrator,
+        user: User,
+        job: BatchJob,
+        item: BatchItem,
+        allowance: ChunkAllowance,
+    ) -> ItemOutcome:
+        @contextlib.asynccontextmanager
+        async def slot(provider: str) -> AsyncIterator[None]:
+            async with self._slot(provider):
+                denial = allowance.denial(provider)
+                if denial is not None:
+                    raise PolicyDeniedError(denial)
+                yield
+
+        error = "Nie udało się przetworzyć promptu"
+        for attempt in range(1, self._max_attempts + 1):
+            item.attempts += 1
+            try:
+                with provider_slot_scope(slot):
+                    mode, result = await orchestrator.run_prompt(
+                        user=user,
+                        prompt=item.prompt,
+                        provider_pref=job.provider_pref,
+                        mode=job.mode,
+                        budget_remaining=allowance.budget_usd,
+                    )
+                allowance.consume(result, self._smart_credits(mode, result))
+                return mode, result
+            except AllProvidersFailedError as exc:
+                error = exc.detail
+            except JarvisBaseError as exc:
+                return job.mode, exc.detail
+            if attempt < self._max_attempts:
+                await asyncio.sleep(self._retry_delay_seconds * attempt)
+        return job.mode, error
+
+    async def _flush(
+        self,
+        job: BatchJob,
+        user: User,
+        items: list[BatchItem],
+        outcomes: Sequence[ItemOutcome],
+        db: AsyncSession,
+    ) -> None:
+        now = datetime.now(tz=UTC)
+        ledgers: list[UsageLedger] = []
+        counters: dict[str, tuple[int, float, int]] = {}
+        for item, (mode, outcome) in zip(items, outcomes, strict=True):
+            item.completed_at = now
+            if isinstance(outcome, str):
+                item.status = FAILED
+                item.error = outcome
+                job.failed += 1
+                continue
+
+            cost = Decimal(str(outcome.cost_usd))
+            item.status = "done"
+            item.response = outcome.text
+            item.provider = outcome.provider
+            item.model = outcome.model
+            item.input_tokens = outcome.input_tokens
+            item.output_tokens = outcome.output_tokens
+            item.cost_usd = cost
+            item.latency_ms = outcome.latency_ms
+            job.completed += 1
+            job.cost_usd = Decimal(job.cost_usd or 0) + cost
+            ledgers.append(
+                UsageLedger(
+                    user_id=user.id,
+                    session_id=None,
+                    provider=outcome.provider,
+                    model=outcome.model,
+                    profile=mode,
+                    input_tokens=outcome.input_tokens,
+                    output_tokens=outcome.output_tokens,
+                    cached_input_tokens=outcome.cached_input_tokens,
+                    cost_usd=cost,
+                    latency_ms=outcome.latency_ms,
+                    fallback_used=outcome.fallback_used,
+                    cache_hit=outcome.cache_hit,
+                    coalesced=outcome.coalesced,
+                )
+            )
+            observe_provider_result(outcome, mode)
+            smart_credits = self._smart_credits(mode, outcome)
+            calls, spent, credits = counters.get(outcome.provider, (0, 0.0, 0))
+            counters[outcome.provider] = (calls + 1, spent + outcome.cost_usd, credits + smart_credits)
+
+        try:
+            db.add_all(ledgers)
+            for provider, (calls, spent, credits) in counters.items():
+                await self._policy_engine.increment_counters(
+                    user=user,
+                    provider=provider,
+                    cost=spent,
+                    smart_credits=credits,
+                    db=db,
+                    calls=calls,
+                    commit=False,
+                )
+            await db.commit()
+        except SQLAlchemyError as exc:
+            await db.rollback()
+            raise JarvisBaseError("Nie udało się zapisać wyników zadania wsadowego", 500) from exc
+
+    async def _fail_pending(self, job: BatchJob, reason: str, db: AsyncSession) -> None:
+        result = await db.execute(select(BatchItem).where(BatchItem.job_id == job.id, BatchItem.status == "pending"))
+        items = list(result.scalars().all())
+        now = datetime.now(tz=UTC)
+        for item in items:
+            item.status = FAILED
+            item.error = reason
+            item.completed_at = now
+        job.failed += len(items)
+        job.status = FAILED
+        job.error = reason
+        job.finished_at = now
+        await db.commit()
+        logger.warning("Zadanie wsadowe %s przerwane: %s", job.id, reason)
+
+    async def _allowance(
+        self, user: User, budget_remaining: float, db: AsyncSession, settings: Settings
+    ) -> ChunkAllowance:
+        allowance = ChunkAllowance(budget_usd=budget_remaining)
+        if user.subscription_tier != "free":
+            return allowance
+        remaining = await self._policy_engine.get_remaining_limits(user, db, settings)
+        allowance.grok_calls = remaining["grok_remaining"]
+        if not self._policy_engine.get_effective_limits(user)["smart_unlimited"]:
+            allowance.smart_credits = remaining["smart_credits_remaining"]
+        return allowance
+
+    def _smart_credits(self, mode: str, result: ProviderResult) -> int:
+        if mode not in {"smart", "deep"}:
+            return 0
+        return self._model_router.calculate_smart_credits(result.input_tokens, result.output_tokens)
+
+    def _slot(self, provider: str) -> asyncio.Semaphore:
+        slot = self._slots.get(provider)
+        if slot is None:
+            slot = asyncio.Semaphore(self._provider_concurrency)
+            self._slots[provider] = slot
+        return slot
+
+
+batch_service = BatchService()
@@ -1,27 +1,70 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import uuid
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import AbstractAsyncContextManager
+from contextvars import ContextVar
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Any
 
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.circuit_breaker import CircuitBreaker
+from app.core.circuit_breaker import OPEN, CircuitBreaker, circuit_breaker
 from app.core.config import get_settings
 from app.core.exceptions import (
     AllProvidersFailedError,
+    InsufficientCreditsError,
     JarvisBaseError,
     PolicyDeniedError,
     ProviderError,
 )
+from app.core.metrics import observe_provider_result
+from app.core.tracing import tracer
 from app.db.models import ChatSession, Message, User, UserRole
-from app.providers.base import ProviderResult
+from app.providers.base import AbstractProvider, ProviderResult, ProviderStreamChunk
+from app.providers.catalog import get_model_spec
 from app.providers.factory import ProviderFactory
+from app.providers.retry import deadline_scope
+from app.providers.tokenizer import estimate_message_tokens, estimate_messages_tokens, estimate_tokens
 from app.services.model_router import ModelRouter
 from app.services.policy_engine import PolicyEngine, policy_engine
+from app.services.provider_scoreboard import ProviderScoreboard, provider_scoreboard
+from app.services.response_cache import ResponseCache, cache_key, response_cache
+from app.services.semantic_cache import SemanticCache, semantic_cache
+from app.services.session_summarizer import SessionSummarizer, session_summarizer, summary_message
+from app.services.single_flight import SingleFlight, single_flight
 from app.services.usage_service import UsageService, usage_service
 
+CHAT_MAX_TOKENS = 1200
+CHAT_TEMPERATURE = 0.7
+
+ProviderSlot = Callable[[str], AbstractAsyncContextManager[None]]
+
+_provider_slot: ContextVar[ProviderSlot | None] = ContextVar("provider_slot", default=None)
+
+
+@contextlib.contextmanager
+def provider_slot_scope(slot: ProviderSlot) -> Iterator[None]:
+    token = _provider_slot.set(slot)
+    try:
+        yield
+    finally:
+        _provider_slot.reset(token)
+
+
+@dataclass(slots=True)
+class ChatTurn:
+    session: ChatSession
+    prompt: str
+    messages: list[dict[str, str]]
+    mode: str
+    routing_note: str | None
+    budget_remaining: float | None = None
+
 
 class Orchestrator:
     def __init__(
@@ -30,11 +73,23 @@ class Orchestrator:
         provider_factory: ProviderFactory,
         usage_service_instance: UsageService,
         model_router: ModelRouter | None = None,
+        scoreboard: ProviderScoreboard | None = None,
+        breaker: CircuitBreaker | None = None,
+        cache: ResponseCache | None = None,
+        semantic: SemanticCache | None = None,
+        coalescer: SingleFlight | None = None,
+        summarizer: SessionSummarizer | None = None,
     ) -> None:
         self._policy_engine = policy_engine_instance
         self._provider_factory = provider_factory
         self._usage_service = usage_service_instance
         self._model_router = model_router or ModelRouter()
+        self._scoreboard = scoreboard or provider_scoreboard
+        self._breaker = breaker or circuit_breaker
+        self._response_cache = cache or response_cache
+        self._semantic_cache = semantic or semantic_cache
+        self._single_flight = coalescer or single_flight
+        self._summarizer = summarizer or session_summarizer
 
     async def process_chat(
         self,
@@ -45,51 +100,232 @@ class Orchestrator:
         mode: str,
         db: AsyncSession,
     ) -> dict[str, Any]:
+        turn = await self._prepare_turn(user, prompt, session_id, provider_pref, mode, db)
+        semantic_scope = self._semantic_scope(user, provider_pref)
+        semantic_hit = None
+        if self._semantic_cache.is_cacheable(turn.mode, turn.messages):
+            with tracer.span("semantic_cache"):
+                semantic_hit = self._semantic_cache.lookup(turn.prompt, turn.mode, semantic_scope)
+
+        if semantic_hit is not None and not semantic_hit.verify:
+            provider_result = semantic_hit.result
+        else:
+            with deadline_scope(get_settings().PROVIDER_REQUEST_DEADLINE_SECONDS), tracer.span("provider") as span:
+                provider_result = await self._run_with_fallback_chain(
+                    user=user,
+                    provider_pref=provider_pref,
+                    mode=turn.mode,
+                    messages=turn.messages,
+                    budget_remaining=turn.budget_remaining,
+                    affinity=self._session_affinity(turn.session),
+                )
+                if span is not None:
+                    span.attributes.update(provider=provider_result.provider, model=provider_result.model)
+            if self._semantic_cache.is_cacheable(turn.mode, turn.messages) and (
+                semantic_hit is None or not self._semantic_cache.verify(semantic_hit, provider_result)
+            ):
+                self._semantic_cache.store(turn.prompt, turn.mode, semantic_scope, provider_result)
+                await self._semantic_cache.maybe_snapshot()
+        return await self._complete_turn(user=user, turn=turn, provider_result=provider_result, db=db)
+
+    async def run_prompt(
+        self,
+        user: User,
+        prompt: str,
+        provider_pref: str | None,
+        mode: str,
+        budget_remaining: float,
+    ) -> tuple[str, ProviderResult]:
+        selected_mode = self._resolve_mode(user=user, prompt=prompt, mode=mode, budget=budget_remaining)
+        with deadline_scope(get_settings().PROVIDER_REQUEST_DEADLINE_SECONDS):
+            result = await self._run_with_fallback_chain(
+                user=user,
+                provider_pref=provider_pref,
+                mode=selected_mode,
+                messages=[{"role": "user", "content": prompt}],
+                budget_remaining=budget_remaining,
+            )
+        return selected_mode, result
+
+    async def stream_chat(
+        self,
+        user: User,
+        prompt: str,
+        session_id: uuid.UUID | None,
+        provider_pref: str | None,
+        mode: str,
+        db: AsyncSession,
+    ) -> AsyncIterator[tuple[str, dict[str, Any]]]:
+        turn = await self._prepare_turn(user, prompt, session_id, provider_pref, mode, db)
+        return self._stream_turn(user=user, turn=turn, provider_pref=provider_pref, db=db)
+
+    async def _stream_turn(
+        self,
+        user: User,
+        turn: ChatTurn,
+        provider_pref: str | None,
+        db: AsyncSession,
+    ) -> AsyncIterator[tuple[str, dict[str, Any]]]:
+        if turn.routing_note:
+            yield "token", {"delta": f"{turn.routing_note}\n\n"}
+
+        provider_result: ProviderResult | None = None
+        try:
+            with tracer.span("provider", stream=True):
+                async for chunk in self._stream_with_fallback_chain(
+                    user=user,
+                    provider_pref=provider_pref,
+                    mode=turn.mode,
+                    messages=turn.messages,
+                    budget_remaining=turn.budget_remaining,
+                    affinity=self._session_affinity(turn.session),
+                ):
+                    if chunk.text:
+                        yield "token", {"delta": chunk.text}
+                    if chunk.result is not None:
+                        provider_result = chunk.result
+            if provider_result is None:
+                raise ProviderError("Provider zakończył strumień bez wyniku")
+            payload = await self._complete_turn(user=user, turn=turn, provider_result=provider_result, db=db)
+        except JarvisBaseError as exc:
+            yield "error", {"type": exc.__class__.__name__, "detail": exc.detail}
+            return
+        yield "done", payload
+
+    async def _prepare_turn(
+        self,
+        user: User,
+        prompt: str,
+        session_id: uuid.UUID | None,
+        provider_pref: str | None,
+        mode: str,
+        db: AsyncSession,
+    ) -> ChatTurn:
         settings = get_settings()
         requested_provider = (provider_pref or "gemini").lower()
-        access = await self._policy_engine.check_access(user, requested_provider, db, settings)
+        with tracer.span("policy"):
+            access = await self._policy_engine.check_access(user, requested_provider, db, settings)
         if not access.allowed:
             raise PolicyDeniedError(access.denied_reason or "Brak dostępu")
 
-        session = await self._get_or_create_session(user, session_id, mode, provider_pref, db)
-        history = await self._get_history(session.id, db)
-        messages = history + [{"role": "user", "content": prompt}]
-
+        with tracer.span("session"):
+            session = await self._get_or_create_session(user, session_id, mode, provider_pref, db)
+        tracer.tag(session_id=session.id)
         selected_mode = self._resolve_mode(user=user, prompt=prompt, mode=mode, budget=access.budget_remaining)
-        selected_mode, routing_note = await self._apply_demo_credit_fallback(
-            user=user,
-            mode=selected_mode,
-            db=db,
-            settings=settings,
-        )
-
-        provider_result = await self._run_with_fallback_chain(
-            user=user,
-            provider_pref=provider_pref,
+        with tracer.span("policy"):
+            selected_mode, routing_note = await self._apply_demo_credit_fallback(
+                user=user,
+                mode=selected_mode,
+                db=db,
+                settings=settings,
+            )
+        with tracer.span("history"):
+            history = await self._get_history(session, prompt, selected_mode, db)
+        return ChatTurn(
+            session=session,
+            prompt=prompt,
+            messages=history + [{"role": "user", "content": prompt}],
             mode=selected_mode,
-            messages=messages,
+            routing_note=routing_note,
+            budget_remaining=access.budget_remaining,
         )
 
+    async def _complete_turn(
+        self,
+        user: User,
+        turn: ChatTurn,
+        provider_result: ProviderResult,
+        db: AsyncSession,
+    ) -> dict[str, Any]:
+        session = turn.session
         smart_credits = 0
-        if selected_mode in {"smart", "deep"}:
+        if turn.mode in {"smart", "deep"}:
             smart_credits = self._model_router.calculate_smart_credits(
                 provider_result.input_tokens,
                 provider_result.output_tokens,
             )
 
+        reply_text = provider_result.text
+        if turn.routing_note:
+            reply_text = f"{turn.routing_note}\n\n{reply_text}"
+
+        try:
+            with tracer.span("ledger"):
+                await self.record_usage(
+                    user=user,
+                    session_id=session.id,
+                    mode=turn.mode,
+                    provider_result=provider_result,
+                    db=db,
+                    smart_credits=smart_credits,
+                    commit=False,
+                )
+            with tracer.span("save"):
+                await self._save_messages(
+                    session=session,
+                    prompt=turn.prompt,
+                    reply=reply_text,
+                    affinity=None
+                    if provider_result.cache_hit or provider_result.coalesced
+                    else (provider_result.provider, provider_result.model),
+                    db=db,
+                )
+                await db.commit()
+        except JarvisBaseError:
+            await db.rollback()
+            raise
+        except Exception as exc:
+            await db.rollback()
+            raise JarvisBaseError("Nie udało się zapisać wiadomości", 500) from exc
+        self._summarizer.schedule(session, self)
+
+        return {
+            "response": reply_text,
+            "meta": {
+                "model": provider_result.model,
+                "provider": provider_result.provider,
+                "cost_usd": provider_result.cost_usd,
+                "input_tokens": provider_result.input_tokens,
+                "output_tokens": provider_result.output_tokens,
+                "latency_ms": provider_result.latency_ms,
+                "fallback_used": provider_result.fallback_used,
+                "hedged": provider_result.hedged,
+                "cache_hit": provider_result.cache_hit,
+                "coalesced": provider_result.coalesced,
+                "cached_input_tokens": provider_result.cached_input_tokens,
+                "profile": turn.mode,
+            },
+            "session_id": str(session.id),
+        }
+
+    async def record_usage(
+        self,
+        user: User,
+        session_id: uuid.UUID | None,
+        mode: str,
+        provider_result: ProviderResult,
+        db: AsyncSession,
+        smart_credits: int = 0,
+        commit: bool = True,
+    ) -> None:
         await self._usage_service.log_request(
             db=db,
             user_id=user.id,
-            session_id=session.id,
+            session_id=session_id,
             provider=provider_result.provider,
             model=provider_result.model,
-            profile=selected_mode,
+            profile=mode,
             input_tokens=provider_result.input_tokens,
             output_tokens=provider_result.output_tokens,
             cost_usd=provider_result.cost_usd,
             latency_ms=provider_result.latency_ms,
             fallback_used=provider_result.fallback_used,
+            cache_hit=provider_result.cache_hit,
+            coalesced=provider_result.coalesced,
+            cached_input_tokens=provider_result.cached_input_tokens,
+            commit=False,
         )
+        observe_provider_result(provider_result, mode)
 
         await self._policy_engine.increment_counters(
             user=user,
@@ -97,41 +333,45 @@ class Orchestrator:
             cost=provider_result.cost_usd,
             smart_credits=smart_credits,
             db=db,
+            commit=commit,
         )
 
-        reply_text = provider_result.text
-        if routing_note:
-            reply_text = f"{routing_note}\n\n{reply_text}"
-
-        await self._save_messages(session=session, prompt=prompt, reply=reply_text, db=db)
-
-        return {
-            "response": reply_text,
-            "meta": {
-                "model": provider_result.model,
-                "provider": provider_result.provider,
-                "cost_usd": provider_result.cost_usd,
-                "input_tokens": provider_result.input_tokens,
-                "output_tokens": provider_result.output_tokens,
-                "latency_ms": provider_result.latency_ms,
-                "fallback_used": provider_result.fallback_used,
-                "profile": selected_mode,
-            },
-            "session_id": str(session.id),
-        }
-
     async def _run_with_fallback_chain(
         self,
         user: User,
         provider_pref: str | None,
         mode: str,
         messages: list[dict[str, str]],
+        budget_remaining: float | None = None,
+        affinity: tuple[str, str] | None = None,
     ) -> ProviderResult:
-        chain = (
-            [provider_pref.lower()]
-            if provider_pref
-            else self._policy_engine.get_provider_chain(user=user, profile=mode)
+        chain = await self._get_provider_chain(user=user, provider_pref=provider_pref, mode=mode, affinity=affinity)
+        cached = await self._response_cache.lookup(
+            self._cache_candidates(chain, mode), mode, messages, CHAT_TEMPERATURE, CHAT_MAX_TOKENS
         )
+        if cached is not None:
+            return cached
+        chain = self._fit_chain(chain, mode, messages, budget_remaining)
+
+        async def call() -> ProviderResult:
+            settings = get_settings()
+            if settings.HEDGING_ENABLED and len(chain) > 1:
+                result = await self._run_hedged_chain(chain=chain, mode=mode, messages=messages, settings=settings)
+            else:
+                result = await self._run_sequential_chain(chain=chain, mode=mode, messages=messages)
+            await self._response_cache.store(result, mode, messages, CHAT_TEMPERATURE, CHAT_MAX_TOKENS)
+            return result
+
+        return await self._single_flight.run(
+            cache_key(",".join(chain), mode, messages, CHAT_TEMPERATURE, CHAT_MAX_TOKENS), call
+        )
+
+    async def _run_sequential_chain(
+        self,
+        chain: list[str],
+        mode: str,
+        messages: list[dict[str, str]],
+    ) -> ProviderResult:
         errors: list[str] = []
 
         for provider_name in chain:
@@ -140,28 +380,295 @@ class Orchestrator:
                 errors.append(f"Provider {provider_name} jest niedostępny")
                 continue
 
-            breaker = CircuitBreaker(provider_name)
-            if breaker.is_open():
+            if not await self._breaker.allow(provider_name):
                 errors.append(f"Provider {provider_name} jest tymczasowo niedostępny")
                 continue
 
+            if not await provider.acquire_capacity(messages=messages, profile=mode, max_tokens=CHAT_MAX_TOKENS):
+                errors.append(f"Provider {provider_name} osiągnął limit zapytań")
+                continue
+
             try:
-                result = await provider.generate(
-                    messages=messages,
-                    profile=mode,
-                    max_tokens=1200,
-                    temperature=0.7,
-                )
-                breaker.record_success()
+                result = await self._generate(provider_name, provider, messages, mode)
+                await self._breaker.record_success(provider_name)
+                await self._record_provider_success(provider_name, mode, result.latency_ms)
                 if provider_name != chain[0]:
                     result.fallback_used = True
                 return result
             except ProviderError as exc:
-                breaker.record_failure()
+                await self._breaker.record_failure(provider_name)
+                await self._scoreboard.record_failure(provider_name, mode)
                 errors.append(exc.detail)
 
         raise AllProvidersFailedError("Wszyscy providerzy zawiedli. Spróbuj ponownie później. " + "; ".join(errors))
 
+    async def _generate(
+        self,
+        provider_name: str,
+        provider: AbstractProvider,
+        messages: list[dict[str, str]],
+        mode: str,
+    ) -> ProviderResult:
+        slot = _provider_slot.get()
+        if slot is None:
+            return await provider.generate(
+                messages=messages, profile=mode, max_tokens=CHAT_MAX_TOKENS, temperature=CHAT_TEMPERATURE
+            )
+        async with slot(provider_name):
+            return await provider.generate(
+                messages=messages, profile=mode, max_tokens=CHAT_MAX_TOKENS, temperature=CHAT_TEMPERATURE
+            )
+
+    async def _run_hedged_chain(
+        self,
+        chain: list[str],
+        mode: str,
+        messages: list[dict[str, str]],
+        settings: Any,
+    ) -> ProviderResult:
+        errors: list[str] = []
+        candidates: list[tuple[str, AbstractProvider]] = []
+        for provider_name in chain:
+            provider = self._provider_factory.get(provider_name)
+            if provider is None:
+                errors.append(f"Provider {provider_name} jest niedostępny")
+            else:
+                candidates.append((provider_name, provider))
+
+        pending: dict[asyncio.Task[ProviderResult], str] = {}
+        next_index = 0
+        hedged = False
+
+        async def launch() -> str | None:
+            nonlocal next_index
+            while next_index < len(candidates):
+                provider_name, provider = candidates[next_index]
+                next_index += 1
+                if not await self._breaker.allow(provider_name):
+                    errors.append(f"Provider {provider_name} jest tymczasowo niedostępny")
+                    continue
+                if not await provider.acquire_capacity(messages=messages, profile=mode, max_tokens=CHAT_MAX_TOKENS):
+                    errors.append(f"Provider {provider_name} osiągnął limit zapytań")
+                    continue
+                task = asyncio.create_task(self._generate(provider_name, provider, messages, mode))
+                pending[task] = provider_name
+                return provider_name
+            return None
+
+        try:
+            running = await launch()
+            while pending:
+                timeout = None
+                if len(pending) == 1 and next_index < len(candidates) and running is not None:
+                    timeout = await self._hedge_delay_ms(running, mode, settings) / 1000
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launched = await launch()
+                    if launched is not None:
+                        hedged = True
+                        running = launched
+                    continue
+
+                for task in done:
+                    provider_name = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except ProviderError as exc:
+                        await self._breaker.record_failure(provider_name)
+                        await self._scoreboard.record_failure(provider_name, mode)
+                        errors.append(exc.detail)
+                        continue
+
+                    await self._breaker.record_success(provider_name)
+                    await self._record_provider_success(provider_name, mode, result.latency_ms)
+                    result.hedged = hedged
+                    if hedged or provider_name != chain[0]:
+                        result.fallback_used = True
+                    return result
+
+                if pending:
+                    running = next(iter(pending.values()))
+                elif next_index < len(candidates):
+                    running = await launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        raise AllProvidersFailedError("Wszyscy providerzy zawiedli. Spróbuj ponownie później. " + "; ".join(errors))
+
+    async def _get_provider_chain(
+        self,
+        user: User,
+        provider_pref: str | None,
+        mode: str,
+        affinity: tuple[str, str] | None = None,
+    ) -> list[str]:
+        if provider_pref:
+            return [provider_pref.lower()]
+        chain = self._policy_engine.get_provider_chain(user=user, profile=mode)
+        if get_settings().ADAPTIVE_ROUTING_ENABLED:
+            chain = await self._scoreboard.rank(chain, mode)
+        return self._pin_affinity(chain, mode, affinity)
+
+    def _pin_affinity(self, chain: list[str], mode: str, affinity: tuple[str, str] | None) -> list[str]:
+        if affinity is None or not get_settings().PROVIDER_AFFINITY_ENABLED:
+            return chain
+        provider_name, model = affinity
+        provider = self._provider_factory.get(provider_name)
+        if provider is None or provider_name not in chain or self._breaker.status(provider_name) == OPEN:
+            return chain
+        try:
+            resolved = provider.resolve_model(mode)
+        except ProviderError:
+            return chain
+        if resolved and resolved != model:
+            return chain
+        return [provider_name, *[name for name in chain if name != provider_name]]
+
+    def _session_affinity(self, session: ChatSession) -> tuple[str, str] | None:
+        if session.affinity_provider is None:
+            return None
+        return session.affinity_provider, session.affinity_model or ""
+
+    def _fit_chain(
+        self,
+        chain: list[str],
+        mode: str,
+        messages: list[dict[str, str]],
+        budget_remaining: float | None,
+    ) -> list[str]:
+        fitted: list[str] = []
+        errors: list[str] = []
+        over_budget = False
+        for provider_name in chain:
+            provider = self._provider_factory.get(provider_name)
+            try:
+                model = provider.resolve_model(mode) if provider is not None else ""
+            except ProviderError:
+                model = ""
+            spec = get_model_spec(provider_name, model) if model else None
+            if spec is None:
+                fitted.append(provider_name)
+                continue
+
+            input_tokens = estimate_messages_tokens(messages, provider_name)
+            if input_tokens + CHAT_MAX_TOKENS > spec.context_window:
+                errors.append(f"Provider {provider_name}: rozmowa przekracza okno kontekstu modelu {model}")
+                continue
+            if budget_remaining is not None and spec.estimate_cost(input_tokens, CHAT_MAX_TOKENS) > budget_remaining:
+                errors.append(f"Provider {provider_name}: szacowany koszt przekracza pozostały budżet")
+                over_budget = True
+                continue
+            fitted.append(provider_name)
+
+        if fitted:
+            return fitted
+        if over_budget:
+            raise InsufficientCreditsError(
+                "Szacowany koszt zapytania przekracza pozostały budżet. " + "; ".join(errors)
+            )
+        raise AllProvidersFailedError("Wszyscy providerzy zawiedli. Spróbuj ponownie później. " + "; ".join(errors))
+
+    def _semantic_scope(self, user: User, provider_pref: str | None) -> str:
+        if provider_pref:
+            return provider_pref.lower()
+        allowed = self._policy_engine.get_effective_limits(user)["allowed_providers"]
+        return "auto:" + ",".join(sorted(allowed))
+
+    def _cache_candidates(self, chain: list[str], mode: str) -> list[tuple[str, str]]:
+        candidates: list[tuple[str, str]] = []
+        for provider_name in chain:
+            provider = self._provider_factory.get(provider_name)
+            if provider is None:
+                continue
+            try:
+                model = provider.resolve_model(mode)
+            except ProviderError:
+                continue
+            if model:
+                candidates.append((provider_name, model))
+        return candidates
+
+    async def _record_provider_success(self, provider_name: str, mode: str, latency_ms: int) -> None:
+        await self._scoreboard.record_success(provider_name, mode, latency_ms)
+
+    async def _hedge_delay_ms(self, provider_name: str, mode: str, settings: Any) -> float:
+        observed = await self._scoreboard.latency_percentile(
+            provider_name,
+            mode,
+            settings.HEDGE_LATENCY_PERCENTILE,
+            min_samples=settings.HEDGE_MIN_SAMPLES,
+        )
+        if observed is None:
+            return float(settings.HEDGE_DEFAULT_DELAY_MS)
+        return max(observed, float(settings.HEDGE_MIN_DELAY_MS))
+
+    async def _stream_with_fallback_chain(
+        self,
+        user: User,
+        provider_pref: str | None,
+        mode: str,
+        messages: list[dict[str, str]],
+        budget_remaining: float | None = None,
+        affinity: tuple[str, str] | None = None,
+    ) -> AsyncIterator[ProviderStreamChunk]:
+        chain = await self._get_provider_chain(user=user, provider_pref=provider_pref, mode=mode, affinity=affinity)
+        cached = await self._response_cache.lookup(
+            self._cache_candidates(chain, mode), mode, messages, CHAT_TEMPERATURE, CHAT_MAX_TOKENS
+        )
+        if cached is not None:
+            yield ProviderStreamChunk(text=cached.text, result=cached)
+            return
+        chain = self._fit_chain(chain, mode, messages, budget_remaining)
+
+        errors: list[str] = []
+
+        with deadline_scope(get_settings().PROVIDER_REQUEST_DEADLINE_SECONDS):
+            for provider_name in chain:
+                provider = self._provider_factory.get(provider_name)
+                if provider is None:
+                    errors.append(f"Provider {provider_name} jest niedostępny")
+                    continue
+
+                if not await self._breaker.allow(provider_name):
+                    errors.append(f"Provider {provider_name} jest tymczasowo niedostępny")
+                    continue
+
+                if not await provider.acquire_capacity(messages=messages, profile=mode, max_tokens=CHAT_MAX_TOKENS):
+                    errors.append(f"Provider {provider_name} osiągnął limit zapytań")
+                    continue
+
+                started = False
+                try:
+                    async for chunk in provider.stream(
+                        messages=messages,
+                        profile=mode,
+                        max_tokens=CHAT_MAX_TOKENS,
+                        temperature=CHAT_TEMPERATURE,
+                    ):
+                        if chunk.result is not None:
+                            await self._breaker.record_success(provider_name)
+                            await self._record_provider_success(provider_name, mode, chunk.result.latency_ms)
+                            if provider_name != chain[0]:
+                                chunk.result.fallback_used = True
+                            await self._response_cache.store(
+                                chunk.result, mode, messages, CHAT_TEMPERATURE, CHAT_MAX_TOKENS
+                            )
+                        started = started or bool(chunk.text)
+                        yield chunk
+                    return
+                except ProviderError as exc:
+                    await self._breaker.record_failure(provider_name)
+                    await self._scoreboard.record_failure(provider_name, mode)
+                    if started:
+                        raise
+                    errors.append(exc.detail)
+
+        raise AllProvidersFailedError("Wszyscy providerzy zawiedli. Spróbuj ponownie później. " + "; ".join(errors))
+
     async def _apply_demo_credit_fallback(
         self,
         user: User,
@@ -206,47 +713,86 @@ class Orchestrator:
                     return found
 
             session = ChatSession(
+                id=uuid.uuid4(),
                 user_id=user.id,
                 mode=mode,
                 provider_pref=provider_pref,
+                message_count=0,
                 last_active_at=datetime.now(tz=timezone.utc),
             )
             db.add(session)
-            await db.commit()
-            await db.refresh(session)
             return session
         except Exception as exc:
             await db.rollback()
             raise JarvisBaseError("Nie udało się utworzyć sesji", 500) from exc
 
-    async def _get_history(self, session_id: uuid.UUID, db: AsyncSession) -> list[dict[str, str]]:
+    async def _get_history(
+        self,
+        session: ChatSession,
+        prompt: str,
+        mode: str,
+        db: AsyncSession,
+    ) -> list[dict[str, str]]:
+        if session in db.new:
+            return []
+        settings = get_settings()
+        query = select(Message).where(Message.session_id == session.id)
+        if session.snapshot_text and session.snapshot_at is not None:
+            query = query.where(Message.created_at > session.snapshot_at)
         try:
             result = await db.execute(
-                select(Message).where(Message.session_id == session_id).order_by(Message.created_at.desc()).limit(10)
+                query.order_by(Message.created_at.desc()).limit(settings.CONTEXT_HISTORY_MAX_MESSAGES)
             )
-            rows = list(reversed(result.scalars().all()))
-            return [{"role": item.role, "content": item.content} for item in rows]
+            rows = result.scalars().all()
         except Exception as exc:
             raise JarvisBaseError("Nie udało się pobrać historii wiadomości", 500) from exc
 
+        budgets = {
+            "eco": settings.CONTEXT_BUDGET_ECO_TOKENS,
+            "smart": settings.CONTEXT_BUDGET_SMART_TOKENS,
+            "deep": settings.CONTEXT_BUDGET_DEEP_TOKENS,
+        }
+        remaining = budgets.get(mode, settings.CONTEXT_BUDGET_ECO_TOKENS) - estimate_tokens(prompt)
+        summary = [summary_message(session.snapshot_text)] if session.snapshot_text else []
+        remaining -= sum(estimate_message_tokens(message) for message in summary)
+        packed: list[dict[str, str]] = []
+        for item in rows:
+            message = {"role": item.role, "content": item.content}
+            remaining -= estimate_message_tokens(message)
+            if remaining < 0:
+                break
+            packed.append(message)
+        window = packed[::-1]
+        step = settings.CONTEXT_PREFIX_STEP_MESSAGES
+        if step > 1 and (len(packed) < len(rows) or len(rows) >= settings.CONTEXT_HISTORY_MAX_MESSAGES):
+            drop = (len(packed) - session.message_count) % step
+            if drop < len(window):
+                window = window[drop:]
+        return summary + window
+
     async def _save_messages(
         self,
         session: ChatSession,
         prompt: str,
         reply: str,
+        affinity: tuple[str, str] | None,
         db: AsyncSession,
     ) -> None:
-        try:
-            db.add(Message(session_id=session.id, role="user", content=prompt))
-            db.add(Message(session_id=session.id, role="assistant", content=reply))
-            session.message_count += 2
-            session.last_active_at = datetime.now(tz=timezone.utc)
-            await db.commit()
-        except Exception as exc:
-            await db.rollback()
-            raise JarvisBaseError("Nie udało się zapisać wiadomości", 500) from exc
+        db.add_all(
+            [
+                Message(session_id=session.id, role="user", content=prompt),
+                Message(session_id=session.id, role="assistant", content=reply),
+            ]
+        )
+        values: dict[str, Any] = {
+            "message_count": ChatSession.message_count + 2,
+            "last_active_at": datetime.now(tz=timezone.utc),
+        }
+        if affinity is not None:
+            values["affinity_provider"], values["affinity_model"] = affinity
+        await db.execute(update(ChatSession).where(ChatSession.id == session.id).values(values))
 
 
-def build_orchestrator() -> Orchestrator:
-    settings = get_settings()
-    return Orchestrator(policy_engine, ProviderFactory(settings), usage_service)
+def build_orchestrator(provider_factory: ProviderFactory | None = None) -> Orchestrator:
+    factory = provider_factory or ProviderFactory(get_settings())
+    return Orchestrator(policy_engine, factory, usage_service)
@@ -5,11 +5,13 @@ from datetime import datetime, time, timedelta, timezone
 from decimal import Decimal
 from typing import Any
 
-from sqlalchemy import func, select
+from sqlalchemy import func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import Settings
+from app.core.metrics import POLICY_DENIALS
 from app.db.models import ToolCounter, UsageLedger, User, UserRole
+from app.services.usage_ledger import ledger_buffer
 
 
 @dataclass(slots=True)
@@ -18,6 +20,7 @@ class PolicyResult:
     denied_reason: str | None
     suggestion: str | None
     budget_remaining: float
+    reason_code: str | None = None
 
 
 class PolicyEngine:
@@ -68,15 +71,27 @@ class PolicyEngine:
         provider: str | None,
         db: AsyncSession,
         settings: Settings,
+    ) -> PolicyResult:
+        result = await self._evaluate_access(user, provider, db, settings)
+        if not result.allowed:
+            POLICY_DENIALS.labels(result.reason_code or "other").inc()
+        return result
+
+    async def _evaluate_access(
+        self,
+        user: User,
+        provider: str | None,
+        db: AsyncSession,
+        settings: Settings,
     ) -> PolicyResult:
         if not user.authorized:
-            return PolicyResult(False, "Nie autoryzowany", "Użyj kodu odblokowania", 0.0)
+            return PolicyResult(False, "Nie autoryzowany", "Użyj kodu odblokowania", 0.0, "unauthorized")
 
         provider_name = (provider or "gemini").lower()
         limits = self.get_effective_limits(user)
         allowed_providers = limits["allowed_providers"]
         if provider_name not in allowed_providers:
-            return PolicyResult(False, "Brak dostępu do tego providera", "Wybierz gemini", 0.0)
+            return PolicyResult(False, "Brak dostępu do tego providera", "Wybierz gemini", 0.0, "provider_forbidden")
 
         counter = await self._get_today_counter(user.id, db)
         total_cost = float(counter.total_cost_usd if counter else Decimal("0"))
@@ -85,19 +100,23 @@ class PolicyEngine:
         if user.subscription_tier == "free" and provider_name == "grok":
             used = counter.grok_calls if counter else 0
             if used >= settings.DEMO_GROK_DAILY:
-                return PolicyResult(False, "Przekroczono limit", "Spróbuj providera gemini", budget_remaining)
+                return PolicyResult(
+                    False, "Przekroczono limit", "Spróbuj providera gemini", budget_remaining, "grok_daily"
+                )
 
         if user.subscription_tier == "free" and not limits["smart_unlimited"]:
             if (counter.smart_credits_used if counter else 0) >= settings.DEMO_SMART_CREDITS_DAILY:
-                return PolicyResult(False, "Przekroczono limit", "Przełącz na tryb eco", budget_remaining)
+                return PolicyResult(
+                    False, "Przekroczono limit", "Przełącz na tryb eco", budget_remaining, "smart_credits"
+                )
 
         if limits["gpt_daily"] is not None and provider_name == "openai":
             used_openai = await self._get_provider_usage_today(user.id, "openai", db)
             if used_openai >= int(limits["gpt_daily"]):
-                return PolicyResult(False, "Przekroczono limit", "Wróć jutro po nowy limit", 0.0)
+                return PolicyResult(False, "Przekroczono limit", "Wróć jutro po nowy limit", 0.0, "gpt_daily")
 
         if budget_remaining <= 0:
-            return PolicyResult(False, "Przekroczono limit", "Spróbuj jutro", 0.0)
+            return PolicyResult(False, "Przekroczono limit", "Spróbuj jutro", 0.0, "daily_budget")
 
         return PolicyResult(True, None, None, budget_remaining)
 
@@ -167,20 +186,25 @@ class PolicyEngine:
         cost: float,
         smart_credits: int,
         db: AsyncSession,
+        calls: int = 1,
+        commit: bool = True,
     ) -> None:
-        counter = await self._get_today_counter(user.id, db)
-        if counter is None:
-            counter = ToolCounter(user_id=user.id, date=datetime.now(timezone.utc).date())
-            db.add(counter)
-
+        today = datetime.now(timezone.utc).date()
+        increments: dict[str, Any] = {"smart_credits_used": smart_credits, "total_cost_usd": Decimal(str(cost))}
         if provider.lower() == "grok":
-            counter.grok_calls = (counter.grok_calls or 0) + 1
+            increments["grok_calls"] = calls
         if provider.lower() in {"openrouter", "gemini"}:
-            counter.web_calls = (counter.web_calls or 0) + 1
+            increments["web_calls"] = calls
 
-        counter.smart_credits_used = (counter.smart_credits_used or 0) + smart_credits
-        counter.total_cost_usd = Decimal(counter.total_cost_usd or 0) + Decimal(str(cost))
-        await db.commit()
+        result = await db.execute(
+            update(ToolCounter)
+            .where(ToolCounter.user_id == user.id, ToolCounter.date == today)
+            .values({name: getattr(ToolCounter, name) + value for name, value in increments.items()})
+        )
+        if result.rowcount == 0:
+            db.add(ToolCounter(user_id=user.id, date=today, **increments))
+        if commit:
+            await db.commit()
 
     async def get_remaining_limits(
         self,
@@ -214,7 +238,8 @@ class PolicyEngine:
                 UsageLedger.created_at < end,
             )
         )
-        return int(result.scalar() or 0)
+        pending = await ledger_buffer.pending_usage(user_id)
+        return int(result.scalar() or 0) + pending.calls.get(provider, 0)
 
     async def _get_today_counter(self, user_id: Any, db: AsyncSession) -> ToolCounter | None:
         result = await db.execute(
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import random
+import time
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from typing import Any
+
+from app.core.circuit_breaker import OPEN, CircuitBreaker, circuit_breaker
+from app.core.config import Settings
+from app.providers.factory import ProviderFactory
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class ProbeResult:
+    provider: str
+    ok: bool
+    latency_ms: int
+    checked_at: str
+    consecutive_failures: int = 0
+    error: str | None = None
+
+
+class ProviderHealthProber:
+    def __init__(
+        self,
+        breaker: CircuitBreaker | None = None,
+        interval_seconds: float = 30.0,
+        timeout_seconds: float = 5.0,
+        failure_threshold: int = 2,
+    ) -> None:
+        self._breaker = breaker or circuit_breaker
+        self._interval_seconds = interval_seconds
+        self._timeout_seconds = timeout_seconds
+        self._failure_threshold = failure_threshold
+        self._enabled = True
+        self._results: dict[str, ProbeResult] = {}
+        self._opened: set[str] = set()
+        self._task: asyncio.Task[None] | None = None
+
+    def configure(self, settings: Settings) -> None:
+        self._enabled = settings.PROVIDER_PROBE_ENABLED
+        self._interval_seconds = settings.PROVIDER_PROBE_INTERVAL_SECONDS
+        self._timeout_seconds = settings.PROVIDER_PROBE_TIMEOUT_SECONDS
+        self._failure_threshold = max(settings.PROVIDER_PROBE_FAILURE_THRESHOLD, 1)
+
+    def reset(self) -> None:
+        self._results.clear()
+        self._opened.clear()
+
+    def results(self) -> dict[str, dict[str, Any]]:
+        return {name: asdict(result) for name, result in sorted(self._results.items())}
+
+    def start(self, provider_factory: ProviderFactory) -> None:
+        if not self._enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run(provider_factory))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def probe_all(self, provider_factory: ProviderFactory) -> dict[str, dict[str, Any]]:
+        names = provider_factory.list_available()
+        for name in set(self._results) - set(names):
+            del self._results[name]
+        await asyncio.gather(*(self._probe(name, provider_factory) for name in names))
+        return self.results()
+
+    async def _probe(self, name: str, provider_factory: ProviderFactory) -> None:
+        provider = provider_factory.get(name)
+        if provider is None:
+            return
+
+        start = time.perf_counter()
+        error: str | None = None
+        try:
+            ok = await asyncio.wait_for(provider.health_check(), timeout=self._timeout_seconds)
+            if not ok:
+                error = "Provider zgłosił niedostępność"
+        except TimeoutError:
+            ok, error = False, "Przekroczono limit czasu sondy"
+        except Exception as exc:
+            logger.debug("Sonda providera %s zgłosiła wyjątek.", name, exc_info=True)
+            ok, error = False, f"Błąd sondy: {exc.__class__.__name__}"
+
+        previous = self._results.get(name)
+        failures = 0 if ok else (previous.consecutive_failures if previous is not None else 0) + 1
+        self._results[name] = ProbeResult(
+            provider=name,
+            ok=ok,
+            latency_ms=int((time.perf_counter() - start) * 1000),
+            checked_at=datetime.now(tz=UTC).isoformat(),
+            consecutive_failures=failures,
+            error=error,
+        )
+
+        status = self._breaker.status(name)
+        if status != OPEN:
+            self._opened.discard(name)
+        if not ok and failures >= self._failure_threshold and status != OPEN:
+            logger.warning("Sonda providera %s nie powiodła się %d razy, otwieram bezpiecznik.", name, failures)
+            await self._breaker.force_open(name)
+            self._opened.add(name)
+        elif ok and name in self._opened:
+            logger.info("Sonda providera %s zakończona sukcesem, zamykam bezpiecznik otwarty przez sondę.", name)
+            self._opened.discard(name)
+            await self._breaker.force_close(name)
+
+    async def _run(self, provider_factory: ProviderFactory) -> None:
+        while True:
+            try:
+                await self.probe_all(provider_factory)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Cykl sondowania providerów nie powiódł się.", exc_info=True)
+            await asyncio.sleep(self._interval_seconds * random.uniform(0.9, 1.1))
+
+
+provider_health_prober = ProviderHealthProber()
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import logging
+import math
+import statistics
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from redis.asyncio import Redis
+
+from app.core.config import Settings
+
+logger = logging.getLogger(__name__)
+
+_RECORD_SCRIPT = """
+local alpha = tonumber(ARGV[1])
+local success = tonumber(ARGV[2])
+local latency = tonumber(ARGV[3])
+local err = 1 - success
+local prev_err = tonumber(redis.call('HGET', KEYS[1], 'error_rate') or '')
+if prev_err == nil then prev_err = err end
+redis.call('HSET', KEYS[1], 'error_rate', alpha * err + (1 - alpha) * prev_err)
+if success == 1 then
+  local prev = tonumber(redis.call('HGET', KEYS[1], 'ewma_ms') or '')
+  if prev == nil then prev = latency end
+  redis.call('HSET', KEYS[1], 'ewma_ms', alpha * latency + (1 - alpha) * prev)
+  redis.call('LPUSH', KEYS[2], latency)
+  redis.call('LTRIM', KEYS[2], 0, tonumber(ARGV[4]) - 1)
+  redis.call('EXPIRE', KEYS[2], ARGV[5])
+end
+redis.call('HINCRBY', KEYS[1], 'samples', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+
+@dataclass(slots=True)
+class ProviderStats:
+    ewma_ms: float | None = None
+    error_rate: float = 0.0
+    samples: int = 0
+    latencies: deque[int] = field(default_factory=deque)
+
+    def p95(self) -> float | None:
+        return self.percentile(0.95)
+
+    def percentile(self, quantile: float) -> float | None:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        rank = min(max(math.ceil(quantile * len(ordered)), 1), len(ordered))
+        return float(ordered[rank - 1])
+
+
+class ProviderScoreboard:
+    def __init__(
+        self,
+        redis: Redis | None = None,
+        alpha: float = 0.2,
+        window: int = 100,
+        min_samples: int = 5,
+        refresh_seconds: float = 2.0,
+        ttl_seconds: int = 86400,
+        key_prefix: str = "provider_stats",
+    ) -> None:
+        self._redis = redis
+        self._alpha = alpha
+        self._window = window
+        self._min_samples = min_samples
+        self._refresh_seconds = refresh_seconds
+        self._ttl_seconds = ttl_seconds
+        self._key_prefix = key_prefix
+        self._local: dict[tuple[str, str], ProviderStats] = {}
+        self._cache: dict[str, tuple[float, dict[str, ProviderStats]]] = {}
+        self._script: Any = None
+
+    def configure(self, settings: Settings) -> None:
+        self._alpha = settings.ADAPTIVE_ROUTING_ALPHA
+        self._min_samples = settings.ADAPTIVE_ROUTING_MIN_SAMPLES
+        self._refresh_seconds = settings.ADAPTIVE_ROUTING_REFRESH_SECONDS
+
+    def bind(self, redis: Redis | None) -> None:
+        self._redis = redis
+        self._script = redis.register_script(_RECORD_SCRIPT) if redis is not None else None
+        self._cache.clear()
+
+    def reset(self) -> None:
+        self._local.clear()
+        self._cache.clear()
+
+    async def record_success(self, provider: str, profile: str, latency_ms: int) -> None:
+        await self._record(provider, profile, success=True, latency_ms=latency_ms)
+
+    async def record_failure(self, provider: str, profile: str) -> None:
+        await self._record(provider, profile, success=False, latency_ms=0)
+
+    async def snapshot(self, providers: list[str], profile: str) -> dict[str, ProviderStats]:
+        cached = self._cache.get(profile)
+        now = time.monotonic()
+        if cached is not None and now - cached[0] < self._refresh_seconds and set(providers) <= set(cached[1]):
+            return cached[1]
+
+        stats = await self._load_remote(providers, profile)
+        if stats is None:
+            stats = {name: self._local.get((name, profile), ProviderStats()) for name in providers}
+        self._cache[profile] = (now, stats)
+        return stats
+
+    async def rank(self, providers: list[str], profile: str) -> list[str]:
+        if len(providers) < 2:
+            return list(providers)
+        stats = await self.snapshot(providers, profile)
+        scores = {name: self.score(stats.get(name, ProviderStats())) for name in providers}
+        known = [score for score in scores.values() if score is not None]
+        if not known:
+            return list(providers)
+        neutral = statistics.median(known)
+        position = {name: index for index, name in enumerate(providers)}
+        return sorted(
+            providers,
+            key=lambda name: (scores[name] if scores[name] is not None else neutral, position[name]),
+        )
+
+    async def latency_percentile(
+        self, provider: str, profile: str, quantile: float, min_samples: int = 1
+    ) -> float | None:
+        stats = (await self.snapshot([provider.lower()], profile)).get(provider.lower())
+        if stats is None or len(stats.latencies) < min_samples:
+            return None
+        return stats.percentile(quantile)
+
+    def score(self, stats: ProviderStats) -> float | None:
+        if stats.samples < self._min_samples or stats.ewma_ms is None:
+            return None
+        p95 = stats.p95() or stats.ewma_ms
+        latency = 0.7 * stats.ewma_ms + 0.3 * p95
+        return latency / max(1.0 - stats.error_rate, 0.05)
+
+    async def _record(self, provider: str, profile: str, success: bool, latency_ms: int) -> None:
+        provider = provider.lower()
+        self._record_local(provider, profile, success, latency_ms)
+        if self._redis is None or self._script is None:
+            return
+        stats_key, latency_key = self._keys(provider, profile)
+        try:
+            await self._script(
+                keys=[stats_key, latency_key],
+                args=[self._alpha, 1 if success else 0, max(int(latency_ms), 0), self._window, self._ttl_seconds],
+            )
+        except Exception:
+            logger.warning("Nie udało się zapisać statystyk providera %s w Redis.", provider, exc_info=True)
+
+    def _record_local(self, provider: str, profile: str, success: bool, latency_ms: int) -> None:
+        stats = self._local.get((provider, profile))
+        if stats is None:
+            stats = ProviderStats(latencies=deque(maxlen=self._window))
+            self._local[(provider, profile)] = stats
+        error = 0.0 if success else 1.0
+        stats.error_rate = error if stats.samples == 0 else self._alpha * error + (1 - self._alpha) * stats.error_rate
+        if success:
+            latency = float(max(latency_ms, 0))
+            stats.ewma_ms = (
+                latency if stats.ewma_ms is None else self._alpha * latency + (1 - self._alpha) * stats.ewma_ms
+            )
+            stats.latencies.append(int(latency))
+        stats.samples += 1
+
+    async def _load_remote(self, providers: list[str], profile: str) -> dict[str, ProviderStats] | None:
+        if self._redis is None:
+            return None
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for name in providers:
+                stats_key, latency_key = self._keys(name, profile)
+                pipe.hgetall(stats_key)
+                pipe.lrange(latency_key, 0, self._window - 1)
+            raw = await pipe.execute()
+        except Exception:
+            logger.warning("Nie udało się pobrać statystyk providerów z Redis.", exc_info=True)
+            return None
+
+        result: dict[str, ProviderStats] = {}
+        for index, name in enumerate(providers):
+            values: dict[str, Any] = raw[index * 2] or {}
+            latencies = raw[index * 2 + 1] or []
+            ewma = values.get("ewma_ms")
+            result[name] = ProviderStats(
+                ewma_ms=float(ewma) if ewma is not None else None,
+                error_rate=float(values.get("error_rate", 0.0)),
+                samples=int(values.get("samples", 0)),
+                latencies=deque(int(float(item)) for item in latencies),
+            )
+        return result
+
+    def _keys(self, provider: str, profile: str) -> tuple[str, str]:
+        base = f"{self._key_prefix}:{provider.lower()}:{profile.lower()}"
+        return f"{base}:stats", f"{base}:latency"
+
+
+provider_scoreboard = ProviderScoreboard()
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any
+
+from redis.asyncio import Redis
+
+from app.core.config import Settings
+from app.providers.base import ProviderResult
+
+logger = logging.getLogger(__name__)
+
+_STORE_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[3], KEYS[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', tonumber(ARGV[3]) - tonumber(ARGV[2]))
+local excess = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[4])
+if excess > 0 then
+  local evicted = redis.call('ZPOPMIN', KEYS[2], excess)
+  for i = 1, #evicted, 2 do
+    redis.call('DEL', evicted[i])
+  end
+end
+return 1
+"""
+
+
+def cache_key(
+    provider: str,
+    model: str,
+    messages: list[dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+) -> str:
+    canonical = json.dumps(
+        {
+            "provider": provider.lower(),
+            "model": model,
+            "messages": [
+                {"role": message.get("role", ""), "content": message.get("content", "")} for message in messages
+            ],
+            "temperature": round(float(temperature), 3),
+            "max_tokens": int(max_tokens),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        redis: Redis | None = None,
+        enabled: bool = False,
+        profiles: set[str] | None = None,
+        max_temperature: float = 0.7,
+        ttl_seconds: int = 3600,
+        max_entries: int = 10_000,
+        key_prefix: str = "response_cache:v1",
+    ) -> None:
+        self._redis = redis
+        self._enabled = enabled
+        self._profiles = profiles if profiles is not None else {"eco"}
+        self._max_temperature = max_temperature
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        self._key_prefix = key_prefix
+        self._script: Any = None
+        self._local: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def configure(self, settings: Settings) -> None:
+        self._enabled = settings.RESPONSE_CACHE_ENABLED
+        self._profiles = {item.strip() for item in settings.RESPONSE_CACHE_PROFILES.split(",") if item.strip()}
+        self._max_temperature = settings.RESPONSE_CACHE_MAX_TEMPERATURE
+        self._ttl_seconds = settings.RESPONSE_CACHE_TTL_SECONDS
+        self._max_entries = settings.RESPONSE_CACHE_MAX_ENTRIES
+
+    def bind(self, redis: Redis | None) -> None:
+        self._redis = redis
+        self._script = redis.register_script(_STORE_SCRIPT) if redis is not None else None
+
+    def reset(self) -> None:
+        self._local.clear()
+
+    def is_cacheable(self, profile: str, temperature: float) -> bool:
+        return self._enabled and profile in self._profiles and temperature <= self._max_temperature
+
+    async def lookup(
+        self,
+        candidates: list[tuple[str, str]],
+        profile: str,
+        messages: list[dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+    ) -> ProviderResult | None:
+        if not candidates or not self.is_cacheable(profile, temperature):
+            return None
+
+        start = time.perf_counter()
+        keys = [self._key(provider, model, messages, temperature, max_tokens) for provider, model in candidates]
+        raw_values = await self._get_many(keys)
+        for raw in raw_values:
+            if not raw:
+                continue
+            try:
+                entry = json.loads(raw)
+                return ProviderResult(
+                    text=str(entry["text"]),
+                    provider=str(entry["provider"]),
+                    model=str(entry["model"]),
+                    input_tokens=int(entry.get("input_tokens", 0)),
+                    output_tokens=int(entry.get("output_tokens", 0)),
+                    cost_usd=0.0,
+                    latency_ms=int((time.perf_counter() - start) * 1000),
+                    cache_hit=True,
+                )
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Pominięto uszkodzony wpis cache odpowiedzi.")
+        return None
+
+    async def store(
+        self,
+        result: ProviderResult,
+        profile: str,
+        messages: list[dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+    ) -> None:
+        if result.cache_hit or result.coalesced or not result.text or not self.is_cacheable(profile, temperature):
+            return
+
+        key = self._key(result.provider, result.model, messages, temperature, max_tokens)
+        value = json.dumps(
+            {
+                "text": result.text,
+                "provider": result.provider,
+                "model": result.model,
+                "input_tokens": result.input_tokens,
+                "output_tokens": result.output_tokens,
+            },
+            ensure_ascii=False,
+        )
+        if self._script is not None:
+            try:
+                await self._script(
+                    keys=[key, f"{self._key_prefix}:index"],
+                    args=[value, self._ttl_seconds, time.time(), self._max_entries],
+                )
+                return
+            except Exception:
+                logger.warning("Nie udało się zapisać odpowiedzi w cache Redis.", exc_info=True)
+
+        self._local[key] = (time.monotonic() + self._ttl_seconds, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self._max_entries:
+            self._local.popitem(last=False)
+
+    async def _get_many(self, keys: list[str]) -> list[str | None]:
+        if self._redis is not None:
+            try:
+                return list(await self._redis.mget(keys))
+            except Exception:
+                logger.warning("Nie udało się odczytać cache odpowiedzi z Redis.", exc_info=True)
+
+        now = time.monotonic()
+        values: list[str | None] = []
+        for key in keys:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._local[key]
+                entry = None
+            elif entry is not None:
+                self._local.move_to_end(key)
+            values.append(entry[1] if entry is not None else None)
+        return values
+
+    def _key(
+        self,
+        provider: str,
+        model: str,
+        messages: list[dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+    ) -> str:
+        return f"{self._key_prefix}:{cache_key(provider, model, messages, temperature, max_tokens)}"
+
+
+response_cache = ResponseCache()
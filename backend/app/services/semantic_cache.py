@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import IO, Any
+
+import numpy as np
+
+from app.core.config import Settings
+from app.providers.base import ProviderResult
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _bucket(profile: str, scope: str) -> int:
+    digest = hashlib.blake2b(f"{profile}\x00{scope}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class HashingEmbedder:
+    def __init__(self, dim: int = 1024) -> None:
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        features = self._features(text)
+        if not features:
+            return vector
+        indices = np.empty(len(features), dtype=np.int64)
+        signs = np.empty(len(features), dtype=np.float32)
+        for position, (feature, weight) in enumerate(features):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            indices[position] = digest % self.dim
+            signs[position] = weight if (digest >> 63) & 1 else -weight
+        np.add.at(vector, indices, signs)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def _features(self, text: str) -> list[tuple[str, float]]:
+        features: list[tuple[str, float]] = []
+        for token in _TOKEN_RE.findall(text.lower()):
+            features.append((f"w:{token}", 1.0))
+            padded = f"<{token}>"
+            features.extend((f"c:{padded[i : i + 3]}", 0.5) for i in range(len(padded) - 2))
+        return features
+
+
+@dataclass(slots=True)
+class SemanticEntry:
+    prompt: str
+    profile: str
+    scope: str
+    text: str
+    provider: str
+    model: str
+    input_tokens: int
+    output_tokens: int
+    created_at: float
+
+
+@dataclass(slots=True)
+class SemanticHit:
+    index: int
+    entry: SemanticEntry
+    similarity: float
+    result: ProviderResult
+    verify: bool
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        enabled: bool = False,
+        profiles: set[str] | None = None,
+        threshold: float = 0.92,
+        max_entries: int = 5000,
+        ttl_seconds: int = 86400,
+        dim: int = 1024,
+        verify_rate: float = 0.0,
+        snapshot_path: str | None = None,
+        snapshot_interval_seconds: float = 300.0,
+    ) -> None:
+        self._enabled = enabled
+        self._profiles = profiles if profiles is not None else {"eco"}
+        self._threshold = threshold
+        self._ttl_seconds = ttl_seconds
+        self._verify_rate = verify_rate
+        self._snapshot_path = snapshot_path
+        self._snapshot_interval_seconds = snapshot_interval_seconds
+        self._last_snapshot = time.monotonic()
+        self._dirty = False
+        self._writer_lock: IO[str] | None = None
+        self._embedder = HashingEmbedder(dim)
+        self._allocate(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.false_positives = 0
+        self.verifications = 0
+
+    def configure(self, settings: Settings) -> None:
+        self._enabled = settings.SEMANTIC_CACHE_ENABLED
+        self._profiles = {item.strip() for item in settings.SEMANTIC_CACHE_PROFILES.split(",") if item.strip()}
+        self._threshold = settings.SEMANTIC_CACHE_THRESHOLD
+        self._ttl_seconds = settings.SEMANTIC_CACHE_TTL_SECONDS
+        self._verify_rate = settings.SEMANTIC_CACHE_VERIFY_RATE
+        self._snapshot_path = settings.SEMANTIC_CACHE_SNAPSHOT_PATH or None
+        self._snapshot_interval_seconds = settings.SEMANTIC_CACHE_SNAPSHOT_INTERVAL_SECONDS
+        if settings.SEMANTIC_CACHE_DIM != self._embedder.dim or settings.SEMANTIC_CACHE_MAX_ENTRIES != len(
+            self._entries
+        ):
+            self._embedder = HashingEmbedder(settings.SEMANTIC_CACHE_DIM)
+            self._allocate(settings.SEMANTIC_CACHE_MAX_ENTRIES)
+
+    def reset(self) -> None:
+        self._allocate(len(self._entries))
+        self.hits = self.misses = self.false_positives = self.verifications = 0
+
+    def is_cacheable(self, profile: str, messages: list[dict[str, str]]) -> bool:
+        return self._enabled and profile in self._profiles and len(messages) == 1
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self._enabled,
+            "entries": int(np.count_nonzero(self._valid)),
+            "hits": self.hits,
+            "misses": self.misses,
+            "false_positives": self.false_positives,
+            "verifications": self.verifications,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "threshold": self._threshold,
+        }
+
+    def lookup(self, prompt: str, profile: str, scope: str) -> SemanticHit | None:
+        mask = self._valid & (self._buckets == _bucket(profile, scope))
+        mask &= self._created_at >= time.time() - self._ttl_seconds
+        candidates = np.flatnonzero(mask)
+        if candidates.size:
+            similarities = self._vectors[candidates] @ self._embedder.embed(prompt)
+            best = int(np.argmax(similarities))
+            entry = self._entries[int(candidates[best])]
+            if entry is not None and float(similarities[best]) >= self._threshold:
+                self.hits += 1
+                return SemanticHit(
+                    index=int(candidates[best]),
+                    entry=entry,
+                    similarity=float(similarities[best]),
+                    result=ProviderResult(
+                        text=entry.text,
+                        provider=entry.provider,
+                        model=entry.model,
+                        input_tokens=entry.input_tokens,
+                        output_tokens=entry.output_tokens,
+                        cost_usd=0.0,
+                        latency_ms=0,
+                        cache_hit=True,
+                    ),
+                    verify=random.random() < self._verify_rate,
+                )
+        self.misses += 1
+        return None
+
+    def store(self, prompt: str, profile: str, scope: str, result: ProviderResult) -> None:
+        if result.cache_hit or result.coalesced or not result.text:
+            return
+        index = self._cursor
+        self._cursor = (self._cursor + 1) % len(self._entries)
+        self._vectors[index] = self._embedder.embed(prompt)
+        self._created_at[index] = time.time()
+        self._buckets[index] = _bucket(profile, scope)
+        self._valid[index] = True
+        self._entries[index] = SemanticEntry(
+            prompt=prompt,
+            profile=profile,
+            scope=scope,
+            text=result.text,
+            provider=result.provider,
+            model=result.model,
+            input_tokens=result.input_tokens,
+            output_tokens=result.output_tokens,
+            created_at=float(self._created_at[index]),
+        )
+        self._dirty = True
+
+    def verify(self, hit: SemanticHit, fresh: ProviderResult) -> bool:
+        self.verifications += 1
+        agreement = float(self._embedder.embed(hit.entry.text) @ self._embedder.embed(fresh.text))
+        if agreement >= self._threshold:
+            return True
+        self.false_positives += 1
+        if self._entries[hit.index] is hit.entry:
+            self._valid[hit.index] = False
+            self._entries[hit.index] = None
+            self._dirty = True
+        logger.info("Fałszywe trafienie cache semantycznego (podobieństwo odpowiedzi %.3f).", agreement)
+        return False
+
+    async def maybe_snapshot(self) -> None:
+        if not self._dirty or self._snapshot_path is None:
+            return
+        if time.monotonic() - self._last_snapshot < self._snapshot_interval_seconds:
+            return
+        await self.snapshot()
+
+    async def snapshot(self) -> None:
+        if self._snapshot_path is None:
+            return
+        path = Path(self._snapshot_path)
+        self._last_snapshot = time.monotonic()
+        try:
+            if not self._claim_writer(path):
+                return
+        except OSError:
+            logger.warning("Nie udało się zablokować migawki cache semantycznego.", exc_info=True)
+            return
+        self._dirty = False
+        payload = (
+            self._vectors.copy(),
+            self._created_at.copy(),
+            self._valid.copy(),
+            self._buckets.copy(),
+            json.dumps([asdict(entry) if entry is not None else None for entry in self._entries], ensure_ascii=False),
+            self._cursor,
+        )
+        try:
+            await asyncio.to_thread(self._write_snapshot, path, *payload)
+        except OSError:
+            self._dirty = True
+            logger.warning("Nie udało się zapisać migawki cache semantycznego.", exc_info=True)
+
+    def load(self) -> None:
+        if self._snapshot_path is None or not Path(self._snapshot_path).exists():
+            return
+        try:
+            with np.load(self._snapshot_path, allow_pickle=False) as data:
+                vectors = data["vectors"]
+                if vectors.shape != self._vectors.shape:
+                    logger.warning("Migawka cache semantycznego ma inny rozmiar, pomijam ją.")
+                    return
+                entries = json.loads(str(data["entries"]))
+                self._vectors[:] = vectors
+                self._created_at[:] = data["created_at"]
+                self._valid[:] = data["valid"]
+                self._buckets[:] = data["buckets"]
+                self._cursor = int(data["cursor"])
+        except (OSError, KeyError, ValueError):
+            logger.warning("Nie udało się wczytać migawki cache semantycznego.", exc_info=True)
+            self._allocate(len(self._entries))
+            return
+        self._entries = [SemanticEntry(**entry) if entry is not None else None for entry in entries]
+
+    def _write_snapshot(
+        self,
+        path: Path,
+        vectors: np.ndarray,
+        created_at: np.ndarray,
+        valid: np.ndarray,
+        buckets: np.ndarray,
+        entries: str,
+        cursor: int,
+    ) -> None:
+        temporary = path.with_name(f"{path.name}.tmp")
+        with temporary.open("wb") as handle:
+            np.savez(
+                handle,
+                vectors=vectors,
+                created_at=created_at,
+                valid=valid,
+                buckets=buckets,
+                entries=np.array(entries),
+                cursor=np.array(cursor),
+            )
+        os.replace(temporary, path)
+
+    def _claim_writer(self, path: Path) -> bool:
+        if self._writer_lock is not None:
+            return True
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handle = path.with_name(f"{path.name}.lock").open("a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return False
+        self._writer_lock = handle
+        return True
+
+    def _allocate(self, max_entries: int) -> None:
+        size = max(max_entries, 1)
+        self._vectors = np.zeros((size, self._embedder.dim), dtype=np.float32)
+        self._created_at = np.zeros(size, dtype=np.float64)
+        self._valid = np.zeros(size, dtype=bool)
+        self._buckets = np.zeros(size, dtype=np.int64)
+        self._entries: list[SemanticEntry | None] = [None] * size
+        self._cursor = 0
+
+
+semantic_cache = SemanticCache()
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from typing import TYPE_CHECKING
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import Settings, get_settings
+from app.core.exceptions import JarvisBaseError
+from app.db.models import ChatSession, Message, User
+from app.db.session import get_session_factory
+from app.providers.tokenizer import estimate_message_tokens, estimate_tokens
+from app.services.policy_engine import policy_engine
+
+if TYPE_CHECKING:
+    from app.services.orchestrator import Orchestrator
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "Podsumowanie wcześniejszej części rozmowy:\n"
+
+_INSTRUCTION = (
+    "Zaktualizuj zwięzłe podsumowanie rozmowy użytkownika z asystentem. "
+    "Zachowaj fakty, decyzje, preferencje użytkownika i otwarte wątki; pomiń powitania i powtórzenia. "
+    "Odpowiedz wyłącznie treścią podsumowania w języku rozmowy, najwyżej {words} słów."
+)
+
+
+def summary_message(snapshot_text: str) -> dict[str, str]:
+    return {"role": "system", "content": f"{SUMMARY_PREFIX}{snapshot_text}"}
+
+
+class SessionSummarizer:
+    def __init__(
+        self,
+        enabled: bool = True,
+        trigger_tokens: int = 3000,
+        keep_recent_messages: int = 6,
+        max_words: int = 250,
+        provider: str | None = None,
+    ) -> None:
+        self._enabled = enabled
+        self._trigger_tokens = trigger_tokens
+        self._keep_recent_messages = keep_recent_messages
+        self._max_words = max_words
+        self._provider = provider
+        self._tasks: dict[uuid.UUID, asyncio.Task[bool]] = {}
+        self.summaries = 0
+
+    def configure(self, settings: Settings) -> None:
+        self._enabled = settings.SESSION_SUMMARY_ENABLED
+        self._trigger_tokens = settings.SESSION_SUMMARY_TRIGGER_TOKENS
+        self._keep_recent_messages = max(settings.SESSION_SUMMARY_KEEP_RECENT_MESSAGES, 2)
+        self._max_words = settings.SESSION_SUMMARY_MAX_WORDS
+        self._provider = settings.SESSION_SUMMARY_PROVIDER.strip().lower() or None
+
+    def reset(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self.summaries = 0
+
+    def schedule(self, session: ChatSession, orchestrator: Orchestrator) -> None:
+        if not self._enabled or session.message_count <= self._keep_recent_messages:
+            return
+        if session.id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(session.id, orchestrator))
+        self._tasks[session.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(session.id, None))
+
+    async def drain(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def _run(self, session_id: uuid.UUID, orchestrator: Orchestrator) -> bool:
+        try:
+            async with get_session_factory()() as db:
+                return await self.summarize(session_id, orchestrator, db)
+        except Exception:
+            logger.warning("Nie udało się zaktualizować podsumowania sesji %s.", session_id, exc_info=True)
+            return False
+
+    async def summarize(self, session_id: uuid.UUID, orchestrator: Orchestrator, db: AsyncSession) -> bool:
+        session = await db.get(ChatSession, session_id)
+        if session is None:
+            return False
+
+        query = select(Message).where(Message.session_id == session_id)
+        if session.snapshot_at is not None:
+            query = query.where(Message.created_at > session.snapshot_at)
+        rows = list((await db.execute(query.order_by(Message.created_at))).scalars().all())
+
+        split = len(rows) - self._keep_recent_messages
+        while split > 0 and rows[split - 1].created_at == rows[split].created_at:
+            split -= 1
+        if split <= 0:
+            return False
+
+        pending_tokens = estimate_tokens(session.snapshot_text or "") + sum(
+            estimate_message_tokens({"role": row.role, "content": row.content}) for row in rows
+        )
+        if pending_tokens < self._trigger_tokens:
+            return False
+
+        user = await db.get(User, session.user_id)
+        if user is None:
+            return False
+        access = await policy_engine.check_access(user, self._provider, db, get_settings())
+        if not access.allowed:
+            return False
+
+        folded = rows[:split]
+        transcript = "\n".join(f"{row.role}: {row.content}" for row in folded)
+        prompt = _INSTRUCTION.format(words=self._max_words)
+        if session.snapshot_text:
+            prompt += f"\n\nDotychczasowe podsumowanie:\n{session.snapshot_text}"
+        prompt += f"\n\nNowe wiadomości:\n{transcript}"
+
+        try:
+            mode, result = await orchestrator.run_prompt(
+                user=user,
+                prompt=prompt,
+                provider_pref=self._provider,
+                mode="eco",
+                budget_remaining=access.budget_remaining,
+            )
+        except JarvisBaseError as exc:
+            logger.info("Pominięto podsumowanie sesji %s: %s", session_id, exc.detail)
+            return False
+        if not result.text.strip():
+            return False
+
+        session.snapshot_text = result.text.strip()
+        session.snapshot_at = folded[-1].created_at
+        await orchestrator.record_usage(user=user, session_id=session.id, mode=mode, provider_result=result, db=db)
+        self.summaries += 1
+        logger.info("Zaktualizowano podsumowanie sesji %s (%d wiadomości).", session_id, len(folded))
+        return True
+
+
+session_summarizer = SessionSummarizer()
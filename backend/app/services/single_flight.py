@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, replace
+from typing import Any
+
+from redis.asyncio import Redis
+
+from app.core.config import Settings
+from app.core.exceptions import (
+    AllProvidersFailedError,
+    InsufficientCreditsError,
+    JarvisBaseError,
+    PolicyDeniedError,
+    ProviderError,
+    RateLimitExceededError,
+)
+from app.providers.base import ProviderResult
+
+logger = logging.getLogger(__name__)
+
+RESULT_TTL_SECONDS = 5
+
+_REMOTE_ERRORS: dict[str, type[JarvisBaseError]] = {
+    error.__name__: error
+    for error in (
+        AllProvidersFailedError,
+        InsufficientCreditsError,
+        PolicyDeniedError,
+        ProviderError,
+        RateLimitExceededError,
+    )
+}
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    def __init__(
+        self,
+        redis: Redis | None = None,
+        enabled: bool = True,
+        distributed: bool = False,
+        lock_ttl_seconds: float = 60.0,
+        wait_seconds: float = 45.0,
+        key_prefix: str = "single_flight",
+    ) -> None:
+        self._redis = redis
+        self._enabled = enabled
+        self._distributed = distributed
+        self._lock_ttl_seconds = lock_ttl_seconds
+        self._wait_seconds = wait_seconds
+        self._key_prefix = key_prefix
+        self._release: Any = None
+        self._inflight: dict[str, asyncio.Task[ProviderResult]] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def configure(self, settings: Settings) -> None:
+        self._enabled = settings.SINGLE_FLIGHT_ENABLED
+        self._distributed = settings.SINGLE_FLIGHT_DISTRIBUTED
+        self._lock_ttl_seconds = settings.SINGLE_FLIGHT_LOCK_TTL_SECONDS
+        self._wait_seconds = settings.SINGLE_FLIGHT_WAIT_SECONDS
+
+    def bind(self, redis: Redis | None) -> None:
+        self._redis = redis
+        self._release = redis.register_script(_RELEASE_SCRIPT) if redis is not None else None
+
+    def reset(self) -> None:
+        self._inflight.clear()
+        self.leaders = 0
+        self.followers = 0
+
+    async def run(self, key: str, call: Callable[[], Awaitable[ProviderResult]]) -> ProviderResult:
+        if not self._enabled:
+            return await call()
+
+        start = time.perf_counter()
+        task = self._inflight.get(key)
+        if task is not None:
+            self.followers += 1
+            return self._as_follower(await asyncio.shield(task), start)
+
+        task = asyncio.ensure_future(self._lead(key, call))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        result = await asyncio.shield(task)
+        if result.coalesced:
+            return replace(result, latency_ms=int((time.perf_counter() - start) * 1000))
+        return result
+
+    async def _lead(self, key: str, call: Callable[[], Awaitable[ProviderResult]]) -> ProviderResult:
+        if not self._distributed or self._redis is None:
+            self.leaders += 1
+            return await call()
+
+        lock_key = f"{self._key_prefix}:{key}:lock"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self._redis.set(lock_key, token, nx=True, px=int(self._lock_ttl_seconds * 1000))
+        except Exception:
+            logger.warning("Nie udało się pobrać blokady single-flight z Redis.", exc_info=True)
+            self.leaders += 1
+            return await call()
+
+        if not acquired:
+            remote = await self._wait_remote(key)
+            if remote is not None:
+                self.followers += 1
+                if "error" in remote:
+                    raise _remote_error(remote["error"])
+                return self._as_follower(ProviderResult(**remote["result"]), None)
+            self.leaders += 1
+            return await call()
+
+        self.leaders += 1
+        try:
+            result = await call()
+        except JarvisBaseError as exc:
+            error = {"type": type(exc).__name__, "detail": exc.detail, "status_code": exc.status_code}
+            await self._publish(key, {"token": token, "error": error})
+            raise
+        else:
+            await self._publish(key, {"token": token, "result": asdict(result)})
+            return result
+        finally:
+            with contextlib.suppress(Exception):
+                await self._release(keys=[lock_key], args=[token])
+
+    async def _wait_remote(self, key: str) -> dict[str, Any] | None:
+        assert self._redis is not None
+        channel = f"{self._key_prefix}:{key}:result"
+        pubsub = self._redis.pubsub()
+        data: dict[str, Any] | None = None
+        try:
+            await pubsub.subscribe(channel)
+            token, payload = await self._redis.mget([f"{self._key_prefix}:{key}:lock", channel])
+            if token is None:
+                return None
+            data = _flight_payload(payload, token)
+            deadline = time.monotonic() + self._wait_seconds
+            while data is None and time.monotonic() < deadline:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=max(deadline - time.monotonic(), 0.0),
+                )
+                if message is not None and message.get("type") == "message":
+                    data = _flight_payload(message["data"], token)
+        except Exception:
+            logger.warning("Nie udało się odebrać wyniku single-flight z Redis.", exc_info=True)
+            return None
+        finally:
+            with contextlib.suppress(Exception):
+                await pubsub.unsubscribe(channel)
+                await pubsub.aclose()
+
+        return data
+
+    async def _publish(self, key: str, payload: dict[str, Any]) -> None:
+        assert self._redis is not None
+        channel = f"{self._key_prefix}:{key}:result"
+        message = json.dumps(payload, ensure_ascii=False)
+        try:
+            await self._redis.set(channel, message, ex=RESULT_TTL_SECONDS)
+            await self._redis.publish(channel, message)
+        except Exception:
+            logger.warning("Nie udało się opublikować wyniku single-flight.", exc_info=True)
+
+    def _forget(self, key: str, task: asyncio.Task[ProviderResult]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    @staticmethod
+    def _as_follower(result: ProviderResult, start: float | None) -> ProviderResult:
+        latency_ms = int((time.perf_counter() - start) * 1000) if start is not None else result.latency_ms
+        return replace(result, cost_usd=0.0, coalesced=True, latency_ms=latency_ms)
+
+
+def _remote_error(error: dict[str, Any]) -> JarvisBaseError:
+    detail = str(error["detail"])
+    error_type = _REMOTE_ERRORS.get(error["type"])
+    if error_type is not None:
+        return error_type(detail)
+    return JarvisBaseError(detail, int(error["status_code"]))
+
+
+def _flight_payload(raw: str | None, token: str) -> dict[str, Any] | None:
+    if raw is None:
+        return None
+    data = json.loads(raw)
+    return data if data.get("token") == token else None
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,450 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import socket
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Any
+
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import Settings
+from app.core.metrics import metrics_registry
+from app.db.models import ChatSession, UsageLedger, User
+from app.db.session import get_session_factory
+
+logger = logging.getLogger(__name__)
+
+ORPHAN_GRACE_SECONDS = 60.0
+PENDING_TTL_SECONDS = 2 * 86400
+
+_ACK_SCRIPT = """
+local acked = 0
+for i = 2, #ARGV, 4 do
+  if redis.call('XACK', KEYS[1], ARGV[1], ARGV[i]) == 1 then
+    redis.call('XDEL', KEYS[1], ARGV[i])
+    local pending = KEYS[tonumber(ARGV[i + 1])]
+    redis.call('HINCRBYFLOAT', pending, 'cost', -tonumber(ARGV[i + 2]))
+    redis.call('HINCRBY', pending, 'calls:' .. ARGV[i + 3], -1)
+    acked = acked + 1
+  end
+end
+return acked
+"""
+
+
+@dataclass(slots=True)
+class LedgerEntry:
+    user_id: uuid.UUID
+    session_id: uuid.UUID | None
+    provider: str
+    model: str
+    profile: str | None
+    input_tokens: int
+    output_tokens: int
+    cached_input_tokens: int
+    cost_usd: Decimal
+    latency_ms: int | None
+    fallback_used: bool
+    cache_hit: bool
+    coalesced: bool = False
+    id: uuid.UUID = field(default_factory=uuid.uuid4)
+    created_at: datetime = field(default_factory=lambda: datetime.now(tz=UTC))
+
+    def dumps(self) -> str:
+        return json.dumps(asdict(self), default=str)
+
+    @classmethod
+    def loads(cls, raw: str) -> LedgerEntry:
+        data = json.loads(raw)
+        data["id"] = uuid.UUID(data["id"])
+        data["user_id"] = uuid.UUID(data["user_id"])
+        data["session_id"] = uuid.UUID(data["session_id"]) if data["session_id"] else None
+        data["cost_usd"] = Decimal(data["cost_usd"])
+        data["created_at"] = datetime.fromisoformat(data["created_at"])
+        return cls(**data)
+
+    def row(self) -> dict[str, Any]:
+        return {**asdict(self), "tool_costs": {}}
+
+
+@dataclass(slots=True)
+class PendingUsage:
+    cost_usd: float = 0.0
+    calls: dict[str, int] = field(default_factory=dict)
+
+
+LEDGER_ENTRIES = metrics_registry.counter(
+    "jarvis_ledger_entries_total",
+    "Wpisy ledgera zapisane w tle do bazy (flushed) lub odrzucone (dropped)",
+    ("outcome",),
+)
+
+
+class LedgerBuffer:
+    def __init__(
+        self,
+        redis: Redis | None = None,
+        enabled: bool = True,
+        wal_dir: str = "",
+        flush_seconds: float = 1.0,
+        batch_size: int = 500,
+        claim_idle_seconds: float = 30.0,
+        max_pending: int = 10_000,
+        key_prefix: str = "usage_ledger",
+    ) -> None:
+        self._redis = redis
+        self._enabled = enabled
+        self._wal_dir = Path(wal_dir) if wal_dir else None
+        self._flush_seconds = flush_seconds
+        self._batch_size = batch_size
+        self._claim_idle_ms = int(claim_idle_seconds * 1000)
+        self._max_pending = max_pending
+        self._key_prefix = key_prefix
+        self._consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._ack: Any = None
+        self._group_ready = False
+        self._pending: dict[uuid.UUID, LedgerEntry] = {}
+        self._wal_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: asyncio.Task[None] | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @property
+    def pending_local(self) -> int:
+        return len(self._pending)
+
+    def configure(self, settings: Settings) -> None:
+        self._enabled = settings.LEDGER_WRITE_BEHIND_ENABLED
+        self._wal_dir = Path(settings.LEDGER_WAL_DIR) if settings.LEDGER_WAL_DIR else None
+        self._flush_seconds = settings.LEDGER_FLUSH_SECONDS
+        self._batch_size = max(settings.LEDGER_FLUSH_BATCH_SIZE, 1)
+        self._claim_idle_ms = int(settings.LEDGER_CLAIM_IDLE_SECONDS * 1000)
+        self._max_pending = max(settings.LEDGER_MAX_PENDING, 0)
+
+    def bind(self, redis: Redis | None) -> None:
+        self._redis = redis
+        self._ack = redis.register_script(_ACK_SCRIPT) if redis is not None else None
+        self._group_ready = False
+
+    def reset(self) -> None:
+        self._pending.clear()
+
+    async def append(self, entry: LedgerEntry) -> bool:
+        if self._redis is not None:
+            try:
+                await self._append_remote(entry)
+                return True
+            except Exception:
+                logger.warning("Nie udało się zapisać wpisu ledgera do Redis; używam lokalnego bufora.", exc_info=True)
+        if len(self._pending) >= self._max_pending:
+            logger.warning(
+                "Lokalny bufor ledgera jest pełny (%d wpisów); zapisuję wpis synchronicznie.",
+                len(self._pending),
+            )
+            return False
+        self._pending[entry.id] = entry
+        if self._wal_dir is None:
+            return True
+        try:
+            async with self._wal_lock:
+                await asyncio.to_thread(self._append_wal, entry)
+        except OSError:
+            logger.warning("Nie udało się dopisać wpisu ledgera do pliku WAL %s.", self._wal_path, exc_info=True)
+        return True
+
+    async def pending_usage(self, user_id: uuid.UUID) -> PendingUsage:
+        today = datetime.now(tz=UTC).date()
+        usage = PendingUsage()
+        for entry in self._pending.values():
+            if entry.user_id == user_id and entry.created_at.date() == today:
+                usage.cost_usd += float(entry.cost_usd)
+                usage.calls[entry.provider] = usage.calls.get(entry.provider, 0) + 1
+        if self._redis is None or not self._enabled:
+            return usage
+        try:
+            values: dict[str, str] = await self._redis.hgetall(self._pending_key(user_id, today))
+        except Exception:
+            logger.warning("Nie udało się pobrać oczekujących wpisów ledgera z Redis.", exc_info=True)
+            return usage
+        for name, value in values.items():
+            if name == "cost":
+                usage.cost_usd += max(float(value), 0.0)
+            elif name.startswith("calls:"):
+                provider = name.removeprefix("calls:")
+                usage.calls[provider] = usage.calls.get(provider, 0) + max(int(value), 0)
+        return usage
+
+    async def start(self) -> None:
+        if not self._enabled or self._flusher is not None:
+            return
+        if self._wal_dir is not None:
+            try:
+                async with self._wal_lock:
+                    await asyncio.to_thread(self._recover_wal)
+            except OSError:
+                logger.warning("Nie udało się odczytać plików WAL ledgera z %s.", self._wal_dir, exc_info=True)
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._flusher is None:
+            return
+        self._flusher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._flusher
+        self._flusher = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.warning("Nie udało się zapisać oczekujących wpisów ledgera przy zamykaniu.", exc_info=True)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_seconds)
+            try:
+                await self.flush()
+            except Exception:
+                logger.warning("Nie udało się zapisać wpisów ledgera do bazy; ponowię próbę.", exc_info=True)
+
+    async def flush(self, db: AsyncSession | None = None) -> int:
+        async with self._flush_lock:
+            flushed = 0
+            if self._pending:
+                flushed += await self._flush_local(db)
+            if self._redis is not None and self._enabled:
+                flushed += await self._flush_remote(db)
+            return flushed
+
+    async def _flush_local(self, db: AsyncSession | None) -> int:
+        entries = list(self._pending.values())
+        flushed = 0
+        for start in range(0, len(entries), self._batch_size):
+            done = await self._write(entries[start : start + self._batch_size], db)
+            for entry in done:
+                self._pending.pop(entry.id, None)
+            flushed += len(done)
+            if done and self._wal_dir is not None:
+                async with self._wal_lock:
+                    lines = [entry.dumps() for entry in self._pending.values()]
+                    await asyncio.to_thread(self._rewrite_wal, lines)
+        return flushed
+
+    async def _flush_remote(self, db: AsyncSession | None) -> int:
+        assert self._redis is not None
+        if not self._group_ready:
+            try:
+                await self._redis.xgroup_create(self._stream_key, self._group, id="0", mkstream=True)
+            except ResponseError as exc:
+                if "BUSYGROUP" not in str(exc):
+                    raise
+            self._group_ready = True
+        own = await self._redis.xreadgroup(self._group, self._consumer, {self._stream_key: "0"}, count=self._batch_size)
+        claimed = await self._redis.xautoclaim(
+            self._stream_key, self._group, self._consumer, self._claim_idle_ms, "0-0", count=self._batch_size
+        )
+        flushed = await self._write_messages(_stream_messages(own) + list(claimed[1]), db)
+        while True:
+            fresh = _stream_messages(
+                await self._redis.xreadgroup(
+                    self._group, self._consumer, {self._stream_key: ">"}, count=self._batch_size
+                )
+            )
+            if not fresh:
+                return flushed
+            flushed += await self._write_messages(fresh, db)
+
+    async def _write_messages(self, messages: list[Any], db: AsyncSession | None) -> int:
+        assert self._redis is not None
+        entries: dict[str, LedgerEntry] = {}
+        for message_id, values in messages:
+            try:
+                entries[message_id] = LedgerEntry.loads(values["entry"])
+            except (KeyError, TypeError, ValueError):
+                logger.error("Odrzucam uszkodzony wpis ledgera %s w strumieniu Redis.", message_id)
+                LEDGER_ENTRIES.labels("dropped").inc()
+                await self._redis.xack(self._stream_key, self._group, message_id)
+                await self._redis.xdel(self._stream_key, message_id)
+        if not entries:
+            return 0
+        done = {entry.id for entry in await self._write(list(entries.values()), db)}
+        keys: dict[str, int] = {self._stream_key: 1}
+        args: list[Any] = [self._group]
+        for message_id, entry in entries.items():
+            if entry.id in done:
+                key = keys.setdefault(self._pending_key(entry.user_id, entry.created_at.date()), len(keys) + 1)
+                args.extend((message_id, key, str(entry.cost_usd), entry.provider))
+        if len(args) == 1:
+            return 0
+        return int(await self._ack(keys=list(keys), args=args))
+
+    async def _write(self, entries: list[LedgerEntry], db: AsyncSession | None) -> list[LedgerEntry]:
+        if db is not None:
+            return await self._write_batch(entries, db)
+        async with get_session_factory()() as session:
+            return await self._write_batch(entries, session)
+
+    async def _write_batch(self, entries: list[LedgerEntry], db: AsyncSession) -> list[LedgerEntry]:
+        user_ids = {entry.user_id for entry in entries}
+        session_ids = {entry.session_id for entry in entries if entry.session_id is not None}
+        try:
+            known_users = set((await db.scalars(select(User.id).where(User.id.in_(user_ids)))).all())
+            known_sessions: set[uuid.UUID] = set()
+            if session_ids:
+                result = await db.scalars(select(ChatSession.id).where(ChatSession.id.in_(session_ids)))
+                known_sessions = set(result.all())
+
+            now = datetime.now(tz=UTC)
+            done: list[LedgerEntry] = []
+            rows: list[dict[str, Any]] = []
+            for entry in entries:
+                if entry.user_id not in known_users:
+                    logger.error("Odrzucam wpis ledgera %s: użytkownik %s nie istnieje.", entry.id, entry.user_id)
+                    LEDGER_ENTRIES.labels("dropped").inc()
+                    done.append(entry)
+                    continue
+                if entry.session_id is not None and entry.session_id not in known_sessions:
+                    if now - entry.created_at < timedelta(seconds=ORPHAN_GRACE_SECONDS):
+                        continue
+                    entry.session_id = None
+                rows.append(entry.row())
+                done.append(entry)
+
+            if rows:
+                await _insert_ignoring_duplicates(db, rows)
+                await db.commit()
+                LEDGER_ENTRIES.labels("flushed").inc(len(rows))
+            return done
+        except Exception:
+            await db.rollback()
+            raise
+
+    async def _append_remote(self, entry: LedgerEntry) -> None:
+        assert self._redis is not None
+        key = self._pending_key(entry.user_id, entry.created_at.date())
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.xadd(self._stream_key, {"entry": entry.dumps()})
+        pipe.hincrbyfloat(key, "cost", float(entry.cost_usd))
+        pipe.hincrby(key, f"calls:{entry.provider}", 1)
+        pipe.expire(key, PENDING_TTL_SECONDS)
+        await pipe.execute()
+
+    @property
+    def _stream_key(self) -> str:
+        return f"{{{self._key_prefix}}}:stream"
+
+    @property
+    def _group(self) -> str:
+        return f"{self._key_prefix}:writers"
+
+    def _pending_key(self, user_id: uuid.UUID, day: date) -> str:
+        return f"{{{self._key_prefix}}}:pending:{user_id}:{day.isoformat()}"
+
+    @property
+    def _wal_path(self) -> Path | None:
+        return self._wal_dir / f"ledger-{os.getpid()}.wal" if self._wal_dir is not None else None
+
+    def _append_wal(self, entry: LedgerEntry) -> None:
+        assert self._wal_path is not None
+        self._wal_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._wal_path.open("a", encoding="utf-8") as handle:
+            handle.write(entry.dumps() + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    def _rewrite_wal(self, lines: list[str]) -> None:
+        assert self._wal_path is not None
+        if not lines:
+            self._wal_path.unlink(missing_ok=True)
+            return
+        temporary = self._wal_path.with_suffix(".tmp")
+        with temporary.open("w", encoding="utf-8") as handle:
+            for line in lines:
+                handle.write(line + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, self._wal_path)
+
+    def _recover_wal(self) -> None:
+        assert self._wal_dir is not None and self._wal_path is not None
+        if not self._wal_dir.exists():
+            return
+        adopted: list[Path] = []
+        for path in sorted(self._wal_dir.glob("ledger-*.wal")):
+            try:
+                pid = int(path.stem.removeprefix("ledger-"))
+            except ValueError:
+                continue
+            if pid != os.getpid() and pid_alive(pid):
+                continue
+            for line in path.read_text(encoding="utf-8").splitlines():
+                try:
+                    entry = LedgerEntry.loads(line)
+                except (KeyError, TypeError, ValueError):
+                    logger.error("Pomijam uszkodzoną linię w pliku WAL ledgera %s.", path)
+                    continue
+                self._pending.setdefault(entry.id, entry)
+            adopted.append(path)
+        if not adopted:
+            return
+        self._rewrite_wal([entry.dumps() for entry in self._pending.values()])
+        for path in adopted:
+            if path != self._wal_path:
+                path.unlink(missing_ok=True)
+        logger.info("Odzyskano %d oczekujących wpisów ledgera z plików WAL.", len(self._pending))
+
+
+def _stream_messages(response: Any) -> list[Any]:
+    return [message for _, messages in response or [] for message in messages]
+
+
+async def _insert_ignoring_duplicates(db: AsyncSession, rows: list[dict[str, Any]]) -> None:
+    dialect = db.get_bind().dialect.name
+    if dialect in {"postgresql", "sqlite"}:
+        module = postgresql if dialect == "postgresql" else sqlite
+        await db.execute(module.insert(UsageLedger).values(rows).on_conflict_do_nothing(index_elements=["id"]))
+        return
+    result = await db.scalars(select(UsageLedger.id).where(UsageLedger.id.in_([row["id"] for row in rows])))
+    existing = set(result.all())
+    fresh = [row for row in rows if row["id"] not in existing]
+    if fresh:
+        await db.execute(insert(UsageLedger), fresh)
+
+
+ledger_buffer = LedgerBuffer()
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _pending_entries() -> dict[tuple[str, ...], float]:
+    return {(): float(ledger_buffer.pending_local)}
+
+
+metrics_registry.gauge(
+    "jarvis_ledger_pending_local",
+    "Wpisy ledgera czekające w lokalnym buforze (pamięć/WAL) na zapis do bazy",
+    (),
+    _pending_entries,
+    multiprocess_mode="livesum",
+)
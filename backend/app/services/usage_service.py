@@ -10,9 +10,13 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.exceptions import JarvisBaseError
 from app.db.models import UsageLedger
+from app.services.usage_ledger import LedgerBuffer, LedgerEntry, ledger_buffer
 
 
 class UsageService:
+    def __init__(self, buffer: LedgerBuffer | None = None) -> None:
+        self._buffer = ledger_buffer if buffer is None else buffer
+
     async def log_request(
         self,
         db: AsyncSession,
@@ -26,23 +30,33 @@ class UsageService:
         cost_usd: float,
         latency_ms: int,
         fallback_used: bool,
+        cache_hit: bool = False,
+        coalesced: bool = False,
+        cached_input_tokens: int = 0,
+        commit: bool = True,
     ) -> UsageLedger:
+        entry = LedgerEntry(
+            user_id=user_id,
+            session_id=session_id,
+            provider=provider,
+            model=model,
+            profile=profile,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cached_input_tokens=cached_input_tokens,
+            cost_usd=Decimal(str(cost_usd)),
+            latency_ms=latency_ms,
+            fallback_used=fallback_used,
+            cache_hit=cache_hit,
+            coalesced=coalesced,
+        )
+        if self._buffer.enabled and await self._buffer.append(entry):
+            return UsageLedger(**entry.row())
         try:
-            ledger = UsageLedger(
-                user_id=user_id,
-                session_id=session_id,
-                provider=provider,
-                model=model,
-                profile=profile,
-                input_tokens=input_tokens,
-                output_tokens=output_tokens,
-                cost_usd=Decimal(str(cost_usd)),
-                latency_ms=latency_ms,
-                fallback_used=fallback_used,
-            )
+            ledger = UsageLedger(**entry.row())
             db.add(ledger)
-            await db.commit()
-            await db.refresh(ledger)
+            if commit:
+                await db.commit()
             return ledger
         except Exception as exc:
             await db.rollback()
@@ -57,7 +71,8 @@ class UsageService:
                     UsageLedger.created_at >= start,
                 )
             )
-            return float(result.scalar_one() or 0)
+            pending = await self._buffer.pending_usage(user_id)
+            return float(result.scalar_one() or 0) + pending.cost_usd
         except Exception as exc:
             raise JarvisBaseError("Nie udało się pobrać kosztu dziennego", 500) from exc
 
@@ -74,17 +89,19 @@ class UsageService:
             total_cost = float(sum(float(item.cost_usd) for item in items))
             total_input = sum(item.input_tokens for item in items)
             total_output = sum(item.output_tokens for item in items)
+            total_cached = sum(item.cached_input_tokens for item in items)
 
             by_provider: dict[str, dict[str, float | int]] = {}
             for item in items:
                 bucket = by_provider.setdefault(
                     item.provider,
-                    {"requests": 0, "cost_usd": 0.0, "input_tokens": 0, "output_tokens": 0},
+                    {"requests": 0, "cost_usd": 0.0, "input_tokens": 0, "output_tokens": 0, "cached_input_tokens": 0},
                 )
                 bucket["requests"] = int(bucket["requests"]) + 1
                 bucket["cost_usd"] = float(bucket["cost_usd"]) + float(item.cost_usd)
                 bucket["input_tokens"] = int(bucket["input_tokens"]) + item.input_tokens
                 bucket["output_tokens"] = int(bucket["output_tokens"]) + item.output_tokens
+                bucket["cached_input_tokens"] = int(bucket["cached_input_tokens"]) + item.cached_input_tokens
 
             return {
                 "days": days,
@@ -92,6 +109,7 @@ class UsageService:
                 "total_cost_usd": total_cost,
                 "total_input_tokens": total_input,
                 "total_output_tokens": total_output,
+                "total_cached_input_tokens": total_cached,
                 "by_provider": by_provider,
             }
         except Exception as exc:
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from redis.asyncio import Redis
+
+from app.core.circuit_breaker import circuit_breaker
+from app.core.config import get_settings
+from app.core.exceptions import JarvisBaseError
+from app.core.logging_config import setup_logging
+from app.db.models import BatchJob
+from app.db.session import get_engine, get_session_factory
+from app.providers.factory import ProviderFactory
+from app.providers.http_pool import provider_http_pool
+from app.providers.rate_limiter import provider_rate_limiter
+from app.providers.retry import provider_retry_policy
+from app.services.batch_service import batch_service
+from app.services.orchestrator import Orchestrator, build_orchestrator
+from app.services.provider_scoreboard import provider_scoreboard
+from app.services.response_cache import response_cache
+from app.services.single_flight import single_flight
+from app.workers.celery_app import celery_app
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def worker_runtime() -> AsyncIterator[Orchestrator]:
+    settings = get_settings()
+    redis: Redis | None = Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    try:
+        await redis.ping()
+    except Exception:
+        logger.warning("Worker nie połączył się z Redis, używam stanu lokalnego.", exc_info=True)
+        await redis.aclose()
+        redis = None
+
+    bound = (provider_scoreboard, provider_rate_limiter, circuit_breaker, response_cache, single_flight)
+    for component in bound:
+        component.configure(settings)
+        component.bind(redis)
+    provider_retry_policy.configure(settings)
+    batch_service.configure(settings)
+    provider_http_pool.open(settings)
+    try:
+        yield build_orchestrator(ProviderFactory(settings))
+    finally:
+        for component in bound:
+            component.bind(None)
+        await provider_http_pool.aclose()
+        if redis is not None:
+            await redis.aclose()
+        await get_engine().dispose()
+
+
+async def run_batch_job(job_id: uuid.UUID) -> None:
+    async with worker_runtime() as orchestrator, get_session_factory()() as db:
+        try:
+            await batch_service.process(job_id, orchestrator, db)
+        except Exception as exc:
+            logger.exception("Zadanie wsadowe %s zakończyło się błędem.", job_id)
+            await db.rollback()
+            job = await db.get(BatchJob, job_id)
+            if job is not None:
+                detail = exc.detail if isinstance(exc, JarvisBaseError) else "Błąd przetwarzania zadania"
+                await batch_service.mark_failed(job, detail, db)
+
+
+@celery_app.task(name="batch.process_job")
+def process_batch_job(job_id: str) -> None:
+    settings = get_settings()
+    setup_logging(level=settings.LOG_LEVEL, json_mode=settings.LOG_JSON)
+    asyncio.run(run_batch_job(uuid.UUID(job_id)))
+
+
+def enqueue_batch_job(job_id: uuid.UUID) -> None:
+    process_batch_job.delay(str(job_id))
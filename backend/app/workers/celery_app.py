@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from celery import Celery
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+celery_app = Celery(
+    "jarvis",
+    broker=settings.CELERY_BROKER_URL or settings.REDIS_URL,
+    include=["app.workers.batch"],
+)
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    task_default_queue=settings.BATCH_QUEUE,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    task_ignore_result=True,
+    broker_connection_retry_on_startup=True,
+)
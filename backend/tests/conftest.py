@@ -12,7 +12,20 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
 )
 
+from app.core.circuit_breaker import circuit_breaker
+from app.core.metrics import metrics_registry
+from app.core.tracing import tracer
 from app.db.base import Base
+from app.db.query_stats import instrument_engine
+from app.providers.rate_limiter import provider_rate_limiter
+from app.providers.retry import provider_retry_policy
+from app.services.provider_health import provider_health_prober
+from app.services.provider_scoreboard import provider_scoreboard
+from app.services.response_cache import response_cache
+from app.services.semantic_cache import semantic_cache
+from app.services.session_summarizer import session_summarizer
+from app.services.single_flight import single_flight
+from app.services.usage_ledger import ledger_buffer
 
 os.environ.update(
     {
@@ -44,12 +57,38 @@ def event_loop() -> Generator[asyncio.AbstractEventLoop, None, None]:
     loop.close()
 
 
+_STATEFUL_SINGLETONS = (
+    circuit_breaker,
+    provider_scoreboard,
+    provider_retry_policy,
+    provider_rate_limiter,
+    provider_health_prober,
+    response_cache,
+    semantic_cache,
+    single_flight,
+    session_summarizer,
+    metrics_registry,
+    tracer,
+    ledger_buffer,
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_provider_state() -> Generator[None, None, None]:
+    for singleton in _STATEFUL_SINGLETONS:
+        singleton.reset()
+    yield
+    for singleton in _STATEFUL_SINGLETONS:
+        singleton.reset()
+
+
 @pytest_asyncio.fixture
 async def test_engine() -> AsyncGenerator[AsyncEngine, None]:
     if not _has_aiosqlite():
         pytest.skip("Brak zależności aiosqlite w środowisku testowym.")
 
     engine = create_async_engine("sqlite+aiosqlite:///test.db", echo=False)
+    instrument_engine(engine)
     import app.db.models  # noqa: F401
 
     async with engine.begin() as conn:
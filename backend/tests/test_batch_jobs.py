@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import uuid
+from datetime import UTC, datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+from app.core.exceptions import JarvisBaseError, ProviderError
+from app.db.models import BatchItem, BatchJob, ToolCounter, UsageLedger, User, UserRole
+from app.providers.base import AbstractProvider, ProviderResult
+from app.providers.factory import ProviderFactory
+from app.services.batch_service import BatchService
+from app.services.orchestrator import Orchestrator
+from app.services.policy_engine import PolicyEngine
+from app.services.single_flight import SingleFlight
+from app.services.usage_service import UsageService
+
+
+class EchoProvider(AbstractProvider):
+    def __init__(self, failures: int = 0) -> None:
+        self.calls = 0
+        self._failures = failures
+
+    @property
+    def name(self) -> str:
+        return "gemini"
+
+    async def generate(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> ProviderResult:
+        self.calls += 1
+        if self.calls <= self._failures:
+            raise ProviderError("Chwilowa awaria")
+        return ProviderResult(
+            text=f"Odpowiedź: {messages[-1]['content']}",
+            provider="gemini",
+            model="gemini-2.0-flash-lite",
+            input_tokens=10,
+            output_tokens=5,
+            cost_usd=0.001,
+            latency_ms=20,
+        )
+
+    async def health_check(self) -> bool:
+        return True
+
+
+def _orchestrator(provider: AbstractProvider) -> Orchestrator:
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = {"gemini": provider}  # type: ignore[attr-defined]
+    return Orchestrator(PolicyEngine(), factory, UsageService(), coalescer=SingleFlight(enabled=False))
+
+
+async def _user(test_session, telegram_id: int) -> User:
+    user = User(telegram_id=telegram_id, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+    return user
+
+
+@pytest.mark.asyncio
+async def test_batch_job_processes_items_in_chunks_and_writes_ledger(test_session) -> None:
+    user = await _user(test_session, 9101)
+    provider = EchoProvider()
+    service = BatchService(chunk_size=2, retry_delay_seconds=0.0)
+
+    job = await service.submit(user, ["pierwszy", "drugi", "trzeci"], "eco", "gemini", test_session)
+    processed = await service.process(job.id, _orchestrator(provider), test_session)
+
+    assert processed is not None
+    assert (processed.status, processed.completed, processed.failed) == ("completed", 3, 0)
+    assert float(processed.cost_usd) == pytest.approx(0.003)
+    assert provider.calls == 3
+
+    items = await service.list_items(job.id, 0, 10, test_session)
+    assert [item.response for item in items] == ["Odpowiedź: pierwszy", "Odpowiedź: drugi", "Odpowiedź: trzeci"]
+    assert {item.status for item in items} == {"done"}
+
+    ledger = await test_session.execute(select(UsageLedger).where(UsageLedger.user_id == user.id))
+    assert len(ledger.scalars().all()) == 3
+    counter = await test_session.execute(select(ToolCounter).where(ToolCounter.user_id == user.id))
+    assert counter.scalar_one().web_calls == 3
+
+
+@pytest.mark.asyncio
+async def test_batch_fan_out_holds_no_db_connection(test_session, test_engine) -> None:
+    user = await _user(test_session, 9108)
+    checked_out: list[int] = []
+
+    class WatchingProvider(EchoProvider):
+        async def generate(self, *args, **kwargs) -> ProviderResult:
+            checked_out.append(test_engine.pool.checkedout())
+            return await super().generate(*args, **kwargs)
+
+    service = BatchService(chunk_size=2, retry_delay_seconds=0.0)
+    job = await service.submit(user, ["a", "b", "c"], "eco", "gemini", test_session)
+    processed = await service.process(job.id, _orchestrator(WatchingProvider()), test_session)
+
+    assert processed is not None and processed.completed == 3
+    assert checked_out == [0, 0, 0]
+
+
+@pytest.mark.asyncio
+async def test_batch_item_retries_then_records_failure(test_session) -> None:
+    user = await _user(test_session, 9102)
+    provider = EchoProvider(failures=2)
+    service = BatchService(chunk_size=1, max_attempts=2, retry_delay_seconds=0.0)
+
+    job = await service.submit(user, ["a", "b"], "eco", "gemini", test_session)
+    processed = await service.process(job.id, _orchestrator(provider), test_session)
+
+    assert processed is not None
+    assert (processed.status, processed.completed, processed.failed) == ("completed", 1, 1)
+    items = await service.list_items(job.id, 0, 10, test_session)
+    assert [(item.status, item.attempts) for item in items] == [("failed", 2), ("done", 1)]
+    assert items[0].error == "Wszyscy providerzy zawiedli. Spróbuj ponownie później. Chwilowa awaria"
+
+
+@pytest.mark.asyncio
+async def test_batch_stops_at_the_daily_budget_within_a_chunk(test_session) -> None:
+    user = await _user(test_session, 9105)
+    test_session.add(ToolCounter(user_id=user.id, date=datetime.now(tz=UTC).date(), total_cost_usd=Decimal("4.9985")))
+    await test_session.commit()
+    provider = EchoProvider()
+    service = BatchService(chunk_size=5, provider_concurrency=1, retry_delay_seconds=0.0)
+
+    job = await service.submit(user, ["a", "b", "c", "d", "e"], "eco", None, test_session)
+    processed = await service.process(job.id, _orchestrator(provider), test_session)
+
+    assert processed is not None
+    assert (processed.completed, processed.failed) == (2, 3)
+    assert provider.calls == 2
+    assert set(service._slots) == {"gemini"}
+    items = await service.list_items(job.id, 0, 10, test_session)
+    assert items[-1].error == "Przekroczono limit: wyczerpany dzienny budżet"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_job_is_not_processed(test_session) -> None:
+    user = await _user(test_session, 9103)
+    provider = EchoProvider()
+    service = BatchService()
+
+    job = await service.submit(user, ["a"], "eco", None, test_session)
+    await service.cancel(job, test_session)
+    processed = await service.process(job.id, _orchestrator(provider), test_session)
+
+    assert processed is not None and processed.status == "cancelled"
+    assert provider.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_submit_rejects_oversized_and_empty_batches(test_session) -> None:
+    user = await _user(test_session, 9104)
+    service = BatchService(max_items=2)
+
+    with pytest.raises(JarvisBaseError) as too_many:
+        await service.submit(user, ["a", "b", "c"], "eco", None, test_session)
+    with pytest.raises(JarvisBaseError):
+        await service.submit(user, ["a", "  "], "eco", None, test_session)
+
+    assert too_many.value.status_code == 422
+    jobs = await test_session.execute(select(BatchJob).where(BatchJob.user_id == user.id))
+    assert jobs.scalars().all() == []
+
+
+@pytest.mark.asyncio
+async def test_batch_routes_submit_poll_and_stream(async_client, test_session, monkeypatch) -> None:
+    enqueued: list[uuid.UUID] = []
+    monkeypatch.setattr("app.api.v1.routes_batch.enqueue_batch_job", enqueued.append)
+
+    register = await async_client.post("/api/v1/auth/register", json={"telegram_chat_id": 9105})
+    headers = {"Authorization": f"Bearer {register.json()['access_token']}"}
+    user = (await test_session.execute(select(User).where(User.telegram_id == 9105))).scalar_one()
+    user.authorized = True
+    await test_session.commit()
+
+    submitted = await async_client.post(
+        "/api/v1/batch/jobs",
+        json={"prompts": ["jeden", "dwa"], "provider": "gemini"},
+        headers=headers,
+    )
+    assert submitted.status_code == 202
+    job_id = submitted.json()["id"]
+    assert submitted.json()["status"] == "queued" and enqueued == [uuid.UUID(job_id)]
+
+    await BatchService().process(uuid.UUID(job_id), _orchestrator(EchoProvider()), test_session)
+
+    status = await async_client.get(f"/api/v1/batch/jobs/{job_id}", headers=headers)
+    assert status.json()["status"] == "completed" and status.json()["completed"] == 2
+
+    results = await async_client.get(f"/api/v1/batch/jobs/{job_id}/results?limit=1", headers=headers)
+    body = results.json()
+    assert [item["response"] for item in body["items"]] == ["Odpowiedź: jeden"]
+    assert body["next_offset"] == 1
+
+    events = await async_client.get(f"/api/v1/batch/jobs/{job_id}/events", headers=headers)
+    assert events.text.startswith("event: done")
+
+    other = await async_client.post("/api/v1/auth/register", json={"telegram_chat_id": 9106})
+    forbidden = await async_client.get(
+        f"/api/v1/batch/jobs/{job_id}",
+        headers={"Authorization": f"Bearer {other.json()['access_token']}"},
+    )
+    assert forbidden.status_code == 404
+
+    items = await test_session.execute(select(BatchItem).where(BatchItem.job_id == uuid.UUID(job_id)))
+    assert len(items.scalars().all()) == 2
@@ -1,32 +1,119 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
+import json
+from typing import Any
 
-from app.core.circuit_breaker import CircuitBreaker
+import pytest
 
+from app.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
 
-def test_circuit_opens_after_failures() -> None:
-    breaker = CircuitBreaker("provider-a", failure_threshold=3, recovery_timeout=60)
-    breaker.record_failure()
-    breaker.record_failure()
-    breaker.record_failure()
 
-    assert breaker.is_open() is True
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
 
+    def __call__(self) -> float:
+        return self.now
 
-def test_circuit_recovers_after_timeout() -> None:
-    breaker = CircuitBreaker("provider-b", failure_threshold=1, recovery_timeout=1)
-    breaker.record_failure()
-    CircuitBreaker._state["provider-b"]["opened_at"] = datetime.now(timezone.utc) - timedelta(seconds=2)
 
-    assert breaker.is_open() is False
+class _ScriptRedis:
+    def __init__(self, replies: list[list[Any]] | None = None, fail: bool = False) -> None:
+        self.replies = replies or []
+        self.fail = fail
+        self.calls: list[tuple[list[str], list[Any]]] = []
 
+    def register_script(self, script: str) -> Any:
+        async def _run(keys: list[str], args: list[Any]) -> list[Any]:
+            self.calls.append((keys, args))
+            if self.fail:
+                raise ConnectionError("redis down")
+            return self.replies.pop(0)
 
-def test_circuit_half_open_success_closes() -> None:
-    breaker = CircuitBreaker("provider-c", failure_threshold=1, recovery_timeout=1)
-    breaker.record_failure()
-    CircuitBreaker._state["provider-c"]["opened_at"] = datetime.now(timezone.utc) - timedelta(seconds=2)
+        return _run
 
-    assert breaker.is_open() is False
-    breaker.record_success()
-    assert breaker.is_open() is False
+
+def _breaker(clock: _Clock, **kwargs: Any) -> CircuitBreaker:
+    return CircuitBreaker(clock=clock, failure_threshold=3, recovery_timeout=60, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_after_failures() -> None:
+    breaker = _breaker(_Clock())
+    for _ in range(3):
+        await breaker.record_failure("provider-a")
+
+    assert breaker.status("provider-a") == OPEN
+    assert await breaker.allow("provider-a") is False
+
+
+@pytest.mark.asyncio
+async def test_half_open_allows_limited_probes_after_timeout() -> None:
+    clock = _Clock()
+    breaker = _breaker(clock, half_open_probes=2)
+    for _ in range(3):
+        await breaker.record_failure("provider-b")
+
+    clock.now += 61
+    assert await breaker.allow("provider-b") is True
+    assert breaker.status("provider-b") == HALF_OPEN
+    assert await breaker.allow("provider-b") is True
+    assert await breaker.allow("provider-b") is False
+
+    await breaker.record_success("provider-b")
+    assert breaker.status("provider-b") == CLOSED
+    assert await breaker.allow("provider-b") is True
+
+
+@pytest.mark.asyncio
+async def test_half_open_failure_reopens() -> None:
+    clock = _Clock()
+    breaker = _breaker(clock)
+    for _ in range(3):
+        await breaker.record_failure("provider-c")
+    clock.now += 61
+    assert await breaker.allow("provider-c") is True
+
+    await breaker.record_failure("provider-c")
+
+    assert breaker.status("provider-c") == OPEN
+    assert await breaker.allow("provider-c") is False
+
+
+@pytest.mark.asyncio
+async def test_transitions_go_through_redis_script() -> None:
+    redis = _ScriptRedis(replies=[[1, "closed", 2], [1, "open", 3], [0, "open", 3]])
+    breaker = _breaker(_Clock())
+    breaker.bind(redis)  # type: ignore[arg-type]
+
+    await breaker.record_failure("Groq")
+    await breaker.record_failure("groq")
+    assert await breaker.allow("groq") is False
+
+    assert breaker.status("groq") == OPEN
+    keys, args = redis.calls[0]
+    assert keys == ["circuit_breaker:groq"]
+    assert args[0] == "failure"
+    assert [call[1][0] for call in redis.calls] == ["failure", "failure", "allow"]
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_falls_back_to_local_state() -> None:
+    breaker = _breaker(_Clock())
+    breaker.bind(_ScriptRedis(fail=True))  # type: ignore[arg-type]
+
+    for _ in range(3):
+        await breaker.record_failure("deepseek")
+
+    assert await breaker.allow("deepseek") is False
+
+
+def test_published_events_update_local_mirror() -> None:
+    breaker = _breaker(_Clock())
+
+    breaker._handle_event(json.dumps({"name": "gemini", "status": "open", "failures": 3}))
+    assert breaker.status("gemini") == OPEN
+    assert breaker.snapshot()["gemini"]["failures"] == 3
+
+    breaker._handle_event("nie-json")
+    breaker._handle_event(json.dumps({"name": "gemini", "status": "closed", "failures": 0}))
+    assert breaker.status("gemini") == CLOSED
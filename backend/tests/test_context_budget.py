@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from app.core.exceptions import InsufficientCreditsError
+from app.db.models import ChatSession, Message, User, UserRole
+from app.providers.base import AbstractProvider, ProviderResult
+from app.providers.catalog import get_model_spec, model_costs
+from app.providers.factory import ProviderFactory
+from app.providers.tokenizer import estimate_messages_tokens, estimate_tokens
+from app.services.orchestrator import Orchestrator
+from app.services.policy_engine import PolicyEngine
+from app.services.usage_service import UsageService
+
+
+class RecordingProvider(AbstractProvider):
+    def __init__(self, name: str, model: str = "") -> None:
+        self._name = name
+        self._model = model
+        self.seen: list[list[dict[str, str]]] = []
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def resolve_model(self, profile: str) -> str:
+        return self._model
+
+    async def generate(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> ProviderResult:
+        self.seen.append(messages)
+        return ProviderResult(
+            text="ok",
+            provider=self._name,
+            model=self._model or "test",
+            input_tokens=1,
+            output_tokens=1,
+            cost_usd=0.0,
+            latency_ms=5,
+        )
+
+    async def health_check(self) -> bool:
+        return True
+
+
+def _orchestrator(registry: dict[str, AbstractProvider]) -> Orchestrator:
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = registry  # type: ignore[attr-defined]
+    return Orchestrator(PolicyEngine(), factory, UsageService())
+
+
+def test_token_estimates_depend_on_script_and_provider() -> None:
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a" * 400, "gemini") == 100
+    assert estimate_tokens("a" * 400, "deepseek") > estimate_tokens("a" * 400, "gemini")
+    assert estimate_tokens("ż" * 100) > estimate_tokens("z" * 100)
+    assert estimate_messages_tokens([{"role": "user", "content": "a" * 40}], "gemini") == 10 + 3 + 3
+
+
+def test_catalog_is_the_source_of_provider_pricing() -> None:
+    spec = get_model_spec("DeepSeek", "deepseek-chat")
+
+    assert spec is not None and spec.context_window == 64_000
+    assert model_costs("deepseek")["deepseek-chat"] == (0.14, 0.28)
+    assert spec.estimate_cost(1_000_000, 1_000_000) == pytest.approx(0.42)
+    assert get_model_spec("deepseek", "unknown") is None
+
+
+@pytest.mark.asyncio
+async def test_history_is_packed_newest_first_within_profile_budget(test_session) -> None:
+    user = User(telegram_id=9201, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+    session = ChatSession(user_id=user.id, mode="eco")
+    test_session.add(session)
+    await test_session.commit()
+
+    start = datetime.now(tz=UTC) - timedelta(minutes=10)
+    contents = ["stara wiadomość", "dokument " * 3000, "krótkie pytanie", "krótka odpowiedź"]
+    for offset, content in enumerate(contents):
+        role = "user" if offset % 2 == 0 else "assistant"
+        test_session.add(
+            Message(session_id=session.id, role=role, content=content, created_at=start + timedelta(seconds=offset))
+        )
+    await test_session.commit()
+
+    provider = RecordingProvider("gemini")
+    await _orchestrator({"gemini": provider}).process_chat(
+        user=user,
+        prompt="nowe pytanie",
+        session_id=session.id,
+        provider_pref="gemini",
+        mode="eco",
+        db=test_session,
+    )
+
+    assert [message["content"] for message in provider.seen[0]] == [
+        "krótkie pytanie",
+        "krótka odpowiedź",
+        "nowe pytanie",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_estimated_cost_above_budget_is_rejected_before_calling_provider() -> None:
+    user = User(telegram_id=9202, role=UserRole.FULL_ACCESS, authorized=True)
+    grok = RecordingProvider("grok", "grok-2")
+    orchestrator = _orchestrator({"grok": grok})
+
+    with pytest.raises(InsufficientCreditsError):
+        await orchestrator._run_with_fallback_chain(
+            user, "grok", "eco", [{"role": "user", "content": "hej"}], budget_remaining=0.001
+        )
+
+    assert grok.seen == []
+    result = await orchestrator._run_with_fallback_chain(
+        user, "grok", "eco", [{"role": "user", "content": "hej"}], budget_remaining=1.0
+    )
+    assert result.provider == "grok"
+
+
+@pytest.mark.asyncio
+async def test_models_with_too_small_context_window_are_skipped() -> None:
+    user = User(telegram_id=9203, role=UserRole.DEMO, authorized=True)
+    small = RecordingProvider("groq", "gemma2-9b-it")
+    large = RecordingProvider("gemini", "gemini-2.0-flash-lite")
+    orchestrator = _orchestrator({"groq": small, "gemini": large})
+    orchestrator._get_provider_chain = lambda **_: _chain("groq", "gemini")  # type: ignore[method-assign]
+
+    result = await orchestrator._run_with_fallback_chain(
+        user, None, "eco", [{"role": "user", "content": "słowo " * 20_000}], budget_remaining=5.0
+    )
+
+    assert result.provider == "gemini"
+    assert small.seen == []
+
+
+async def _chain(*names: str) -> list[str]:
+    return list(names)
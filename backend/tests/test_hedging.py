@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import get_settings
+from app.core.exceptions import ProviderError
+from app.db.models import UsageLedger, User, UserRole
+from app.providers.base import AbstractProvider, ProviderResult
+from app.providers.factory import ProviderFactory
+from app.services.orchestrator import Orchestrator
+from app.services.policy_engine import PolicyEngine
+from app.services.provider_scoreboard import ProviderScoreboard
+from app.services.usage_ledger import ledger_buffer
+from app.services.usage_service import UsageService
+
+
+class DelayedProvider(AbstractProvider):
+    def __init__(self, name: str, delay: float, cost: float = 0.0, fail: bool = False) -> None:
+        self._name = name
+        self._delay = delay
+        self._cost = cost
+        self._fail = fail
+        self.cancelled = False
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def generate(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> ProviderResult:
+        try:
+            await asyncio.sleep(self._delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self._fail:
+            raise ProviderError(f"{self._name} failed")
+        return ProviderResult(
+            text=f"Odpowiedź z {self._name}",
+            provider=self._name,
+            model=f"{self._name}-model",
+            input_tokens=10,
+            output_tokens=5,
+            cost_usd=self._cost,
+            latency_ms=int(self._delay * 1000),
+        )
+
+    async def health_check(self) -> bool:
+        return True
+
+
+@pytest.fixture
+def hedging_settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    settings = get_settings()
+    monkeypatch.setattr(settings, "HEDGING_ENABLED", True)
+    monkeypatch.setattr(settings, "HEDGE_DEFAULT_DELAY_MS", 50)
+    monkeypatch.setattr(settings, "HEDGE_MIN_DELAY_MS", 10)
+
+
+def _orchestrator(registry: dict[str, AbstractProvider], scoreboard: ProviderScoreboard | None = None) -> Orchestrator:
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = registry  # type: ignore[attr-defined]
+    return Orchestrator(PolicyEngine(), factory, UsageService(), scoreboard=scoreboard or ProviderScoreboard())
+
+
+@pytest.mark.asyncio
+async def test_hedge_delay_uses_scoreboard_percentile(hedging_settings) -> None:
+    scoreboard = ProviderScoreboard(window=100, refresh_seconds=0.0)
+    for latency in range(1, 101):
+        await scoreboard.record_success("gemini", "eco", latency)
+    orchestrator = _orchestrator({}, scoreboard)
+    settings = get_settings()
+
+    assert await scoreboard.latency_percentile("gemini", "eco", 0.9) == 90.0
+    assert await scoreboard.latency_percentile("gemini", "eco", 0.5, min_samples=101) is None
+    assert await orchestrator._hedge_delay_ms("gemini", "eco", settings) == 90.0
+    assert await orchestrator._hedge_delay_ms("deepseek", "eco", settings) == 50.0
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_cancelled(test_session, hedging_settings) -> None:
+    user = User(telegram_id=6101, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+
+    slow_gemini = DelayedProvider("gemini", delay=5.0, cost=0.5)
+    fast_deepseek = DelayedProvider("deepseek", delay=0.01, cost=0.001)
+    orchestrator = _orchestrator({"gemini": slow_gemini, "deepseek": fast_deepseek})
+
+    response = await orchestrator.process_chat(
+        user=user,
+        prompt="Wyjaśnij pojęcie",
+        session_id=None,
+        provider_pref=None,
+        mode="eco",
+        db=test_session,
+    )
+
+    assert response["meta"]["provider"] == "deepseek"
+    assert response["meta"]["fallback_used"] is True
+    assert response["meta"]["hedged"] is True
+    assert slow_gemini.cancelled is True
+
+    await ledger_buffer.flush(test_session)
+
+    ledger = await test_session.execute(select(UsageLedger).where(UsageLedger.user_id == user.id))
+    rows = ledger.scalars().all()
+    assert [row.provider for row in rows] == ["deepseek"]
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged(test_session, hedging_settings) -> None:
+    user = User(telegram_id=6102, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+
+    fast_gemini = DelayedProvider("gemini", delay=0.0)
+    deepseek = DelayedProvider("deepseek", delay=0.0)
+    orchestrator = _orchestrator({"gemini": fast_gemini, "deepseek": deepseek})
+
+    response = await orchestrator.process_chat(
+        user=user,
+        prompt="Wyjaśnij pojęcie",
+        session_id=None,
+        provider_pref=None,
+        mode="eco",
+        db=test_session,
+    )
+
+    assert response["meta"]["provider"] == "gemini"
+    assert response["meta"]["hedged"] is False
+    assert response["meta"]["fallback_used"] is False
+
+
+@pytest.mark.asyncio
+async def test_failed_primary_falls_back_in_hedging_mode(test_session, hedging_settings) -> None:
+    user = User(telegram_id=6103, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+
+    orchestrator = _orchestrator(
+        {
+            "gemini": DelayedProvider("gemini", delay=0.0, fail=True),
+            "deepseek": DelayedProvider("deepseek", delay=0.0),
+        }
+    )
+
+    response = await orchestrator.process_chat(
+        user=user,
+        prompt="Wyjaśnij pojęcie",
+        session_id=None,
+        provider_pref=None,
+        mode="eco",
+        db=test_session,
+    )
+
+    assert response["meta"]["provider"] == "deepseek"
+    assert response["meta"]["fallback_used"] is True
+    assert response["meta"]["hedged"] is False
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+import respx
+
+from app.core.config import Settings
+from app.providers.deepseek import DeepSeekProvider
+from app.providers.http_pool import ProviderHTTPPool, provider_http_pool
+
+
+def test_pool_applies_per_provider_limits() -> None:
+    pool = ProviderHTTPPool()
+    pool.open(Settings(PROVIDER_HTTP_MAX_CONNECTIONS=40, PROVIDER_HTTP_MAX_KEEPALIVE=15))
+    pool.configure("groq", max_connections=5)
+
+    assert pool.limits_for("groq").max_connections == 5
+    assert pool.limits_for("groq").max_keepalive_connections == 5
+    assert pool.limits_for("deepseek").max_connections == 40
+    assert pool.limits_for("deepseek").max_keepalive_connections == 15
+
+
+@pytest.mark.asyncio
+async def test_pool_returns_same_client_until_closed() -> None:
+    pool = ProviderHTTPPool()
+    first = pool.get_client("gemini")
+    assert pool.get_client("GEMINI") is first
+    assert set(pool.stats()) == {"gemini"}
+
+    await pool.aclose()
+    assert first.is_closed
+    assert pool.stats() == {}
+    assert pool.get_client("gemini") is not first
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_provider_reuses_pooled_client() -> None:
+    respx.post("https://api.deepseek.com/v1/chat/completions").mock(
+        return_value=httpx.Response(
+            200,
+            json={
+                "choices": [{"message": {"content": "OK"}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1},
+            },
+        )
+    )
+    await provider_http_pool.aclose()
+    provider = DeepSeekProvider(Settings(DEEPSEEK_API_KEY="test"))
+
+    for _ in range(3):
+        await provider.generate(
+            messages=[{"role": "user", "content": "Test"}],
+            profile="eco",
+            max_tokens=8,
+            temperature=0.0,
+        )
+
+    stats = provider_http_pool.stats()["deepseek"]
+    assert stats["requests"] == 3
+    assert stats["max_connections"] == 30
+    await provider_http_pool.aclose()
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+from prometheus_client import generate_latest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.circuit_breaker import circuit_breaker
+from app.core.config import get_settings
+from app.core.metrics import InstrumentedQueuePool, MetricsRegistry, metrics_registry, observe_provider_result
+from app.db.models import User, UserRole
+from app.providers.base import ProviderResult
+from app.services.policy_engine import PolicyEngine
+
+
+def _sample(name: str, **labels: str) -> float | None:
+    metrics_registry.refresh_gauges()
+    return metrics_registry.registry.get_sample_value(name, labels)
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    registry = MetricsRegistry()
+    histogram = registry.histogram("demo_seconds", "Demo", ("route",), (0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.labels("/x").observe(value)
+
+    body = generate_latest(registry.registry).decode()
+
+    assert 'demo_seconds_bucket{le="0.1",route="/x"} 2.0' in body
+    assert 'demo_seconds_bucket{le="1.0",route="/x"} 3.0' in body
+    assert 'demo_seconds_bucket{le="+Inf",route="/x"} 4.0' in body
+    assert 'demo_seconds_count{route="/x"} 4.0' in body
+    assert 'demo_seconds_sum{route="/x"} 3.65' in body
+
+
+def test_provider_result_and_breaker_state_are_exposed() -> None:
+    observe_provider_result(
+        ProviderResult("ok", "deepseek", "deepseek-chat", 1200, 80, 0.0004, 850, fallback_used=True),
+        "smart",
+    )
+    observe_provider_result(ProviderResult("ok", "deepseek", "deepseek-chat", 0, 0, 0.0, 1, cache_hit=True), "smart")
+    circuit_breaker._transition_local("gemini", "failure")
+
+    deepseek = {"provider": "deepseek", "model": "deepseek-chat"}
+    assert _sample("jarvis_provider_latency_seconds_count", profile="smart", **deepseek) == 1.0
+    assert _sample("jarvis_provider_tokens_sum", kind="input", **deepseek) == 1200.0
+    assert _sample("jarvis_provider_fallbacks_total", provider="deepseek") == 1.0
+    flags = {"fallback": "false", "hedged": "false", "cache_hit": "true", "coalesced": "false"}
+    assert _sample("jarvis_provider_responses_total", **flags, **deepseek) == 1.0
+    assert _sample("jarvis_circuit_breaker_state", provider="gemini", state="closed") == 1.0
+    assert _sample("jarvis_circuit_breaker_failures", provider="gemini") == 1.0
+
+
+async def test_metrics_endpoint_records_route_templates(async_client) -> None:
+    await async_client.get("/api/v1/health")
+    await async_client.get("/does-not-exist")
+    await async_client.get("/api/v1/batch/jobs/00000000-0000-0000-0000-000000000001")
+
+    response = await async_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'method="GET",route="/api/v1/health",status="200"' in response.text
+    assert 'method="GET",route="unmatched",status="404"' in response.text
+    assert 'route="/api/v1/batch/jobs/{job_id}"' in response.text
+    assert 'route="/metrics"' not in response.text
+
+
+async def test_policy_denials_are_counted_by_reason(test_session) -> None:
+    user = User(telegram_id=4201, role=UserRole.DEMO, authorized=False)
+    test_session.add(user)
+    await test_session.commit()
+    engine = PolicyEngine()
+
+    await engine.check_access(user, "gemini", test_session, get_settings())
+    user.authorized = True
+    await engine.check_access(user, "anthropic", test_session, get_settings())
+    await engine.check_access(user, "gemini", test_session, get_settings())
+
+    assert _sample("jarvis_policy_denials_total", reason="unauthorized") == 1.0
+    assert _sample("jarvis_policy_denials_total", reason="provider_forbidden") == 1.0
+
+
+async def test_pool_checkout_wait_is_observed(tmp_path) -> None:
+    before = _sample("jarvis_db_pool_checkout_seconds_count") or 0.0
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool)
+    try:
+        for _ in range(3):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+    finally:
+        await engine.dispose()
+
+    assert _sample("jarvis_db_pool_checkout_seconds_count") == before + 3
+
+
+def test_multiprocess_workers_are_summed(tmp_path) -> None:
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    worker = (
+        "from app.core.metrics import POLICY_DENIALS, metrics_registry; "
+        "POLICY_DENIALS.labels('unauthorized').inc(); "
+        "metrics_registry.refresh_gauges()"
+    )
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", worker], env=env, check=True)
+
+    scrape = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from app.core.metrics import metrics_registry; print(metrics_registry.exposition().decode())",
+        ],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+    assert 'jarvis_policy_denials_total{reason="unauthorized"} 2.0' in scrape.stdout
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from collections.abc import AsyncGenerator
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.core.config import Settings
+from app.mock_provider.server import MockProviderServer, RouteProfile, create_mock_app
+from app.providers.factory import ProviderFactory, parse_base_url_overrides
+from app.providers.http_pool import provider_http_pool
+
+MOCK_URL = "http://mock:9100"
+
+
+@pytest_asyncio.fixture
+async def mock_server() -> AsyncGenerator[MockProviderServer, None]:
+    server = MockProviderServer(
+        default=RouteProfile(latency_ms=0, output_tokens=7, cached_input_tokens=3, reply="Cześć z mocka"),
+        seed=1,
+    )
+    app = create_mock_app(server)
+    for name in ("deepseek", "gemini"):
+        provider_http_pool._clients[name] = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+    yield server
+    for name in ("deepseek", "gemini"):
+        await provider_http_pool.close_client(name)
+
+
+def _factory() -> ProviderFactory:
+    return ProviderFactory(
+        Settings(DEEPSEEK_API_KEY="mock", GEMINI_API_KEY="mock", PROVIDER_BASE_URL_OVERRIDES=f"*={MOCK_URL}")
+    )
+
+
+def test_base_url_overrides_apply_to_registered_providers() -> None:
+    factory = ProviderFactory(
+        Settings(
+            DEEPSEEK_API_KEY="mock",
+            GEMINI_API_KEY="mock",
+            GROQ_API_KEY="mock",
+            PROVIDER_BASE_URL_OVERRIDES=f"*={MOCK_URL}, groq=http://other:1/groq/",
+        )
+    )
+
+    assert factory.get("deepseek")._base_url == f"{MOCK_URL}/deepseek"  # type: ignore[union-attr]
+    assert factory.get("gemini")._base_url == f"{MOCK_URL}/gemini/models"  # type: ignore[union-attr]
+    assert factory.get("groq")._base_url == "http://other:1/groq"  # type: ignore[union-attr]
+    assert parse_base_url_overrides(" , broken, a=") == {}
+
+
+@pytest.mark.asyncio
+async def test_openai_protocol_plain_and_streaming(mock_server: MockProviderServer) -> None:
+    provider = _factory().get("deepseek")
+    assert provider is not None
+
+    result = await provider.generate([{"role": "user", "content": "hej " * 40}], "eco", 32, 0.1)
+    chunks = [chunk async for chunk in provider.stream([{"role": "user", "content": "hej"}], "eco", 32, 0.1)]
+
+    assert (result.text, result.output_tokens, result.cached_input_tokens) == ("Cześć z mocka", 7, 3)
+    assert result.input_tokens > 10
+    assert "".join(chunk.text for chunk in chunks) == "Cześć z mocka"
+    assert chunks[-1].result is not None and chunks[-1].result.output_tokens == 7
+    assert mock_server.stats["deepseek"]["ok"] == 2
+
+
+@pytest.mark.asyncio
+async def test_gemini_protocol_plain_and_streaming(mock_server: MockProviderServer) -> None:
+    provider = _factory().get("gemini")
+    assert provider is not None
+
+    result = await provider.generate([{"role": "user", "content": "hej"}], "smart", 32, 0.1)
+    chunks = [chunk async for chunk in provider.stream([{"role": "user", "content": "hej"}], "smart", 32, 0.1)]
+
+    assert (result.text, result.model, result.output_tokens) == ("Cześć z mocka", "gemini-2.0-flash", 7)
+    assert "".join(chunk.text for chunk in chunks) == "Cześć z mocka"
+    assert await provider.health_check() is True
+
+
+@pytest.mark.asyncio
+async def test_route_faults_are_configurable_at_runtime() -> None:
+    app = create_mock_app(MockProviderServer(default=RouteProfile(latency_ms=0)))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url=MOCK_URL) as client:
+        updated = await client.put("/_mock/routes/groq", json={"rate_limit_rate": 1.0, "retry_after_seconds": 2})
+        limited = await client.post("/groq/chat/completions", json={"messages": []})
+        await client.put("/_mock/routes/groq", json={"rate_limit_rate": 0.0, "error_rate": 1.0, "error_status": 503})
+        failed = await client.post("/groq/chat/completions", json={"messages": []})
+        healthy = await client.post("/deepseek/chat/completions", json={"messages": []})
+        invalid = await client.put("/_mock/routes/groq", json={"latency": "gamma"})
+        stats = await client.get("/_mock/stats")
+
+    assert updated.json()["rate_limit_rate"] == 1.0
+    assert limited.status_code == 429 and limited.headers["retry-after"] == "2"
+    assert failed.status_code == 503 and healthy.status_code == 200
+    assert invalid.status_code == 422
+    assert stats.json() == {"deepseek": {"ok": 1}, "groq": {"rate_limited": 1, "error": 1}}
+
+
+def test_latency_distributions_and_profile_validation() -> None:
+    server = MockProviderServer(seed=7)
+
+    uniform = server.sample_latency(RouteProfile(latency="uniform", latency_ms=100, latency_spread_ms=50))
+    lognormal = [server.sample_latency(RouteProfile(latency="lognormal", latency_ms=100)) for _ in range(200)]
+
+    assert 0.05 <= uniform <= 0.15
+    assert 0.05 < sorted(lognormal)[100] < 0.2
+    with pytest.raises(ValueError):
+        RouteProfile.from_dict({"error_rate": 0.6, "rate_limit_rate": 0.6})
+    with pytest.raises(ValueError):
+        MockProviderServer.from_dict({"routes": {"gemini": {"unknown": 1}}})
+    configured = MockProviderServer.from_dict({"default": {"output_tokens": 5}, "routes": {"groq": {}}})
+    assert configured.profile("groq").output_tokens == 5
@@ -1,15 +1,17 @@
 from __future__ import annotations
 
+import uuid
 
 import pytest
 from sqlalchemy import select
 
 from app.core.exceptions import PolicyDeniedError
-from app.db.models import UsageLedger, User, UserRole
+from app.db.models import ChatSession, UsageLedger, User, UserRole
 from app.providers.base import AbstractProvider, ProviderResult
 from app.providers.factory import ProviderFactory
 from app.services.orchestrator import Orchestrator
 from app.services.policy_engine import PolicyEngine
+from app.services.usage_ledger import ledger_buffer
 from app.services.usage_service import UsageService
 
 
@@ -100,5 +102,44 @@ async def test_usage_logged_after_chat(test_session) -> None:
         mode="eco",
         db=test_session,
     )
+    await ledger_buffer.flush(test_session)
     result = await test_session.execute(select(UsageLedger).where(UsageLedger.user_id == user.id))
     assert result.scalar_one_or_none() is not None
+
+
+@pytest.mark.asyncio
+async def test_chat_turn_commits_once(test_session, monkeypatch) -> None:
+    user = User(telegram_id=3004, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = {"gemini": MockGeminiProvider()}  # type: ignore[attr-defined]
+    orchestrator = Orchestrator(PolicyEngine(), factory, UsageService())
+    commits = 0
+    commit = test_session.commit
+
+    async def counting_commit() -> None:
+        nonlocal commits
+        commits += 1
+        await commit()
+
+    monkeypatch.setattr(test_session, "commit", counting_commit)
+
+    first = await orchestrator.process_chat(
+        user=user, prompt="Hej", session_id=None, provider_pref="gemini", mode="eco", db=test_session
+    )
+    await orchestrator.process_chat(
+        user=user,
+        prompt="Znowu",
+        session_id=uuid.UUID(first["session_id"]),
+        provider_pref="gemini",
+        mode="eco",
+        db=test_session,
+    )
+
+    assert commits == 2
+    session = await test_session.get(ChatSession, uuid.UUID(first["session_id"]))
+    assert session is not None
+    await test_session.refresh(session)
+    assert session.message_count == 4
@@ -62,3 +62,16 @@ async def test_increment_counters(test_session) -> None:
     await engine.increment_counters(user=user, provider="grok", cost=0.11, smart_credits=2, db=test_session)
     limits = await engine.get_remaining_limits(user=user, db=test_session, settings=get_settings())
     assert limits["grok_remaining"] == get_settings().DEMO_GROK_DAILY - 1
+
+
+@pytest.mark.asyncio
+async def test_increment_counters_accumulates_in_sql(test_session) -> None:
+    user = User(telegram_id=1007, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+    engine = PolicyEngine()
+    for _ in range(2):
+        await engine.increment_counters(user=user, provider="grok", cost=0.1, smart_credits=1, db=test_session)
+    limits = await engine.get_remaining_limits(user=user, db=test_session, settings=get_settings())
+    assert limits["grok_remaining"] == get_settings().DEMO_GROK_DAILY - 2
+    assert limits["smart_credits_remaining"] == get_settings().DEMO_SMART_CREDITS_DAILY - 2
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+from datetime import UTC, datetime, timedelta
+
+import httpx
+import pytest
+import respx
+from sqlalchemy import select
+
+from app.core.circuit_breaker import circuit_breaker
+from app.core.config import Settings
+from app.db.models import ChatSession, Message, UsageLedger, User, UserRole
+from app.providers.base import AbstractProvider, ProviderResult
+from app.providers.catalog import get_model_spec
+from app.providers.deepseek import DeepSeekProvider
+from app.providers.factory import ProviderFactory
+from app.providers.gemini import GeminiProvider
+from app.services.orchestrator import Orchestrator
+from app.services.policy_engine import PolicyEngine
+from app.services.session_summarizer import SessionSummarizer
+from app.services.usage_ledger import ledger_buffer
+from app.services.usage_service import UsageService
+
+
+class CachingProvider(AbstractProvider):
+    def __init__(self, name: str, model: str) -> None:
+        self._name = name
+        self._model = model
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def resolve_model(self, profile: str) -> str:
+        return self._model
+
+    async def generate(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> ProviderResult:
+        self.calls += 1
+        return ProviderResult(
+            text=f"{self._name} ok",
+            provider=self._name,
+            model=self._model,
+            input_tokens=1000,
+            output_tokens=10,
+            cost_usd=0.0001,
+            latency_ms=10,
+            cached_input_tokens=800,
+        )
+
+    async def health_check(self) -> bool:
+        return True
+
+
+def _orchestrator(registry: dict[str, AbstractProvider]) -> Orchestrator:
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = registry  # type: ignore[attr-defined]
+    return Orchestrator(PolicyEngine(), factory, UsageService(), summarizer=SessionSummarizer(enabled=False))
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_deepseek_cache_hit_tokens_are_billed_at_cached_rate() -> None:
+    respx.post("https://api.deepseek.com/v1/chat/completions").mock(
+        return_value=httpx.Response(
+            200,
+            json={
+                "choices": [{"message": {"content": "OK"}}],
+                "usage": {
+                    "prompt_tokens": 1_000_000,
+                    "completion_tokens": 0,
+                    "prompt_cache_hit_tokens": 750_000,
+                    "prompt_cache_miss_tokens": 250_000,
+                },
+            },
+        )
+    )
+    provider = DeepSeekProvider(Settings(DEEPSEEK_API_KEY="test"))
+
+    result = await provider.generate([{"role": "user", "content": "Test"}], "eco", 32, 0.1)
+
+    assert result.cached_input_tokens == 750_000
+    assert result.cost_usd == pytest.approx(0.25 * 0.14 + 0.75 * 0.014)
+
+
+def test_openai_style_and_gemini_cached_token_fields_are_parsed() -> None:
+    provider = DeepSeekProvider(Settings(DEEPSEEK_API_KEY="test"))
+    openai_style = provider._build_result(
+        text="ok",
+        usage={"prompt_tokens": 100, "completion_tokens": 5, "prompt_tokens_details": {"cached_tokens": 64}},
+        model="deepseek-chat",
+        start=0.0,
+    )
+    gemini = GeminiProvider(Settings(GEMINI_API_KEY="test"))._build_result(
+        text="ok",
+        usage={"promptTokenCount": 2000, "candidatesTokenCount": 0, "cachedContentTokenCount": 1024},
+        model="gemini-2.0-flash",
+        start=0.0,
+    )
+
+    assert openai_style.cached_input_tokens == 64
+    spec = get_model_spec("gemini", "gemini-2.0-flash")
+    assert spec is not None
+    assert gemini.cached_input_tokens == 1024
+    assert gemini.cost_usd == pytest.approx(spec.estimate_cost(2000, 0, 1024))
+    assert gemini.cost_usd < spec.estimate_cost(2000, 0)
+
+
+@pytest.mark.asyncio
+async def test_session_sticks_to_previous_provider_until_its_breaker_opens(test_session) -> None:
+    user = User(telegram_id=9401, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+    session = ChatSession(user_id=user.id, mode="eco", affinity_provider="deepseek", affinity_model="deepseek-chat")
+    test_session.add(session)
+    await test_session.commit()
+
+    gemini = CachingProvider("gemini", "gemini-2.0-flash-lite")
+    deepseek = CachingProvider("deepseek", "deepseek-chat")
+    orchestrator = _orchestrator({"gemini": gemini, "deepseek": deepseek})
+
+    first = await orchestrator.process_chat(user, "pierwsze", session.id, None, "eco", test_session)
+    assert first["meta"]["provider"] == "deepseek" and first["meta"]["cached_input_tokens"] == 800
+
+    await circuit_breaker.force_open("deepseek")
+    second = await orchestrator.process_chat(user, "drugie", session.id, None, "eco", test_session)
+
+    assert second["meta"]["provider"] == "gemini"
+    assert (gemini.calls, deepseek.calls) == (1, 1)
+    await test_session.refresh(session)
+    assert (session.affinity_provider, session.affinity_model) == ("gemini", "gemini-2.0-flash-lite")
+
+    await ledger_buffer.flush(test_session)
+
+    ledger = await test_session.execute(select(UsageLedger).where(UsageLedger.session_id == session.id))
+    assert [row.cached_input_tokens for row in ledger.scalars().all()] == [800, 800]
+
+
+@pytest.mark.asyncio
+async def test_trimmed_history_keeps_a_stable_prefix_across_turns(test_session) -> None:
+    user = User(telegram_id=9402, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+    session = ChatSession(user_id=user.id, mode="eco")
+    test_session.add(session)
+    await test_session.commit()
+
+    orchestrator = _orchestrator({})
+    start = datetime.now(tz=UTC) - timedelta(hours=1)
+    first_messages: list[str] = []
+    for turn in range(6):
+        for offset, role in enumerate(("user", "assistant")):
+            test_session.add(
+                Message(
+                    session_id=session.id,
+                    role=role,
+                    content=f"tura {turn} " + "słowo " * 150,
+                    created_at=start + timedelta(seconds=turn * 2 + offset),
+                )
+            )
+        session.message_count += 2
+        await test_session.commit()
+        history = await orchestrator._get_history(session, "pytanie", "eco", test_session)
+        first_messages.append(history[0]["content"].split(" słowo")[0])
+
+    assert first_messages == ["tura 0", "tura 0", "tura 0", "tura 2", "tura 2", "tura 4"]
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncGenerator
+from typing import Any
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+import respx
+from httpx import ASGITransport, AsyncClient
+
+from app.api.deps import get_db
+from app.core.circuit_breaker import CLOSED, OPEN, CircuitBreaker
+from app.core.config import Settings
+from app.main import create_app
+from app.providers.base import AbstractProvider, ProviderResult
+from app.providers.deepseek import DeepSeekProvider
+from app.providers.factory import ProviderFactory
+from app.services.provider_health import ProviderHealthProber, provider_health_prober
+
+
+class ProbeProvider(AbstractProvider):
+    def __init__(self, name: str, healthy: bool = True, hang: bool = False) -> None:
+        self._name = name
+        self.healthy = healthy
+        self._hang = hang
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def generate(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> ProviderResult:
+        raise AssertionError("sonda nie powinna generować odpowiedzi")
+
+    async def health_check(self) -> bool:
+        if self._hang:
+            await asyncio.sleep(10)
+        return self.healthy
+
+
+def _factory(registry: dict[str, AbstractProvider]) -> ProviderFactory:
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = registry  # type: ignore[attr-defined]
+    return factory
+
+
+@pytest.mark.asyncio
+async def test_probe_failures_pre_open_and_success_closes_breaker() -> None:
+    breaker = CircuitBreaker()
+    prober = ProviderHealthProber(breaker=breaker, timeout_seconds=0.05, failure_threshold=2)
+    flaky = ProbeProvider("gemini", healthy=False)
+    factory = _factory({"gemini": flaky, "deepseek": ProbeProvider("deepseek", hang=True)})
+
+    await prober.probe_all(factory)
+    assert breaker.status("gemini") == CLOSED
+
+    results = await prober.probe_all(factory)
+    assert breaker.status("gemini") == OPEN
+    assert breaker.status("deepseek") == OPEN
+    assert results["gemini"]["consecutive_failures"] == 2
+    assert results["deepseek"]["error"] == "Przekroczono limit czasu sondy"
+
+    flaky.healthy = True
+    results = await prober.probe_all(factory)
+    assert results["gemini"]["ok"] is True
+    assert breaker.status("gemini") == CLOSED
+    assert breaker.status("deepseek") == OPEN
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_openai_compat_health_check_lists_models() -> None:
+    route = respx.get("https://api.deepseek.com/v1/models").mock(return_value=httpx.Response(200, json={"data": []}))
+
+    assert await DeepSeekProvider(Settings(DEEPSEEK_API_KEY="test")).health_check() is True
+    assert route.calls.last.request.headers["Authorization"] == "Bearer test"
+
+
+@pytest.mark.asyncio
+async def test_health_endpoints_expose_probe_results() -> None:
+    await provider_health_prober.probe_all(_factory({"groq": ProbeProvider("groq", healthy=False)}))
+    app = create_app()
+
+    async def override_get_db() -> AsyncGenerator[Any, None]:
+        mock_db: AsyncMock = AsyncMock()
+        yield mock_db
+
+    app.dependency_overrides[get_db] = override_get_db
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        health = await client.get("/api/v1/health")
+        providers = await client.get("/api/v1/health/providers")
+
+    assert health.json()["providers"] == {"groq": "Provider zgłosił niedostępność"}
+    assert health.json()["status"] == "degraded"
+    assert providers.json()["providers"]["groq"]["ok"] is False
+    assert providers.json()["providers"]["groq"]["consecutive_failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_probe_success_leaves_traffic_opened_breaker_to_recovery() -> None:
+    breaker = CircuitBreaker(failure_threshold=1)
+    prober = ProviderHealthProber(breaker=breaker)
+    await breaker.record_failure("gemini")
+
+    await prober.probe_all(_factory({"gemini": ProbeProvider("gemini")}))
+
+    assert breaker.status("gemini") == OPEN
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator
+from typing import Any
+from unittest.mock import AsyncMock
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.api.deps import get_db, get_orchestrator, get_provider_factory
+from app.core.config import Settings, get_settings
+from app.main import create_app
+from app.providers.factory import ProviderFactory
+
+
+@pytest.mark.asyncio
+async def test_reload_adds_and_removes_providers() -> None:
+    factory = ProviderFactory(Settings(GEMINI_API_KEY="g", DEEPSEEK_API_KEY="d"))
+    calls: list[tuple[list[str], list[str]]] = []
+
+    async def hook(added: list[str], removed: list[str]) -> None:
+        calls.append((added, removed))
+
+    factory.add_reload_hook(hook)
+    result = await factory.reload(Settings(GEMINI_API_KEY="g", GROQ_API_KEY="q"))
+
+    assert result == {"added": ["groq"], "removed": ["deepseek"], "available": ["gemini", "groq"]}
+    assert calls == [(["groq"], ["deepseek"])]
+    assert factory.get("deepseek") is None
+
+
+class _BroadcastPubSub:
+    def __init__(self, redis: _BroadcastRedis) -> None:
+        self._redis = redis
+        self._queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+
+    async def subscribe(self, channel: str) -> None:
+        self._redis.subscribers.setdefault(channel, []).append(self._queue)
+
+    async def listen(self) -> AsyncIterator[dict[str, Any]]:
+        while True:
+            yield await self._queue.get()
+
+    async def aclose(self) -> None:
+        return None
+
+
+class _BroadcastRedis:
+    def __init__(self) -> None:
+        self.subscribers: dict[str, list[asyncio.Queue[dict[str, Any]]]] = {}
+
+    async def publish(self, channel: str, message: str) -> int:
+        for queue in self.subscribers.get(channel, []):
+            queue.put_nowait({"type": "message", "data": message})
+        return len(self.subscribers.get(channel, []))
+
+    def pubsub(self) -> _BroadcastPubSub:
+        return _BroadcastPubSub(self)
+
+
+@pytest.mark.asyncio
+async def test_reload_is_broadcast_to_other_workers(monkeypatch: pytest.MonkeyPatch) -> None:
+    redis = _BroadcastRedis()
+    workers = [ProviderFactory(Settings(GEMINI_API_KEY="g")) for _ in range(2)]
+    reloads: list[list[str]] = []
+
+    async def hook(added: list[str], removed: list[str]) -> None:
+        reloads.append(added)
+
+    workers[0].add_reload_hook(hook)
+    for worker in workers:
+        worker.bind(redis)  # type: ignore[arg-type]
+        await worker.start()
+    await asyncio.sleep(0)
+    monkeypatch.setenv("GEMINI_API_KEY", "g")
+    monkeypatch.setenv("GROQ_API_KEY", "q")
+    try:
+        await workers[1].reload(Settings(GEMINI_API_KEY="g", GROQ_API_KEY="q"), broadcast=True)
+        await asyncio.sleep(0.01)
+    finally:
+        for worker in workers:
+            await worker.stop()
+        get_settings.cache_clear()
+
+    assert workers[0].get("groq") is not None
+    assert reloads == [["groq"]]
+
+
+@pytest.mark.asyncio
+async def test_orchestrator_is_built_once_per_app() -> None:
+    app = create_app()
+
+    async def override_get_db() -> AsyncGenerator[Any, None]:
+        yield AsyncMock()
+
+    app.dependency_overrides[get_db] = override_get_db
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        first = await client.get("/api/v1/chat/providers")
+        second = await client.get("/api/v1/chat/providers")
+
+    assert first.status_code == 200
+    assert second.json() == first.json()
+    factory = app.state.provider_factory
+
+    class _Request:
+        def __init__(self) -> None:
+            self.app = app
+
+    request = _Request()
+    orchestrator = get_orchestrator(request, get_provider_factory(request))  # type: ignore[arg-type]
+    assert get_orchestrator(request, factory) is orchestrator  # type: ignore[arg-type]
+    assert get_provider_factory(request) is factory  # type: ignore[arg-type]
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import random
+
+import httpx
+import pytest
+import respx
+
+from app.core.config import Settings
+from app.core.exceptions import ProviderError
+from app.providers import gemini as gemini_module
+from app.providers import openai_compat
+from app.providers.deepseek import DeepSeekProvider
+from app.providers.gemini import GeminiProvider
+from app.providers.retry import RetryPolicy, deadline_scope, parse_retry_after
+
+DEEPSEEK_URL = "https://api.deepseek.com/v1/chat/completions"
+OK_RESPONSE = {
+    "choices": [{"message": {"content": "OK"}}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1},
+}
+
+
+def _policy(monkeypatch: pytest.MonkeyPatch, sleeps: list[float], **kwargs: float) -> RetryPolicy:
+    async def fake_sleep(delay: float) -> None:
+        sleeps.append(delay)
+
+    policy = RetryPolicy(sleep=fake_sleep, rng=random.Random(7), **kwargs)  # type: ignore[arg-type]
+    monkeypatch.setattr(openai_compat, "provider_retry_policy", policy)
+    monkeypatch.setattr(gemini_module, "provider_retry_policy", policy)
+    return policy
+
+
+async def _generate(provider: DeepSeekProvider | GeminiProvider) -> str:
+    result = await provider.generate(
+        messages=[{"role": "user", "content": "Test"}],
+        profile="eco",
+        max_tokens=16,
+        temperature=0.1,
+    )
+    return result.text
+
+
+def test_parse_retry_after_variants() -> None:
+    assert parse_retry_after(httpx.Headers({"Retry-After": "3"})) == 3.0
+    assert parse_retry_after(httpx.Headers({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert parse_retry_after(httpx.Headers({"x-ratelimit-reset-requests": "1m30s"})) == 90.0
+    assert parse_retry_after(httpx.Headers({"x-ratelimit-reset-tokens": "250ms"})) == 0.25
+    assert parse_retry_after(httpx.Headers({"x-ratelimit-reset-tokens": "soon"})) is None
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_retry_honours_retry_after(monkeypatch: pytest.MonkeyPatch) -> None:
+    sleeps: list[float] = []
+    policy = _policy(monkeypatch, sleeps, base_delay=0.1)
+    route = respx.post(DEEPSEEK_URL)
+    route.side_effect = [
+        httpx.Response(429, headers={"Retry-After": "2"}),
+        httpx.Response(200, json=OK_RESPONSE),
+    ]
+
+    assert await _generate(DeepSeekProvider(Settings(DEEPSEEK_API_KEY="test"))) == "OK"
+
+    assert route.call_count == 2
+    assert 2.0 <= sleeps[0] <= 2.1
+    stats = policy.stats()["deepseek"]
+    assert stats["attempts"] == {"429": 1, "200": 1}
+    assert stats["outcomes"] == {"retried": 1, "success": 1}
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_retry_after_beyond_cap_fails_over(monkeypatch: pytest.MonkeyPatch) -> None:
+    sleeps: list[float] = []
+    _policy(monkeypatch, sleeps, max_delay=5.0)
+    route = respx.post(DEEPSEEK_URL).mock(return_value=httpx.Response(429, headers={"Retry-After": "60"}))
+
+    with pytest.raises(ProviderError):
+        await _generate(DeepSeekProvider(Settings(DEEPSEEK_API_KEY="test")))
+
+    assert route.call_count == 1
+    assert sleeps == []
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_retry_budget_stops_retry_storm(monkeypatch: pytest.MonkeyPatch) -> None:
+    sleeps: list[float] = []
+    policy = _policy(monkeypatch, sleeps, max_attempts=5, budget_ratio=0.0, budget_capacity=2.0)
+    route = respx.post(DEEPSEEK_URL).mock(return_value=httpx.Response(503))
+    provider = DeepSeekProvider(Settings(DEEPSEEK_API_KEY="test"))
+
+    for _ in range(3):
+        with pytest.raises(ProviderError):
+            await _generate(provider)
+
+    assert route.call_count == 5
+    assert len(sleeps) == 2
+    assert policy.stats()["deepseek"]["outcomes"]["budget_exhausted"] == 3
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_retry_respects_request_deadline(monkeypatch: pytest.MonkeyPatch) -> None:
+    sleeps: list[float] = []
+    policy = _policy(monkeypatch, sleeps)
+    route = respx.post(DEEPSEEK_URL).mock(return_value=httpx.Response(429, headers={"Retry-After": "1"}))
+
+    with deadline_scope(0.5), pytest.raises(ProviderError):
+        await _generate(DeepSeekProvider(Settings(DEEPSEEK_API_KEY="test")))
+
+    assert route.call_count == 1
+    assert policy.stats()["deepseek"]["outcomes"]["deadline"] == 1
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_request_deadline_bounds_each_attempt(monkeypatch: pytest.MonkeyPatch) -> None:
+    sleeps: list[float] = []
+    policy = _policy(monkeypatch, sleeps)
+
+    async def hang(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(5)
+        return httpx.Response(200, json=OK_RESPONSE)
+
+    respx.post(DEEPSEEK_URL).mock(side_effect=hang)
+
+    with deadline_scope(0.05), pytest.raises(ProviderError, match="limit czasu"):
+        await _generate(DeepSeekProvider(Settings(DEEPSEEK_API_KEY="test")))
+
+    stats = policy.stats()["deepseek"]
+    assert stats["attempts"] == {"timeout": 1}
+    assert stats["outcomes"] == {"deadline": 1}
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_gemini_retries_server_errors(monkeypatch: pytest.MonkeyPatch) -> None:
+    sleeps: list[float] = []
+    _policy(monkeypatch, sleeps)
+    route = respx.post("https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-lite:generateContent")
+    route.side_effect = [
+        httpx.Response(503),
+        httpx.Response(
+            200,
+            json={
+                "candidates": [{"content": {"parts": [{"text": "Gemini OK"}]}}],
+                "usageMetadata": {"promptTokenCount": 1, "candidatesTokenCount": 2},
+            },
+        ),
+    ]
+
+    assert await _generate(GeminiProvider(Settings(GEMINI_API_KEY="test"))) == "Gemini OK"
+    assert route.call_count == 2
+    assert 0.0 <= sleeps[0] <= 0.25
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_gemini_maps_malformed_json_to_provider_error() -> None:
+    respx.post("https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-lite:generateContent").mock(
+        return_value=httpx.Response(200, content=b"<html>bramka</html>")
+    )
+
+    with pytest.raises(ProviderError):
+        await _generate(GeminiProvider(Settings(GEMINI_API_KEY="test")))
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from app.db.models import User, UserRole
+from app.services.policy_engine import PolicyEngine
+from app.services.provider_scoreboard import ProviderScoreboard
+
+
+class _FakePipeline:
+    def __init__(self, data: dict[str, Any]) -> None:
+        self._data = data
+        self._commands: list[tuple[str, str]] = []
+
+    def hgetall(self, key: str) -> None:
+        self._commands.append(("hgetall", key))
+
+    def lrange(self, key: str, start: int, end: int) -> None:
+        _ = (start, end)
+        self._commands.append(("lrange", key))
+
+    async def execute(self) -> list[Any]:
+        return [self._data.get(key, {} if kind == "hgetall" else []) for kind, key in self._commands]
+
+
+class _FakeRedis:
+    def __init__(self, data: dict[str, Any]) -> None:
+        self._data = data
+
+    def register_script(self, script: str) -> Any:
+        async def run(keys: list[str], args: list[Any]) -> int:
+            _ = (script, keys, args)
+            return 1
+
+        return run
+
+    def pipeline(self, transaction: bool = True) -> _FakePipeline:
+        _ = transaction
+        return _FakePipeline(self._data)
+
+
+@pytest.mark.asyncio
+async def test_rank_keeps_default_order_without_samples() -> None:
+    scoreboard = ProviderScoreboard(min_samples=3)
+    await scoreboard.record_success("deepseek", "eco", 100)
+
+    assert await scoreboard.rank(["gemini", "deepseek", "groq"], "eco") == ["gemini", "deepseek", "groq"]
+
+
+@pytest.mark.asyncio
+async def test_rank_prefers_fast_and_healthy_providers() -> None:
+    scoreboard = ProviderScoreboard(min_samples=3, refresh_seconds=0.0)
+    for _ in range(5):
+        await scoreboard.record_success("gemini", "eco", 4000)
+        await scoreboard.record_success("deepseek", "eco", 800)
+        await scoreboard.record_success("groq", "eco", 300)
+    for _ in range(5):
+        await scoreboard.record_failure("groq", "eco")
+
+    assert await scoreboard.rank(["gemini", "deepseek", "groq"], "eco") == ["deepseek", "groq", "gemini"]
+
+
+@pytest.mark.asyncio
+async def test_rank_reads_shared_stats_from_redis() -> None:
+    redis = _FakeRedis(
+        {
+            "provider_stats:gemini:smart:stats": {"ewma_ms": "2500", "error_rate": "0.0", "samples": "50"},
+            "provider_stats:gemini:smart:latency": ["2400", "2600"],
+            "provider_stats:deepseek:smart:stats": {"ewma_ms": "900", "error_rate": "0.1", "samples": "50"},
+            "provider_stats:deepseek:smart:latency": ["850", "950"],
+        }
+    )
+    scoreboard = ProviderScoreboard(min_samples=3)
+    scoreboard.bind(redis)  # type: ignore[arg-type]
+
+    assert await scoreboard.rank(["gemini", "deepseek", "groq"], "smart") == ["deepseek", "groq", "gemini"]
+
+
+@pytest.mark.asyncio
+async def test_ranking_stays_within_allowed_providers() -> None:
+    user = User(telegram_id=7101, role=UserRole.DEMO, authorized=True, subscription_tier="free")
+    chain = PolicyEngine().get_provider_chain(user=user, profile="eco")
+    scoreboard = ProviderScoreboard(min_samples=1, refresh_seconds=0.0)
+    await scoreboard.record_success("anthropic", "eco", 1)
+
+    ranked = await scoreboard.rank(chain, "eco")
+
+    assert sorted(ranked) == sorted(chain)
+    assert "anthropic" not in ranked
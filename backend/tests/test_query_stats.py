@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import logging
+
+import httpx
+import respx
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select
+
+from app.api.deps import get_orchestrator
+from app.core.config import Settings, get_settings
+from app.core.metrics import metrics_registry
+from app.db.models import User, UserRole
+from app.db.query_stats import QueryStats, count_queries, query_profiler
+from app.main import create_app
+from app.providers.deepseek import DeepSeekProvider
+from app.providers.factory import ProviderFactory
+from app.providers.http_pool import provider_http_pool
+from app.services.orchestrator import Orchestrator
+from app.services.policy_engine import PolicyEngine
+from app.services.session_summarizer import SessionSummarizer
+from app.services.usage_service import UsageService
+
+QUERY_BUDGETS = {
+    ("GET", "/api/v1/auth/me"): 2,
+    ("GET", "/api/v1/usage/limits"): 2,
+    ("POST", "/api/v1/chat/"): 7,
+}
+
+
+def _orchestrator() -> Orchestrator:
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = {"deepseek": DeepSeekProvider(Settings(DEEPSEEK_API_KEY="test"))}  # type: ignore[attr-defined]
+    return Orchestrator(PolicyEngine(), factory, UsageService(), summarizer=SessionSummarizer(enabled=False))
+
+
+async def test_count_queries_flags_repeated_statements(test_session) -> None:
+    users = [User(telegram_id=7300 + index, role=UserRole.DEMO) for index in range(3)]
+    test_session.add_all(users)
+    await test_session.commit()
+
+    with count_queries() as outer:
+        for user in users:
+            await test_session.execute(select(User).where(User.id == user.id))
+        with count_queries() as inner:
+            await test_session.execute(select(User).where(User.id == users[0].id))
+
+    assert inner.statements == 1
+    assert outer.statements == 4
+    assert outer.duplicates == 1
+    [(sql, count)] = outer.repeated(3)
+    assert count == 4
+    assert sql.startswith("SELECT")
+
+
+def test_repeated_statements_are_logged_and_counted(caplog) -> None:
+    stats = QueryStats(statements=3, round_trips=3)
+    stats.by_sql["SELECT 1"] = 3
+    stats.by_call[("SELECT 1", "()")] = 3
+
+    with caplog.at_level(logging.WARNING, logger="app.db.query_stats"):
+        query_profiler.report(stats, "GET", "/x")
+
+    assert "możliwe N+1" in caplog.text
+    registry = metrics_registry.registry
+    for kind, expected in (("identical", 2.0), ("n_plus_one", 3.0)):
+        assert (
+            registry.get_sample_value("jarvis_db_repeated_statements_total", {"route": "/x", "kind": kind}) == expected
+        )
+
+
+@respx.mock
+async def test_endpoints_stay_within_query_budgets(test_engine, monkeypatch) -> None:
+    monkeypatch.setattr(query_profiler, "headers", True)
+    respx.post("https://api.deepseek.com/v1/chat/completions").mock(
+        return_value=httpx.Response(
+            200,
+            json={
+                "choices": [{"message": {"content": "Cześć"}}],
+                "usage": {"prompt_tokens": 9, "completion_tokens": 2},
+            },
+        )
+    )
+    app = create_app()
+    app.dependency_overrides[get_orchestrator] = _orchestrator
+    measured: dict[tuple[str, str], int] = {}
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            register = await client.post("/api/v1/auth/register", json={"telegram_chat_id": 737373})
+            await client.post(
+                "/api/v1/auth/unlock",
+                json={"telegram_chat_id": 737373, "code": get_settings().DEMO_UNLOCK_CODE},
+            )
+            headers = {"Authorization": f"Bearer {register.json()['access_token']}"}
+            for method, path in QUERY_BUDGETS:
+                body = {"prompt": "Hej", "provider": "deepseek", "mode": "eco"} if method == "POST" else None
+                response = await client.request(method, path, json=body, headers=headers)
+                assert response.status_code == 200, response.text
+                assert "db;dur=" in response.headers["server-timing"]
+                measured[(method, path)] = int(response.headers["x-db-queries"])
+    finally:
+        await provider_http_pool.close_client("deepseek")
+
+    over = {endpoint: count for endpoint, count in measured.items() if count > QUERY_BUDGETS[endpoint]}
+    assert not over, f"Przekroczony budżet zapytań SQL: {over}"
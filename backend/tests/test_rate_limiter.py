@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+import httpx
+import pytest
+import respx
+
+from app.core.config import Settings
+from app.db.models import User, UserRole
+from app.providers.base import AbstractProvider, ProviderResult
+from app.providers.factory import ProviderFactory
+from app.providers.groq import GroqProvider
+from app.providers.rate_limiter import ProviderRateLimiter, estimate_request_tokens, provider_rate_limiter
+from app.services.orchestrator import Orchestrator
+from app.services.policy_engine import PolicyEngine
+from app.services.usage_service import UsageService
+
+
+class CountingProvider(AbstractProvider):
+    def __init__(self, name: str, has_capacity: bool = True) -> None:
+        self._name = name
+        self._has_capacity = has_capacity
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def acquire_capacity(self, messages: list[dict[str, str]], profile: str, max_tokens: int) -> bool:
+        return self._has_capacity
+
+    async def generate(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> ProviderResult:
+        self.calls += 1
+        return ProviderResult(
+            text=f"Odpowiedź z {self._name}",
+            provider=self._name,
+            model=f"{self._name}-model",
+            input_tokens=3,
+            output_tokens=3,
+            cost_usd=0.0,
+            latency_ms=5,
+        )
+
+    async def health_check(self) -> bool:
+        return True
+
+
+class _FakeRedis:
+    def register_script(self, script: str) -> Any:
+        async def _run(keys: list[str], args: list[Any]) -> int:
+            raise ConnectionError("redis down")
+
+        return _run
+
+
+@pytest.mark.asyncio
+async def test_request_bucket_empties_and_model_limits_are_separate() -> None:
+    limiter = ProviderRateLimiter()
+    limits = {"fast": (2, None), "slow": (1, None)}
+
+    assert await limiter.acquire("groq", "fast", limits, tokens=10)
+    assert await limiter.acquire("groq", "fast", limits, tokens=10)
+    assert not await limiter.acquire("groq", "fast", limits, tokens=10)
+    assert await limiter.acquire("groq", "slow", limits, tokens=10)
+    assert await limiter.acquire("groq", "unlimited", limits, tokens=10)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_checks_all_scopes_atomically() -> None:
+    limiter = ProviderRateLimiter()
+    limits = {"*": (None, 1000), "model": (10, 600)}
+
+    assert await limiter.acquire("groq", "model", limits, tokens=500)
+    assert not await limiter.acquire("groq", "model", limits, tokens=500)
+    assert await limiter.acquire("groq", "other", limits, tokens=500)
+    assert not await limiter.acquire("groq", "other", limits, tokens=1)
+
+
+@pytest.mark.asyncio
+async def test_limiter_falls_back_to_local_buckets_when_redis_fails() -> None:
+    limiter = ProviderRateLimiter()
+    limiter.bind(_FakeRedis())  # type: ignore[arg-type]
+
+    assert await limiter.acquire("groq", "m", {"m": (1, None)}, tokens=1)
+    assert not await limiter.acquire("groq", "m", {"m": (1, None)}, tokens=1)
+
+
+@pytest.mark.asyncio
+async def test_groq_declares_limits_next_to_models() -> None:
+    provider = GroqProvider(Settings(GROQ_API_KEY="test"))
+    messages = [{"role": "user", "content": "x" * 400}]
+
+    assert estimate_request_tokens(messages, max_tokens=1200, provider="groq") == 1310
+    for _ in range(9):
+        assert await provider.acquire_capacity(messages, profile="eco", max_tokens=1200)
+    assert not await provider.acquire_capacity(messages, profile="eco", max_tokens=1200)
+
+
+@pytest.mark.asyncio
+async def test_fallback_chain_skips_provider_without_capacity(test_session) -> None:
+    user = User(telegram_id=7101, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+
+    limited = CountingProvider("gemini", has_capacity=False)
+    backup = CountingProvider("deepseek")
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = {"gemini": limited, "deepseek": backup}  # type: ignore[attr-defined]
+    orchestrator = Orchestrator(PolicyEngine(), factory, UsageService())
+
+    response = await orchestrator.process_chat(
+        user=user,
+        prompt="Wyjaśnij pojęcie",
+        session_id=None,
+        provider_pref=None,
+        mode="eco",
+        db=test_session,
+    )
+
+    assert response["meta"]["provider"] == "deepseek"
+    assert response["meta"]["fallback_used"] is True
+    assert limited.calls == 0
+    assert backup.calls == 1
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_fallback_models_take_their_own_capacity() -> None:
+    models: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        model = json.loads(request.content)["model"]
+        models.append(model)
+        if model == "llama-3.3-70b-versatile":
+            return httpx.Response(400)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}], "usage": {}})
+
+    respx.post("https://api.groq.com/openai/v1/chat/completions").mock(side_effect=handler)
+    provider = GroqProvider(Settings(GROQ_API_KEY="test"))
+    messages = [{"role": "user", "content": "Test"}]
+    assert await provider_rate_limiter.acquire("groq", "mixtral-8x7b-32768", {"mixtral-8x7b-32768": (30, 5_000)}, 5_000)
+
+    assert await provider.acquire_capacity(messages, profile="eco", max_tokens=32)
+    result = await provider.generate(messages, profile="eco", max_tokens=32, temperature=0.1)
+
+    assert result.model == "gemma2-9b-it"
+    assert models == ["llama-3.3-70b-versatile", "gemma2-9b-it"]
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from sqlalchemy import select
+
+from app.db.models import UsageLedger, User, UserRole
+from app.providers.base import AbstractProvider, ProviderResult
+from app.providers.factory import ProviderFactory
+from app.services.orchestrator import Orchestrator
+from app.services.policy_engine import PolicyEngine
+from app.services.response_cache import ResponseCache, cache_key
+from app.services.usage_ledger import ledger_buffer
+from app.services.usage_service import UsageService
+
+MESSAGES = [{"role": "user", "content": "co to jest kot"}]
+
+
+class CountingProvider(AbstractProvider):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return "gemini"
+
+    def resolve_model(self, profile: str) -> str:
+        return "gemini-2.0-flash-lite"
+
+    async def generate(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> ProviderResult:
+        self.calls += 1
+        return ProviderResult(
+            text="Kot to zwierzę.",
+            provider="gemini",
+            model="gemini-2.0-flash-lite",
+            input_tokens=12,
+            output_tokens=4,
+            cost_usd=0.0002,
+            latency_ms=300,
+        )
+
+    async def health_check(self) -> bool:
+        return True
+
+
+class _FakeRedis:
+    def __init__(self) -> None:
+        self.values: dict[str, str] = {}
+        self.script_calls: list[tuple[list[str], list[Any]]] = []
+
+    def register_script(self, script: str) -> Any:
+        async def _run(keys: list[str], args: list[Any]) -> int:
+            self.script_calls.append((keys, args))
+            self.values[keys[0]] = args[0]
+            return 1
+
+        return _run
+
+    async def mget(self, keys: list[str]) -> list[str | None]:
+        return [self.values.get(key) for key in keys]
+
+
+def _result() -> ProviderResult:
+    return ProviderResult(
+        text="odpowiedź",
+        provider="gemini",
+        model="gemini-2.0-flash-lite",
+        input_tokens=1,
+        output_tokens=1,
+        cost_usd=0.1,
+        latency_ms=10,
+    )
+
+
+def test_cache_key_is_canonical() -> None:
+    base = cache_key("Gemini", "m", [{"content": "x", "role": "user"}], 0.70001, 100)
+
+    assert base == cache_key("gemini", "m", [{"role": "user", "content": "x", "extra": "y"}], 0.7, 100)
+    assert base != cache_key("gemini", "m", [{"role": "user", "content": "x"}], 0.2, 100)
+    assert base != cache_key("gemini", "m", [{"role": "user", "content": "x"}], 0.7, 200)
+
+
+@pytest.mark.asyncio
+async def test_cache_respects_profiles_temperature_and_size() -> None:
+    cache = ResponseCache(enabled=True, profiles={"eco"}, max_temperature=0.5, max_entries=1)
+    candidates = [("gemini", "gemini-2.0-flash-lite")]
+
+    await cache.store(_result(), "eco", MESSAGES, 0.7, 100)
+    await cache.store(_result(), "smart", MESSAGES, 0.2, 100)
+    assert await cache.lookup(candidates, "eco", MESSAGES, 0.7, 100) is None
+    assert await cache.lookup(candidates, "smart", MESSAGES, 0.2, 100) is None
+
+    await cache.store(_result(), "eco", MESSAGES, 0.2, 100)
+    hit = await cache.lookup(candidates, "eco", MESSAGES, 0.2, 100)
+    assert hit is not None and hit.cache_hit is True and hit.cost_usd == 0.0
+
+    await cache.store(_result(), "eco", [{"role": "user", "content": "inne"}], 0.2, 100)
+    assert await cache.lookup(candidates, "eco", MESSAGES, 0.2, 100) is None
+
+
+@pytest.mark.asyncio
+async def test_local_cache_evicts_least_recently_read_entry() -> None:
+    cache = ResponseCache(enabled=True, max_entries=2)
+    candidates = [("gemini", "gemini-2.0-flash-lite")]
+    prompts = [[{"role": "user", "content": f"pytanie {index}"}] for index in range(3)]
+
+    await cache.store(_result(), "eco", prompts[0], 0.2, 100)
+    await cache.store(_result(), "eco", prompts[1], 0.2, 100)
+    assert await cache.lookup(candidates, "eco", prompts[0], 0.2, 100) is not None
+    await cache.store(_result(), "eco", prompts[2], 0.2, 100)
+
+    assert await cache.lookup(candidates, "eco", prompts[0], 0.2, 100) is not None
+    assert await cache.lookup(candidates, "eco", prompts[1], 0.2, 100) is None
+
+
+@pytest.mark.asyncio
+async def test_cache_uses_redis_with_bounded_index() -> None:
+    redis = _FakeRedis()
+    cache = ResponseCache(enabled=True, ttl_seconds=60, max_entries=5)
+    cache.bind(redis)  # type: ignore[arg-type]
+
+    await cache.store(_result(), "eco", MESSAGES, 0.7, 100)
+    hit = await cache.lookup(
+        [("deepseek", "deepseek-chat"), ("gemini", "gemini-2.0-flash-lite")], "eco", MESSAGES, 0.7, 100
+    )
+
+    keys, args = redis.script_calls[0]
+    assert keys[1] == "response_cache:v1:index"
+    assert args[1] == 60 and args[3] == 5
+    assert hit is not None and hit.provider == "gemini"
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_writes_zero_cost_ledger_row(test_session) -> None:
+    user = User(telegram_id=8101, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+
+    provider = CountingProvider()
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = {"gemini": provider}  # type: ignore[attr-defined]
+    orchestrator = Orchestrator(PolicyEngine(), factory, UsageService(), cache=ResponseCache(enabled=True))
+
+    responses = [
+        await orchestrator.process_chat(
+            user=user,
+            prompt="co to jest kot",
+            session_id=None,
+            provider_pref="gemini",
+            mode="eco",
+            db=test_session,
+        )
+        for _ in range(2)
+    ]
+
+    assert provider.calls == 1
+    assert responses[1]["response"] == responses[0]["response"]
+    assert responses[1]["meta"]["cache_hit"] is True
+    assert responses[1]["meta"]["cost_usd"] == 0.0
+
+    await ledger_buffer.flush(test_session)
+
+    ledger = await test_session.execute(select(UsageLedger).where(UsageLedger.user_id == user.id))
+    rows = ledger.scalars().all()
+    assert sorted((row.cache_hit, float(row.cost_usd)) for row in rows) == [(False, 0.0002), (True, 0.0)]
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import uuid
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select
+
+from app.db.models import UsageLedger, User, UserRole
+from app.providers.base import AbstractProvider, ProviderResult
+from app.providers.factory import ProviderFactory
+from app.services.orchestrator import Orchestrator
+from app.services.policy_engine import PolicyEngine
+from app.services.semantic_cache import HashingEmbedder, SemanticCache
+from app.services.usage_ledger import ledger_buffer
+from app.services.usage_service import UsageService
+
+
+class ScriptedProvider(AbstractProvider):
+    def __init__(self, replies: list[str]) -> None:
+        self._replies = replies
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return "gemini"
+
+    async def generate(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> ProviderResult:
+        reply = self._replies[min(self.calls, len(self._replies) - 1)]
+        self.calls += 1
+        return ProviderResult(
+            text=reply,
+            provider="gemini",
+            model="gemini-2.0-flash-lite",
+            input_tokens=8,
+            output_tokens=6,
+            cost_usd=0.0003,
+            latency_ms=250,
+        )
+
+    async def health_check(self) -> bool:
+        return True
+
+
+def _result(text: str = "Fotosynteza to proces wytwarzania glukozy.") -> ProviderResult:
+    return ProviderResult(
+        text=text,
+        provider="gemini",
+        model="gemini-2.0-flash-lite",
+        input_tokens=5,
+        output_tokens=7,
+        cost_usd=0.001,
+        latency_ms=100,
+    )
+
+
+def test_embedder_ignores_case_punctuation_and_word_order() -> None:
+    embedder = HashingEmbedder(dim=512)
+    base = embedder.embed("Co to jest fotosynteza?")
+
+    assert float(base @ embedder.embed("fotosynteza, co to jest")) == pytest.approx(1.0, abs=1e-5)
+    assert float(base @ embedder.embed("Jak działa silnik odrzutowy")) < 0.5
+
+
+def test_lookup_respects_threshold_scope_and_counters() -> None:
+    cache = SemanticCache(enabled=True, threshold=0.9, max_entries=10, dim=512)
+    cache.store("Co to jest fotosynteza?", "eco", "", _result())
+
+    hit = cache.lookup("co to jest FOTOSYNTEZA", "eco", "")
+    assert hit is not None and hit.result.cache_hit is True and hit.result.cost_usd == 0.0
+    assert cache.lookup("co to jest fotosynteza", "eco", "deepseek") is None
+    assert cache.lookup("co to jest fotosynteza", "smart", "") is None
+    assert cache.lookup("Jak działa silnik odrzutowy", "eco", "") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 3, 1)
+
+
+def test_verification_counts_false_positive_and_evicts() -> None:
+    cache = SemanticCache(enabled=True, threshold=0.9, dim=512)
+    cache.store("Co to jest fotosynteza?", "eco", "", _result())
+    hit = cache.lookup("co to jest fotosynteza", "eco", "")
+    assert hit is not None
+
+    assert cache.verify(hit, _result("Zupełnie inna odpowiedź o silnikach rakietowych.")) is False
+    assert cache.stats()["false_positives"] == 1
+    assert cache.lookup("co to jest fotosynteza", "eco", "") is None
+
+
+def test_verification_keeps_entry_that_replaced_the_hit_slot() -> None:
+    cache = SemanticCache(enabled=True, threshold=0.9, max_entries=1, dim=512)
+    cache.store("Co to jest fotosynteza?", "eco", "", _result())
+    hit = cache.lookup("co to jest fotosynteza", "eco", "")
+    assert hit is not None
+    cache.store("Jak działa silnik rakietowy?", "eco", "", _result("Silnik wyrzuca gazy spalinowe."))
+
+    assert cache.verify(hit, _result("Zupełnie inna odpowiedź o silnikach rakietowych.")) is False
+    replacement = cache.lookup("jak działa silnik rakietowy", "eco", "")
+    assert replacement is not None
+    assert replacement.result.text == "Silnik wyrzuca gazy spalinowe."
+
+
+@pytest.mark.asyncio
+async def test_snapshot_round_trip(tmp_path: Path) -> None:
+    path = tmp_path / "semantic.npz"
+    cache = SemanticCache(enabled=True, max_entries=4, dim=256, snapshot_path=str(path))
+    cache.store("Co to jest fotosynteza?", "eco", "", _result())
+    await cache.snapshot()
+
+    restored = SemanticCache(enabled=True, max_entries=4, dim=256, snapshot_path=str(path))
+    restored.load()
+
+    hit = restored.lookup("fotosynteza co to jest", "eco", "")
+    assert hit is not None
+    assert hit.result.text == "Fotosynteza to proces wytwarzania glukozy."
+
+
+@pytest.mark.asyncio
+async def test_only_one_worker_writes_the_shared_snapshot(tmp_path: Path) -> None:
+    path = tmp_path / "semantic.npz"
+    writer = SemanticCache(enabled=True, max_entries=4, dim=256, snapshot_path=str(path))
+    other = SemanticCache(enabled=True, max_entries=4, dim=256, snapshot_path=str(path))
+    writer.store("Co to jest fotosynteza?", "eco", "", _result())
+    other.store("Jak działa silnik?", "eco", "", _result("Silnik spala paliwo."))
+
+    await writer.snapshot()
+    await other.snapshot()
+
+    restored = SemanticCache(enabled=True, max_entries=4, dim=256, snapshot_path=str(path))
+    restored.load()
+    assert restored.lookup("fotosynteza co to jest", "eco", "") is not None
+    assert restored.lookup("jak działa silnik", "eco", "") is None
+    assert other._dirty is True
+
+
+@pytest.mark.asyncio
+async def test_process_chat_reuses_answer_for_near_duplicate_prompt(test_session) -> None:
+    user = User(telegram_id=8201, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+
+    provider = ScriptedProvider(["Fotosynteza to proces w roślinach."])
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = {"gemini": provider}  # type: ignore[attr-defined]
+    cache = SemanticCache(enabled=True, threshold=0.9, dim=512)
+    orchestrator = Orchestrator(PolicyEngine(), factory, UsageService(), semantic=cache)
+
+    first = await orchestrator.process_chat(
+        user=user,
+        prompt="Co to jest fotosynteza?",
+        session_id=None,
+        provider_pref=None,
+        mode="eco",
+        db=test_session,
+    )
+    second = await orchestrator.process_chat(
+        user=user,
+        prompt="co to jest fotosynteza",
+        session_id=None,
+        provider_pref=None,
+        mode="eco",
+        db=test_session,
+    )
+    follow_up = await orchestrator.process_chat(
+        user=user,
+        prompt="co to jest fotosynteza",
+        session_id=uuid.UUID(second["session_id"]),
+        provider_pref=None,
+        mode="eco",
+        db=test_session,
+    )
+
+    assert provider.calls == 2
+    assert second["response"] == first["response"]
+    assert second["meta"]["cache_hit"] is True
+    assert follow_up["meta"]["cache_hit"] is False
+
+    await ledger_buffer.flush(test_session)
+
+    ledger = await test_session.execute(select(UsageLedger).where(UsageLedger.user_id == user.id))
+    assert sorted(row.cache_hit for row in ledger.scalars().all()) == [False, False, True]
+
+
+@pytest.mark.asyncio
+async def test_answers_are_not_shared_across_provider_tiers(test_session) -> None:
+    paid = User(telegram_id=8202, role=UserRole.FULL_ACCESS, authorized=True, subscription_tier="pro")
+    demo = User(telegram_id=8203, role=UserRole.DEMO, authorized=True)
+    test_session.add_all([paid, demo])
+    await test_session.commit()
+
+    provider = ScriptedProvider(["Odpowiedź dla pro.", "Odpowiedź dla demo."])
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = {"gemini": provider}  # type: ignore[attr-defined]
+    orchestrator = Orchestrator(
+        PolicyEngine(), factory, UsageService(), semantic=SemanticCache(enabled=True, threshold=0.9, dim=512)
+    )
+
+    for user in (paid, demo):
+        result = await orchestrator.process_chat(
+            user=user,
+            prompt="Co to jest fotosynteza?",
+            session_id=None,
+            provider_pref=None,
+            mode="eco",
+            db=test_session,
+        )
+        assert result["meta"]["cache_hit"] is False
+    assert provider.calls == 2
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import Settings
+from app.db.models import ChatSession, Message, UsageLedger, User, UserRole
+from app.providers.base import AbstractProvider, ProviderResult
+from app.providers.factory import ProviderFactory
+from app.providers.gemini import GeminiProvider
+from app.services.orchestrator import Orchestrator
+from app.services.policy_engine import PolicyEngine
+from app.services.session_summarizer import SUMMARY_PREFIX, SessionSummarizer
+from app.services.usage_ledger import ledger_buffer
+from app.services.usage_service import UsageService
+
+
+class SummaryProvider(AbstractProvider):
+    def __init__(self) -> None:
+        self.seen: list[list[dict[str, str]]] = []
+
+    @property
+    def name(self) -> str:
+        return "gemini"
+
+    async def generate(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> ProviderResult:
+        self.seen.append(messages)
+        return ProviderResult(
+            text="Użytkownik planuje podróż do Krakowa.",
+            provider="gemini",
+            model="gemini-2.0-flash-lite",
+            input_tokens=400,
+            output_tokens=20,
+            cost_usd=0.0001,
+            latency_ms=30,
+        )
+
+    async def health_check(self) -> bool:
+        return True
+
+
+def _orchestrator(provider: AbstractProvider, summarizer: SessionSummarizer) -> Orchestrator:
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = {"gemini": provider}  # type: ignore[attr-defined]
+    return Orchestrator(PolicyEngine(), factory, UsageService(), summarizer=summarizer)
+
+
+async def _session_with_messages(test_session, telegram_id: int, count: int) -> tuple[User, ChatSession]:
+    user = User(telegram_id=telegram_id, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+    session = ChatSession(user_id=user.id, mode="eco", message_count=count)
+    test_session.add(session)
+    await test_session.commit()
+
+    start = datetime.now(tz=UTC) - timedelta(hours=1)
+    for index in range(count):
+        test_session.add(
+            Message(
+                session_id=session.id,
+                role="user" if index % 2 == 0 else "assistant",
+                content=f"wiadomość {index} " + "kontekst " * 40,
+                created_at=start + timedelta(seconds=index),
+            )
+        )
+    await test_session.commit()
+    return user, session
+
+
+@pytest.mark.asyncio
+async def test_older_turns_are_folded_into_snapshot(test_session) -> None:
+    _, session = await _session_with_messages(test_session, 9301, 10)
+    provider = SummaryProvider()
+    summarizer = SessionSummarizer(trigger_tokens=100, keep_recent_messages=4)
+
+    assert await summarizer.summarize(session.id, _orchestrator(provider, summarizer), test_session) is True
+
+    await test_session.refresh(session)
+    prompt = provider.seen[0][0]["content"]
+    assert "wiadomość 0" in prompt and "wiadomość 5" in prompt and "wiadomość 6" not in prompt
+    assert session.snapshot_text == "Użytkownik planuje podróż do Krakowa."
+    rows = (await test_session.execute(select(Message).order_by(Message.created_at))).scalars().all()
+    assert session.snapshot_at == rows[5].created_at
+
+    await ledger_buffer.flush(test_session)
+
+    ledger = await test_session.execute(select(UsageLedger).where(UsageLedger.session_id == session.id))
+    assert len(ledger.scalars().all()) == 1
+
+
+@pytest.mark.asyncio
+async def test_short_sessions_are_not_summarized(test_session) -> None:
+    _, session = await _session_with_messages(test_session, 9302, 10)
+    provider = SummaryProvider()
+    summarizer = SessionSummarizer(trigger_tokens=100_000, keep_recent_messages=4)
+
+    assert await summarizer.summarize(session.id, _orchestrator(provider, summarizer), test_session) is False
+    assert provider.seen == []
+
+
+@pytest.mark.asyncio
+async def test_history_is_sent_as_summary_plus_recent_turns(test_session) -> None:
+    user, session = await _session_with_messages(test_session, 9303, 6)
+    rows = (await test_session.execute(select(Message).order_by(Message.created_at))).scalars().all()
+    session.snapshot_text = "Wcześniej rozmawialiśmy o pogodzie."
+    session.snapshot_at = rows[3].created_at
+    await test_session.commit()
+
+    provider = SummaryProvider()
+    await _orchestrator(provider, SessionSummarizer(enabled=False)).process_chat(
+        user=user,
+        prompt="a jutro?",
+        session_id=session.id,
+        provider_pref="gemini",
+        mode="eco",
+        db=test_session,
+    )
+
+    sent = provider.seen[0]
+    assert sent[0] == {"role": "system", "content": f"{SUMMARY_PREFIX}Wcześniej rozmawialiśmy o pogodzie."}
+    assert [message["content"].split(" kontekst")[0] for message in sent[1:-1]] == ["wiadomość 4", "wiadomość 5"]
+    assert sent[-1]["content"] == "a jutro?"
+
+
+def test_gemini_sends_system_messages_as_system_instruction() -> None:
+    provider = GeminiProvider(Settings(GEMINI_API_KEY="test"))
+
+    payload = provider._build_payload(
+        [{"role": "system", "content": "streszczenie"}, {"role": "user", "content": "pytanie"}],
+        max_tokens=10,
+        temperature=0.1,
+    )
+
+    assert payload["systemInstruction"] == {"parts": [{"text": "streszczenie"}]}
+    assert payload["contents"] == [{"role": "user", "parts": [{"text": "pytanie"}]}]
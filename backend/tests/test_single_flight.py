@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+from typing import Any
+
+import pytest
+
+from app.core.exceptions import AllProvidersFailedError, PolicyDeniedError, ProviderError
+from app.db.models import User, UserRole
+from app.providers.base import AbstractProvider, ProviderResult
+from app.providers.factory import ProviderFactory
+from app.services.orchestrator import Orchestrator
+from app.services.policy_engine import PolicyEngine
+from app.services.single_flight import SingleFlight
+from app.services.usage_service import UsageService
+
+MESSAGES = [{"role": "user", "content": "co to jest kot"}]
+
+
+class SlowProvider(AbstractProvider):
+    def __init__(self, fail: bool = False) -> None:
+        self.calls = 0
+        self._fail = fail
+
+    @property
+    def name(self) -> str:
+        return "gemini"
+
+    async def generate(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> ProviderResult:
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        if self._fail:
+            raise ProviderError("awaria")
+        return _result()
+
+    async def health_check(self) -> bool:
+        return True
+
+
+class _FakePubSub:
+    def __init__(self, redis: _FakeRedis) -> None:
+        self._redis = redis
+        self._queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+
+    async def subscribe(self, channel: str) -> None:
+        self._redis.subscribers.setdefault(channel, []).append(self._queue)
+
+    async def get_message(self, ignore_subscribe_messages: bool, timeout: float) -> dict[str, Any] | None:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        except TimeoutError:
+            return None
+
+    async def unsubscribe(self, channel: str) -> None:
+        self._redis.subscribers[channel].remove(self._queue)
+
+    async def aclose(self) -> None:
+        return None
+
+
+class _FakeRedis:
+    def __init__(self) -> None:
+        self.values: dict[str, str] = {}
+        self.subscribers: dict[str, list[asyncio.Queue[dict[str, Any]]]] = {}
+
+    def register_script(self, script: str) -> Any:
+        async def _release(keys: list[str], args: list[Any]) -> int:
+            if self.values.get(keys[0]) == args[0]:
+                del self.values[keys[0]]
+                return 1
+            return 0
+
+        return _release
+
+    async def set(self, key: str, value: str, nx: bool = False, px: int | None = None, ex: int | None = None) -> bool:
+        if nx and key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+    async def mget(self, keys: list[str]) -> list[str | None]:
+        return [self.values.get(key) for key in keys]
+
+    async def publish(self, channel: str, message: str) -> int:
+        for queue in self.subscribers.get(channel, []):
+            queue.put_nowait({"type": "message", "data": message})
+        return len(self.subscribers.get(channel, []))
+
+    def pubsub(self) -> _FakePubSub:
+        return _FakePubSub(self)
+
+
+def _result() -> ProviderResult:
+    return ProviderResult(
+        text="Kot to zwierzę.",
+        provider="gemini",
+        model="gemini-2.0-flash-lite",
+        input_tokens=12,
+        output_tokens=4,
+        cost_usd=0.0002,
+        latency_ms=50,
+    )
+
+
+def _orchestrator(provider: AbstractProvider, coalescer: SingleFlight) -> Orchestrator:
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = {"gemini": provider}  # type: ignore[attr-defined]
+    return Orchestrator(PolicyEngine(), factory, UsageService(), coalescer=coalescer)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_one_provider_call() -> None:
+    provider = SlowProvider()
+    coalescer = SingleFlight()
+    orchestrator = _orchestrator(provider, coalescer)
+    user = User(telegram_id=8201, role=UserRole.DEMO, authorized=True)
+
+    results = await asyncio.gather(
+        *(orchestrator._run_with_fallback_chain(user, "gemini", "eco", MESSAGES) for _ in range(5))
+    )
+
+    assert provider.calls == 1
+    assert coalescer.leaders == 1 and coalescer.followers == 4
+    assert {result.text for result in results} == {"Kot to zwierzę."}
+    assert sorted((result.coalesced, result.cost_usd) for result in results) == [(False, 0.0002)] + [(True, 0.0)] * 4
+    assert not any(result.cache_hit for result in results)
+
+    await orchestrator._run_with_fallback_chain(user, "gemini", "eco", MESSAGES)
+    assert provider.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_leader_failure_is_shared_with_followers() -> None:
+    provider = SlowProvider(fail=True)
+    orchestrator = _orchestrator(provider, SingleFlight())
+    user = User(telegram_id=8202, role=UserRole.DEMO, authorized=True)
+
+    results = await asyncio.gather(
+        *(orchestrator._run_with_fallback_chain(user, "gemini", "eco", MESSAGES) for _ in range(3)),
+        return_exceptions=True,
+    )
+
+    assert provider.calls == 1
+    assert all(isinstance(result, AllProvidersFailedError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_disabled_single_flight_calls_every_time() -> None:
+    provider = SlowProvider()
+    orchestrator = _orchestrator(provider, SingleFlight(enabled=False))
+    user = User(telegram_id=8203, role=UserRole.DEMO, authorized=True)
+
+    await asyncio.gather(*(orchestrator._run_with_fallback_chain(user, "gemini", "eco", MESSAGES) for _ in range(3)))
+
+    assert provider.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_distributed_follower_receives_published_result() -> None:
+    redis = _FakeRedis()
+    replicas = [SingleFlight(distributed=True, wait_seconds=1.0) for _ in range(2)]
+    for replica in replicas:
+        replica.bind(redis)  # type: ignore[arg-type]
+    calls = 0
+
+    async def call() -> ProviderResult:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return _result()
+
+    leader = asyncio.create_task(replicas[0].run("klucz", call))
+    await asyncio.sleep(0.01)
+    follower = await replicas[1].run("klucz", call)
+
+    assert (await leader).coalesced is False
+    assert calls == 1
+    assert follower.text == "Kot to zwierzę." and follower.coalesced is True and follower.cost_usd == 0.0
+    assert follower.cache_hit is False
+    assert "single_flight:klucz:lock" not in redis.values
+
+
+@pytest.mark.asyncio
+async def test_distributed_follower_runs_call_after_timeout() -> None:
+    redis = _FakeRedis()
+    redis.values["single_flight:klucz:lock"] = "inny-proces"
+    coalescer = SingleFlight(distributed=True, wait_seconds=0.05)
+    coalescer.bind(redis)  # type: ignore[arg-type]
+
+    async def call() -> ProviderResult:
+        return _result()
+
+    result = await coalescer.run("klucz", call)
+
+    assert result.coalesced is False
+    assert coalescer.leaders == 1
+
+
+@pytest.mark.asyncio
+async def test_distributed_follower_ignores_result_of_previous_flight() -> None:
+    redis = _FakeRedis()
+    redis.values["single_flight:klucz:lock"] = "biezacy-lot"
+    redis.values["single_flight:klucz:result"] = json.dumps(
+        {"token": "poprzedni-lot", "error": {"type": "ProviderError", "detail": "stara awaria", "status_code": 502}}
+    )
+    coalescer = SingleFlight(distributed=True, wait_seconds=1.0)
+    coalescer.bind(redis)  # type: ignore[arg-type]
+
+    async def call() -> ProviderResult:
+        raise AssertionError("obserwator nie powinien wywoływać providera")
+
+    follower = asyncio.create_task(coalescer.run("klucz", call))
+    await asyncio.sleep(0.01)
+    await redis.publish(
+        "single_flight:klucz:result",
+        json.dumps(
+            {"token": "poprzedni-lot", "error": {"type": "ProviderError", "detail": "stara awaria", "status_code": 502}}
+        ),
+    )
+    await redis.publish(
+        "single_flight:klucz:result", json.dumps({"token": "biezacy-lot", "result": dataclasses.asdict(_result())})
+    )
+    result = await follower
+
+    assert result.text == "Kot to zwierzę." and result.coalesced is True
+    assert coalescer.followers == 1
+
+
+@pytest.mark.asyncio
+async def test_distributed_follower_reraises_leader_error_type() -> None:
+    redis = _FakeRedis()
+    replicas = [SingleFlight(distributed=True, wait_seconds=1.0) for _ in range(2)]
+    for replica in replicas:
+        replica.bind(redis)  # type: ignore[arg-type]
+
+    async def denied() -> ProviderResult:
+        await asyncio.sleep(0.05)
+        raise PolicyDeniedError("Przekroczono dzienny budżet")
+
+    leader = asyncio.create_task(replicas[0].run("klucz", denied))
+    await asyncio.sleep(0.01)
+    with pytest.raises(PolicyDeniedError) as follower_error:
+        await replicas[1].run("klucz", denied)
+    with pytest.raises(PolicyDeniedError):
+        await leader
+
+    assert follower_error.value.status_code == 403
+    assert follower_error.value.detail == "Przekroczono dzienny budżet"
+    assert replicas[1].followers == 1
@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import json
+import uuid
+from collections.abc import AsyncIterator
+
+import httpx
+import pytest
+import respx
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select
+
+from app.api.deps import get_orchestrator
+from app.core.config import Settings, get_settings
+from app.core.exceptions import ProviderError
+from app.db.models import Message, UsageLedger, User, UserRole
+from app.main import create_app
+from app.providers.base import AbstractProvider, ProviderResult, ProviderStreamChunk
+from app.providers.deepseek import DeepSeekProvider
+from app.providers.factory import ProviderFactory
+from app.providers.gemini import GeminiProvider
+from app.providers.tokenizer import estimate_messages_tokens, estimate_tokens
+from app.services.orchestrator import Orchestrator
+from app.services.policy_engine import PolicyEngine
+from app.services.usage_ledger import ledger_buffer
+from app.services.usage_service import UsageService
+
+
+def _sse(*events: dict | str) -> bytes:
+    lines = [f"data: {event if isinstance(event, str) else json.dumps(event)}\n\n" for event in events]
+    return "".join(lines).encode()
+
+
+class StreamingGeminiProvider(AbstractProvider):
+    @property
+    def name(self) -> str:
+        return "gemini"
+
+    async def generate(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> ProviderResult:
+        raise AssertionError("generate nie powinno być wywołane")
+
+    async def stream(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> AsyncIterator[ProviderStreamChunk]:
+        for part in ("Ala ", "ma ", "kota"):
+            yield ProviderStreamChunk(text=part)
+        yield ProviderStreamChunk(
+            result=ProviderResult(
+                text="Ala ma kota",
+                provider="gemini",
+                model="gemini-2.0-flash-lite",
+                input_tokens=10,
+                output_tokens=3,
+                cost_usd=0.0001,
+                latency_ms=5,
+            )
+        )
+
+    async def health_check(self) -> bool:
+        return True
+
+
+class BrokenStreamProvider(AbstractProvider):
+    @property
+    def name(self) -> str:
+        return "gemini"
+
+    async def generate(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> ProviderResult:
+        raise ProviderError("Gemini failed")
+
+    async def health_check(self) -> bool:
+        return False
+
+
+class SuccessDeepseekProvider(AbstractProvider):
+    @property
+    def name(self) -> str:
+        return "deepseek"
+
+    async def generate(
+        self,
+        messages: list[dict[str, str]],
+        profile: str,
+        max_tokens: int,
+        temperature: float,
+    ) -> ProviderResult:
+        return ProviderResult(
+            text="Odpowiedź z Deepseek",
+            provider="deepseek",
+            model="deepseek-chat",
+            input_tokens=5,
+            output_tokens=4,
+            cost_usd=0.0,
+            latency_ms=7,
+        )
+
+    async def health_check(self) -> bool:
+        return True
+
+
+def _orchestrator(registry: dict[str, AbstractProvider]) -> Orchestrator:
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = registry  # type: ignore[attr-defined]
+    return Orchestrator(PolicyEngine(), factory, UsageService())
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_openai_compat_stream_yields_deltas_and_usage() -> None:
+    respx.post("https://api.deepseek.com/v1/chat/completions").mock(
+        return_value=httpx.Response(
+            200,
+            content=_sse(
+                {"choices": [{"delta": {"role": "assistant"}}]},
+                {"choices": [{"delta": {"content": "Deep"}}]},
+                {"choices": [{"delta": {"content": "Seek"}}]},
+                {"choices": [], "usage": {"prompt_tokens": 1000, "completion_tokens": 2000}},
+                "[DONE]",
+            ),
+            headers={"Content-Type": "text/event-stream"},
+        )
+    )
+    provider = DeepSeekProvider(Settings(DEEPSEEK_API_KEY="test"))
+
+    chunks = [
+        chunk
+        async for chunk in provider.stream(
+            messages=[{"role": "user", "content": "Test"}],
+            profile="smart",
+            max_tokens=32,
+            temperature=0.1,
+        )
+    ]
+
+    assert [chunk.text for chunk in chunks if chunk.text] == ["Deep", "Seek"]
+    result = chunks[-1].result
+    assert result is not None
+    assert result.text == "DeepSeek"
+    assert result.output_tokens == 2000
+    assert result.cost_usd > 0
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_openai_compat_stream_estimates_missing_usage_with_tokenizer() -> None:
+    respx.post("https://api.deepseek.com/v1/chat/completions").mock(
+        return_value=httpx.Response(
+            200,
+            content=_sse({"choices": [{"delta": {"content": "Zażółć gęślą jaźń"}}]}, "[DONE]"),
+            headers={"Content-Type": "text/event-stream"},
+        )
+    )
+    provider = DeepSeekProvider(Settings(DEEPSEEK_API_KEY="test"))
+    messages = [{"role": "user", "content": "Napisz coś po polsku"}]
+
+    chunks = [chunk async for chunk in provider.stream(messages, profile="eco", max_tokens=32, temperature=0.1)]
+
+    result = chunks[-1].result
+    assert result is not None
+    assert result.input_tokens == estimate_messages_tokens(messages, "deepseek")
+    assert result.output_tokens == estimate_tokens("Zażółć gęślą jaźń", "deepseek")
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_gemini_stream_uses_stream_generate_content() -> None:
+    route = respx.post(
+        "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-lite:streamGenerateContent"
+    ).mock(
+        return_value=httpx.Response(
+            200,
+            content=_sse(
+                {"candidates": [{"content": {"parts": [{"text": "Cześć"}]}}]},
+                {
+                    "candidates": [{"content": {"parts": [{"text": " świecie"}]}}],
+                    "usageMetadata": {"promptTokenCount": 4, "candidatesTokenCount": 2},
+                },
+            ),
+            headers={"Content-Type": "text/event-stream"},
+        )
+    )
+    provider = GeminiProvider(Settings(GEMINI_API_KEY="test"))
+
+    chunks = [
+        chunk
+        async for chunk in provider.stream(
+            messages=[{"role": "user", "content": "Hej"}],
+            profile="eco",
+            max_tokens=32,
+            temperature=0.1,
+        )
+    ]
+
+    assert route.calls.last.request.url.params["alt"] == "sse"
+    result = chunks[-1].result
+    assert result is not None
+    assert result.text == "Cześć świecie"
+    assert result.input_tokens == 4
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_persists_turn_after_completion(test_session) -> None:
+    user = User(telegram_id=5101, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+
+    orchestrator = _orchestrator({"gemini": StreamingGeminiProvider()})
+    events = await orchestrator.stream_chat(
+        user=user,
+        prompt="Hej",
+        session_id=None,
+        provider_pref="gemini",
+        mode="eco",
+        db=test_session,
+    )
+    collected = [item async for item in events]
+
+    assert [data["delta"] for event, data in collected if event == "token"] == ["Ala ", "ma ", "kota"]
+    event, done = collected[-1]
+    assert event == "done"
+    assert done["response"] == "Ala ma kota"
+
+    await ledger_buffer.flush(test_session)
+
+    ledger = await test_session.execute(select(UsageLedger).where(UsageLedger.user_id == user.id))
+    assert ledger.scalar_one().output_tokens == 3
+    messages = await test_session.execute(select(Message).where(Message.session_id == uuid.UUID(done["session_id"])))
+    assert {(item.role, item.content) for item in messages.scalars().all()} == {
+        ("user", "Hej"),
+        ("assistant", "Ala ma kota"),
+    }
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_falls_back_before_first_token(test_session) -> None:
+    user = User(telegram_id=5102, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+
+    orchestrator = _orchestrator({"gemini": BrokenStreamProvider(), "deepseek": SuccessDeepseekProvider()})
+    events = await orchestrator.stream_chat(
+        user=user,
+        prompt="Wyjaśnij pojęcie",
+        session_id=None,
+        provider_pref=None,
+        mode="eco",
+        db=test_session,
+    )
+    collected = [item async for item in events]
+
+    event, done = collected[-1]
+    assert event == "done"
+    assert done["meta"]["provider"] == "deepseek"
+    assert done["meta"]["fallback_used"] is True
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_endpoint_emits_sse(test_engine) -> None:
+    app = create_app()
+    app.dependency_overrides[get_orchestrator] = lambda: _orchestrator({"gemini": StreamingGeminiProvider()})
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        register = await client.post("/api/v1/auth/register", json={"telegram_chat_id": 515151})
+        await client.post(
+            "/api/v1/auth/unlock",
+            json={"telegram_chat_id": 515151, "code": get_settings().DEMO_UNLOCK_CODE},
+        )
+        token = register.json()["access_token"]
+
+        response = await client.post(
+            "/api/v1/chat/stream",
+            json={"prompt": "Hej", "provider": "gemini", "mode": "eco"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    blocks = [block for block in response.text.split("\n\n") if block]
+    assert blocks[0] == 'event: token\ndata: {"delta": "Ala "}'
+    assert blocks[-1].startswith("event: done\n")
+    assert json.loads(blocks[-1].split("data: ", 1)[1])["response"] == "Ala ma kota"
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_endpoint_reports_denied_turn_as_error_event(test_engine) -> None:
+    app = create_app()
+    app.dependency_overrides[get_orchestrator] = lambda: _orchestrator({"gemini": StreamingGeminiProvider()})
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        register = await client.post("/api/v1/auth/register", json={"telegram_chat_id": 515152})
+        token = register.json()["access_token"]
+
+        response = await client.post(
+            "/api/v1/chat/stream",
+            json={"prompt": "Hej", "provider": "gemini", "mode": "eco"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    blocks = [block for block in response.text.split("\n\n") if block]
+    assert len(blocks) == 1 and blocks[0].startswith("event: error\n")
+    assert json.loads(blocks[0].split("data: ", 1)[1])["type"] == "PolicyDeniedError"
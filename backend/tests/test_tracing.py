@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import json
+import logging
+
+import httpx
+import respx
+from httpx import ASGITransport, AsyncClient
+
+from app.api.deps import get_orchestrator
+from app.core.config import Settings, get_settings
+from app.core.logging_config import JSONFormatter, TraceContextFilter
+from app.core.tracing import parse_traceparent, server_timing, tracer
+from app.main import create_app
+from app.providers.deepseek import DeepSeekProvider
+from app.providers.factory import ProviderFactory
+from app.providers.http_pool import provider_http_pool
+from app.services.orchestrator import Orchestrator
+from app.services.policy_engine import PolicyEngine
+from app.services.session_summarizer import SessionSummarizer
+from app.services.usage_service import UsageService
+
+INCOMING = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+def _orchestrator() -> Orchestrator:
+    factory = ProviderFactory.__new__(ProviderFactory)
+    factory._registry = {"deepseek": DeepSeekProvider(Settings(DEEPSEEK_API_KEY="test"))}  # type: ignore[attr-defined]
+    return Orchestrator(PolicyEngine(), factory, UsageService(), summarizer=SessionSummarizer(enabled=False))
+
+
+def test_traceparent_parsing() -> None:
+    assert parse_traceparent(INCOMING) == ("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7")
+    assert parse_traceparent("00-00000000000000000000000000000000-00f067aa0ba902b7-01") is None
+    assert parse_traceparent("garbage") is None
+    assert parse_traceparent(None) is None
+
+
+def test_log_records_carry_trace_context() -> None:
+    trace, parent_id = tracer.begin(INCOMING, "req-1")
+    record = logging.LogRecord("app", logging.INFO, __file__, 1, "hej", None, None)
+    with tracer.activate(trace, parent_id):
+        tracer.tag(user_id="u-1", session_id="s-1")
+        TraceContextFilter().filter(record)
+
+    payload = json.loads(JSONFormatter().format(record))
+    assert payload["request_id"] == "req-1"
+    assert payload["trace_id"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert payload["user_id"] == "u-1"
+    assert payload["session_id"] == "s-1"
+
+
+def test_server_timing_sums_repeated_stages() -> None:
+    trace, _ = tracer.begin()
+    with tracer.activate(trace), tracer.span("http"):
+        for _ in range(2):
+            with tracer.span("policy"):
+                pass
+        header = server_timing(trace)
+
+    names = [entry.split(";")[0] for entry in header.split(", ")]
+    assert names == ["policy", "total"]
+
+
+@respx.mock
+async def test_chat_request_exposes_stage_breakdown_and_exports_spans(test_engine, tmp_path, monkeypatch) -> None:
+    export = tmp_path / "spans.jsonl"
+    monkeypatch.setattr(tracer, "_export_file", export)
+    respx.post("https://api.deepseek.com/v1/chat/completions").mock(
+        return_value=httpx.Response(
+            200,
+            json={
+                "choices": [{"message": {"content": "Cześć"}}],
+                "usage": {"prompt_tokens": 12, "completion_tokens": 3},
+            },
+        )
+    )
+    app = create_app()
+    app.dependency_overrides[get_orchestrator] = _orchestrator
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            register = await client.post("/api/v1/auth/register", json={"telegram_chat_id": 626262})
+            await client.post(
+                "/api/v1/auth/unlock",
+                json={"telegram_chat_id": 626262, "code": get_settings().DEMO_UNLOCK_CODE},
+            )
+            response = await client.post(
+                "/api/v1/chat/",
+                json={"prompt": "Hej", "provider": "deepseek", "mode": "eco"},
+                headers={
+                    "Authorization": f"Bearer {register.json()['access_token']}",
+                    "traceparent": INCOMING,
+                    "X-Request-ID": "bot-req-7",
+                },
+            )
+        await tracer.flush()
+    finally:
+        await provider_http_pool.close_client("deepseek")
+
+    assert response.status_code == 200
+    assert response.headers["x-request-id"] == "bot-req-7"
+    stages = {entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")}
+    assert {"policy", "session", "history", "provider", "provider_http", "ledger", "save", "total"} <= stages
+
+    spans = [json.loads(line) for line in export.read_text(encoding="utf-8").splitlines()]
+    chat_spans = [span for span in spans if span["request_id"] == "bot-req-7"]
+    by_id = {span["span_id"]: span for span in chat_spans}
+    root = next(span for span in chat_spans if span["name"] == "http")
+    provider_http = next(span for span in chat_spans if span["name"] == "provider_http")
+    assert {span["trace_id"] for span in chat_spans} == {"4bf92f3577b34da6a3ce929d0e0e4736"}
+    assert root["parent_id"] == "00f067aa0ba902b7"
+    assert by_id[provider_http["parent_id"]]["name"] == "provider"
+    assert provider_http["attributes"] == {"provider": "deepseek", "attempt": 0, "status": 200}
+    assert root["user_id"] is not None
+    assert root["session_id"] == response.json()["session_id"]
+
+
+@respx.mock
+async def test_spans_are_exported_as_otlp_json(monkeypatch) -> None:
+    collector = respx.post("http://collector:4318/v1/traces").mock(return_value=httpx.Response(200))
+    monkeypatch.setattr(tracer, "_otlp_endpoint", "http://collector:4318/v1/traces")
+    trace, _ = tracer.begin()
+    with tracer.activate(trace), tracer.span("http"), tracer.span("provider", cached=True):
+        pass
+    tracer.finish(trace)
+
+    await tracer.stop()
+
+    payload = json.loads(collector.calls.last.request.content)
+    spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [span["name"] for span in spans] == ["http", "provider"]
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+    assert {"key": "cached", "value": {"boolValue": True}} in spans[1]["attributes"]
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import uuid
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+from typing import Any
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.config import get_settings
+from app.db.models import UsageLedger, User, UserRole
+from app.services.policy_engine import PolicyEngine
+from app.services.usage_ledger import LedgerBuffer, LedgerEntry, ledger_buffer
+from app.services.usage_service import UsageService
+
+
+class _DownRedis:
+    def register_script(self, script: str) -> Any:
+        return None
+
+    def pipeline(self, transaction: bool = True) -> Any:
+        raise ConnectionError("redis down")
+
+    async def hgetall(self, key: str) -> dict[str, str]:
+        raise ConnectionError("redis down")
+
+
+def _entry(user_id: uuid.UUID, provider: str = "openai", **kwargs: Any) -> LedgerEntry:
+    values: dict[str, Any] = {
+        "user_id": user_id,
+        "session_id": None,
+        "provider": provider,
+        "model": "gpt-4o-mini",
+        "profile": "smart",
+        "input_tokens": 100,
+        "output_tokens": 20,
+        "cached_input_tokens": 0,
+        "cost_usd": Decimal("0.25"),
+        "latency_ms": 120,
+        "fallback_used": False,
+        "cache_hit": False,
+        **kwargs,
+    }
+    return LedgerEntry(**values)
+
+
+async def _ledger_count(test_session, user_id: uuid.UUID) -> int:
+    result = await test_session.execute(select(func.count(UsageLedger.id)).where(UsageLedger.user_id == user_id))
+    return int(result.scalar_one())
+
+
+@pytest.mark.asyncio
+async def test_flush_inserts_batch_and_ignores_replayed_entries(test_session) -> None:
+    user = User(telegram_id=9101, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+    entries = [_entry(user.id) for _ in range(3)]
+    for entry in entries:
+        await ledger_buffer.append(entry)
+
+    assert await ledger_buffer.flush(test_session) == 3
+    await ledger_buffer.append(entries[0])
+    await ledger_buffer.flush(test_session)
+
+    assert ledger_buffer.pending_local == 0
+    assert await _ledger_count(test_session, user.id) == 3
+
+
+@pytest.mark.asyncio
+async def test_budget_checks_include_pending_spend(test_session) -> None:
+    user = User(telegram_id=9102, role=UserRole.FULL_ACCESS, authorized=True, subscription_tier="starter")
+    test_session.add(user)
+    await test_session.commit()
+    usage = UsageService()
+    for _ in range(5):
+        await usage.log_request(test_session, user.id, None, "openai", "gpt-4o-mini", "smart", 10, 5, 0.25, 80, False)
+
+    access = await PolicyEngine().check_access(user, "openai", test_session, get_settings())
+
+    assert await _ledger_count(test_session, user.id) == 0
+    assert access.allowed is False
+    assert access.reason_code == "gpt_daily"
+    assert await usage.get_daily_cost(user.id, test_session) == pytest.approx(1.25)
+
+
+@pytest.mark.asyncio
+async def test_entries_for_uncommitted_sessions_wait_then_drop_the_reference(test_session) -> None:
+    user = User(telegram_id=9103, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+    fresh = _entry(user.id, session_id=uuid.uuid4())
+    stale = _entry(
+        user.id,
+        session_id=uuid.uuid4(),
+        created_at=datetime.now(tz=UTC) - timedelta(minutes=5),
+    )
+    await ledger_buffer.append(fresh)
+    await ledger_buffer.append(stale)
+
+    assert await ledger_buffer.flush(test_session) == 1
+    assert ledger_buffer.pending_local == 1
+    row = await test_session.get(UsageLedger, stale.id)
+    assert row is not None and row.session_id is None
+
+
+@pytest.mark.asyncio
+async def test_wal_is_recovered_after_restart(test_session, tmp_path) -> None:
+    user = User(telegram_id=9104, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+    crashed = LedgerBuffer(redis=_DownRedis(), wal_dir=str(tmp_path))  # type: ignore[arg-type]
+    await crashed.append(_entry(user.id, provider="gemini"))
+    assert (await crashed.pending_usage(user.id)).calls == {"gemini": 1}
+
+    restarted = LedgerBuffer(wal_dir=str(tmp_path), flush_seconds=3600)
+    await restarted.start()
+    try:
+        assert restarted.pending_local == 1
+        assert await restarted.flush(test_session) == 1
+    finally:
+        await restarted.stop()
+
+    assert await _ledger_count(test_session, user.id) == 1
+    assert list(tmp_path.iterdir()) == []
+
+
+class _StreamRedis:
+    def __init__(self, messages: list[tuple[str, dict[str, str]]]) -> None:
+        self.messages = messages
+        self.acks: list[tuple[list[str], list[Any]]] = []
+
+    def register_script(self, script: str) -> Any:
+        async def _run(keys: list[str], args: list[Any]) -> int:
+            self.acks.append((keys, args))
+            return (len(args) - 1) // 4
+
+        return _run
+
+    async def xgroup_create(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+    async def xreadgroup(self, group: str, consumer: str, streams: dict[str, str], count: int) -> Any:
+        [(stream, position)] = streams.items()
+        if position == "0" or not self.messages:
+            return []
+        messages, self.messages = self.messages, []
+        return [[stream, messages]]
+
+    async def xautoclaim(self, *args: Any, **kwargs: Any) -> Any:
+        return ["0-0", [], []]
+
+
+@pytest.mark.asyncio
+async def test_stream_ack_passes_pending_hashes_as_keys(test_session) -> None:
+    users = [User(telegram_id=9105 + index, role=UserRole.DEMO, authorized=True) for index in range(2)]
+    test_session.add_all(users)
+    await test_session.commit()
+    entries = [_entry(users[0].id), _entry(users[1].id), _entry(users[0].id, provider="gemini")]
+    redis = _StreamRedis([(f"1-{index}", {"entry": entry.dumps()}) for index, entry in enumerate(entries)])
+    buffer = LedgerBuffer()
+    buffer.bind(redis)  # type: ignore[arg-type]
+
+    assert await buffer.flush(test_session) == 3
+
+    [(keys, args)] = redis.acks
+    day = entries[0].created_at.date().isoformat()
+    assert keys == [
+        "{usage_ledger}:stream",
+        f"{{usage_ledger}}:pending:{users[0].id}:{day}",
+        f"{{usage_ledger}}:pending:{users[1].id}:{day}",
+    ]
+    assert args == [
+        "usage_ledger:writers",
+        "1-0",
+        2,
+        "0.25",
+        "openai",
+        "1-1",
+        3,
+        "0.25",
+        "openai",
+        "1-2",
+        2,
+        "0.25",
+        "gemini",
+    ]
+    assert await _ledger_count(test_session, users[0].id) == 2
+
+
+@pytest.mark.asyncio
+async def test_full_local_buffer_falls_back_to_synchronous_write(test_session) -> None:
+    user = User(telegram_id=9107, role=UserRole.DEMO, authorized=True)
+    test_session.add(user)
+    await test_session.commit()
+    buffer = LedgerBuffer(max_pending=1)
+    usage = UsageService(buffer)
+
+    for _ in range(3):
+        await usage.log_request(test_session, user.id, None, "openai", "gpt-4o-mini", "smart", 10, 5, 0.25, 80, False)
+
+    assert buffer.pending_local == 1
+    assert await _ledger_count(test_session, user.id) == 2
+    assert await usage.get_daily_cost(user.id, test_session) == pytest.approx(0.75)
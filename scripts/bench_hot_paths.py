@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "backend"), str(ROOT / "telegram_bot")]
+
+from app.core.config import Settings  # noqa: E402
+from app.db.models import User, UserRole  # noqa: E402
+from app.providers.deepseek import DeepSeekProvider  # noqa: E402
+from app.providers.gemini import GeminiProvider  # noqa: E402
+from app.services.model_router import ModelRouter  # noqa: E402
+from app.services.policy_engine import PolicyEngine  # noqa: E402
+from utils.formatters import safe_markdown_v2  # noqa: E402
+from utils.message_splitter import split_message  # noqa: E402
+from utils.meta_footer import format_meta_footer  # noqa: E402
+
+DEFAULT_BASELINE = ROOT / "scripts" / "bench_baseline.json"
+
+_PROSE = (
+    "Poniżej *poprawiona* wersja funkcji (z obsługą błędów). Zwróć uwagę na `retry_after` i limit [RPM]: "
+    "każde wywołanie > 1 s jest logowane - patrz sekcja #3. Wynik = suma_kosztów / liczba_zapytań!\n\n"
+)
+_CODE = (
+    "```python\n"
+    "async def fetch_with_retry(client: httpx.AsyncClient, url: str, attempts: int = 3) -> dict[str, Any]:\n"
+    "    for attempt in range(attempts):\n"
+    "        response = await client.get(url, params={'page': attempt, 'size': 50})\n"
+    "        if response.status_code == 429:\n"
+    "            await asyncio.sleep(float(response.headers.get('retry-after', 1)) * (attempt + 1))\n"
+    "            continue\n"
+    "        response.raise_for_status()\n"
+    "        return {k: v for k, v in response.json().items() if not k.startswith('_')}\n"
+    "    raise RuntimeError(f'Nie udało się pobrać {url} po {attempts} próbach')\n"
+    "```\n\n"
+)
+_TOPIC = (
+    "zaprojektuj skalowalny system kolejkowania zadań który obsłuży tysiące użytkowników jednocześnie "
+    "uwzględnij bazę danych cache oraz mechanizmy ponawiania i monitoringu kosztów dostawców modeli"
+)
+
+
+def code_heavy_reply(size: int = 50_000) -> str:
+    parts: list[str] = []
+    while sum(map(len, parts)) < size:
+        parts.extend([_PROSE, _CODE])
+    return "".join(parts)[:size]
+
+
+def long_prompt(words: int = 2_000) -> str:
+    vocabulary = _TOPIC.split()
+    return " ".join(vocabulary[index % len(vocabulary)] for index in range(words))
+
+
+def _user(role: UserRole, tier: str) -> User:
+    return User(telegram_id=1, role=role, authorized=True, subscription_tier=tier)
+
+
+@dataclass(slots=True)
+class BenchResult:
+    name: str
+    loops: int
+    repeats: int
+    median_us: float
+    min_us: float
+    stdev_us: float
+    iqr_us: float
+
+
+def build_cases() -> dict[str, Callable[[], Any]]:
+    settings = Settings(GEMINI_API_KEY="bench", DEEPSEEK_API_KEY="bench")
+    router = ModelRouter()
+    policy = PolicyEngine()
+    gemini = GeminiProvider(settings)
+    deepseek = DeepSeekProvider(settings)
+    prompt_long = long_prompt()
+    prompt_short = "Cześć, co to jest rekurencja?"
+    reply = code_heavy_reply()
+    demo = _user(UserRole.DEMO, "free")
+    paid = _user(UserRole.FULL_ACCESS, "unlimited")
+    completion = {
+        "choices": [{"message": {"content": reply[:4000]}}],
+        "usage": {"prompt_tokens": 2_600, "completion_tokens": 900, "prompt_tokens_details": {"cached_tokens": 1024}},
+    }
+
+    return {
+        "backend.classify_difficulty[2000 words]": lambda: router.classify_difficulty(prompt_long),
+        "backend.classify_difficulty[short]": lambda: router.classify_difficulty(prompt_short),
+        "backend.get_effective_limits[demo]": lambda: policy.get_effective_limits(demo),
+        "backend.get_effective_limits[unlimited]": lambda: policy.get_effective_limits(paid),
+        "backend.gemini._calculate_cost": lambda: gemini._calculate_cost("gemini-2.0-flash", 2_600, 900, 1024),
+        "backend.openai_compat._parse_result": lambda: deepseek._parse_result(completion, "deepseek-chat", 0.0),
+        "bot.safe_markdown_v2[50KB code]": lambda: safe_markdown_v2(reply),
+        "bot.split_message[50KB code]": lambda: split_message(reply),
+        "bot.format_meta_footer": lambda: format_meta_footer("gemini-2.0-flash", 0.00123, 3500, 2.345, True),
+    }
+
+
+def calibrate(func: Callable[[], Any], target_seconds: float) -> int:
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - started >= target_seconds or loops >= 10_000_000:
+            return loops
+        loops *= 2
+
+
+def measure(name: str, func: Callable[[], Any], repeats: int, target_seconds: float, warmup: int) -> BenchResult:
+    for _ in range(warmup):
+        func()
+    loops = calibrate(func, target_seconds)
+    samples: list[float] = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            for _ in range(loops):
+                func()
+            samples.append((time.perf_counter() - started) / loops * 1_000_000)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    quartiles = statistics.quantiles(samples, n=4) if len(samples) > 1 else [samples[0]] * 3
+    return BenchResult(
+        name=name,
+        loops=loops,
+        repeats=repeats,
+        median_us=round(statistics.median(samples), 3),
+        min_us=round(min(samples), 3),
+        stdev_us=round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        iqr_us=round(quartiles[2] - quartiles[0], 3),
+    )
+
+
+def compare(results: list[BenchResult], baseline: dict[str, Any], threshold: float) -> list[str]:
+    previous = {item["name"]: item for item in baseline.get("results", [])}
+    regressions: list[str] = []
+    for result in results:
+        before = previous.get(result.name)
+        if before is None or not before.get("median_us"):
+            print(f"{result.name:<45} brak w baseline")
+            continue
+        change = result.median_us / before["median_us"] - 1
+        noise = (result.iqr_us + before.get("iqr_us", 0.0)) / before["median_us"]
+        marker = ""
+        if change > max(threshold, noise):
+            marker = "  <-- REGRESJA"
+            regressions.append(result.name)
+        elif change < -max(threshold, noise):
+            marker = "  (szybciej)"
+        print(f"{result.name:<45} {before['median_us']:>12.3f} -> {result.median_us:>12.3f} µs {change:+7.1%}{marker}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mikro-benchmarki gorących ścieżek backendu i bota")
+    parser.add_argument("--filter", default="", help="Uruchom tylko przypadki zawierające ten tekst")
+    parser.add_argument("--repeats", type=int, default=15)
+    parser.add_argument("--target-seconds", type=float, default=0.05, help="Minimalny czas jednej próbki")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Zapisz wyniki jako nowy baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Próg regresji względem mediany")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--report", type=Path, default=None, help="Plik JSON z wynikami")
+    args = parser.parse_args()
+
+    results = [
+        measure(name, func, max(args.repeats, 2), args.target_seconds, args.warmup)
+        for name, func in build_cases().items()
+        if args.filter in name
+    ]
+    for result in results:
+        print(
+            f"{result.name:<45} mediana {result.median_us:>12.3f} µs  min {result.min_us:>12.3f}  "
+            f"IQR {result.iqr_us:>9.3f}  ({result.repeats}x{result.loops})"
+        )
+
+    report = {
+        "created_at": datetime.now(tz=UTC).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": [asdict(result) for result in results],
+    }
+    if args.report:
+        args.report.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"Zapisano baseline: {args.baseline}")
+        return
+    if args.baseline.exists():
+        print(f"\nPorównanie z {args.baseline}:")
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")), args.threshold)
+        if regressions and args.fail_on_regression:
+            raise SystemExit(f"Regresje: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+PROMPTS: dict[str, list[str]] = {
+    "short": ["Cześć!", "Dzięki, to wszystko.", "Jaka jest stolica Francji?", "Podaj synonim słowa szybki."],
+    "question": [
+        "Wyjaśnij różnicę między procesem a wątkiem w systemie operacyjnym.",
+        "Jakie są zalety i wady architektury mikroserwisów w porównaniu z monolitem?",
+        "Opisz, jak działa indeks B-drzewa w bazie danych PostgreSQL.",
+    ],
+    "code": [
+        "Napisz funkcję w Pythonie, która scala dwie posortowane listy, i dodaj testy:\n"
+        "```python\ndef merge(a: list[int], b: list[int]) -> list[int]:\n    ...\n```",
+        "Znajdź błąd w kodzie:\n```python\nfor i in range(len(items)):\n    if items[i] is None:\n"
+        "        items.pop(i)\n```",
+    ],
+    "long": [
+        " ".join(
+            ["Streść poniższy tekst w pięciu punktach."]
+            + ["Rozwój systemów rozproszonych wymaga starannego projektowania interfejsów i obsługi błędów."] * 180
+        )
+    ],
+}
+
+
+@dataclass(slots=True)
+class LoadConfig:
+    base_url: str
+    users: int
+    concurrency: int
+    sessions_per_user: int
+    min_turns: int
+    max_turns: int
+    mix: dict[str, float]
+    mode: str
+    provider: str | None
+    stream: bool
+    telegram_id_base: int
+    unlock_code: str
+    timeout: float
+    seed: int
+    mock_url: str | None
+
+
+@dataclass(slots=True)
+class Sample:
+    kind: str
+    status: int
+    latency_ms: float
+    ttft_ms: float | None = None
+    stages: dict[str, float] = field(default_factory=dict)
+    db_queries: int | None = None
+    error: str | None = None
+    provider: str | None = None
+    cache_hit: bool = False
+    coalesced: bool = False
+    fallback_used: bool = False
+
+
+def percentile(values: list[float], fraction: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(max(int(round(fraction * len(ordered) + 0.5)) - 1, 0), len(ordered) - 1)
+    return round(ordered[index], 2)
+
+
+def distribution(values: list[float]) -> dict[str, float | int | None]:
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 2) if values else None,
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": round(max(values), 2) if values else None,
+    }
+
+
+def parse_server_timing(header: str | None) -> dict[str, float]:
+    stages: dict[str, float] = {}
+    for entry in (header or "").split(","):
+        name, *params = [part.strip() for part in entry.split(";")]
+        for param in params:
+            key, _, value = param.partition("=")
+            if name and key == "dur":
+                try:
+                    stages[name] = stages.get(name, 0.0) + float(value)
+                except ValueError:
+                    continue
+    return stages
+
+
+def parse_mix(raw: str) -> dict[str, float]:
+    mix: dict[str, float] = {}
+    for item in raw.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if not name:
+            continue
+        if name not in PROMPTS:
+            raise SystemExit(f"Nieznany rodzaj promptu: {name} (dostępne: {', '.join(PROMPTS)})")
+        mix[name] = float(weight or 1)
+    return mix or {"question": 1.0}
+
+
+def error_class(response: httpx.Response) -> str:
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    if isinstance(body, dict) and isinstance(body.get("error"), dict) and body["error"].get("type"):
+        return str(body["error"]["type"])
+    return f"http_{response.status_code}"
+
+
+def _db_queries(response: httpx.Response) -> int | None:
+    value = response.headers.get("x-db-queries")
+    return int(value) if value and value.isdigit() else None
+
+
+class LoadTest:
+    def __init__(self, config: LoadConfig) -> None:
+        self.config = config
+        self.samples: list[Sample] = []
+        self.setup_errors: Counter[str] = Counter()
+        self._rng = random.Random(config.seed)
+
+    async def register(self, client: httpx.AsyncClient, index: int) -> str | None:
+        telegram_id = self.config.telegram_id_base + index
+        try:
+            response = await client.post("/api/v1/auth/register", json={"telegram_chat_id": telegram_id})
+            if response.status_code != 200:
+                self.setup_errors[f"register_{error_class(response)}"] += 1
+                return None
+            data = response.json()
+            if not data.get("authorized"):
+                unlocked = await client.post(
+                    "/api/v1/auth/unlock", json={"telegram_chat_id": telegram_id, "code": self.config.unlock_code}
+                )
+                if unlocked.status_code != 200 or not unlocked.json().get("success"):
+                    self.setup_errors[f"unlock_{error_class(unlocked)}"] += 1
+                    return None
+            return str(data["access_token"])
+        except httpx.HTTPError as exc:
+            self.setup_errors[f"register_{exc.__class__.__name__}"] += 1
+            return None
+
+    def pick_prompt(self) -> tuple[str, str]:
+        kinds = list(self.config.mix)
+        kind = self._rng.choices(kinds, weights=[self.config.mix[name] for name in kinds])[0]
+        return kind, self._rng.choice(PROMPTS[kind])
+
+    async def chat(
+        self, client: httpx.AsyncClient, token: str, session_id: str | None, kind: str, prompt: str
+    ) -> tuple[Sample, str | None]:
+        payload: dict[str, Any] = {"prompt": prompt, "mode": self.config.mode, "session_id": session_id}
+        if self.config.provider:
+            payload["provider"] = self.config.provider
+        headers = {"Authorization": f"Bearer {token}"}
+        started = time.perf_counter()
+        try:
+            if self.config.stream:
+                return await self._chat_stream(client, headers, payload, kind, started)
+            response = await client.post("/api/v1/chat/", json=payload, headers=headers)
+        except httpx.HTTPError as exc:
+            return Sample(kind, 0, (time.perf_counter() - started) * 1000, error=exc.__class__.__name__), session_id
+
+        sample = Sample(
+            kind=kind,
+            status=response.status_code,
+            latency_ms=(time.perf_counter() - started) * 1000,
+            stages=parse_server_timing(response.headers.get("server-timing")),
+            db_queries=_db_queries(response),
+        )
+        if response.status_code != 200:
+            sample.error = error_class(response)
+            return sample, session_id
+        data = response.json()
+        meta = data.get("meta") or {}
+        sample.provider = meta.get("provider")
+        sample.cache_hit = bool(meta.get("cache_hit"))
+        sample.coalesced = bool(meta.get("coalesced"))
+        sample.fallback_used = bool(meta.get("fallback_used"))
+        return sample, data.get("session_id") or session_id
+
+    async def _chat_stream(
+        self,
+        client: httpx.AsyncClient,
+        headers: dict[str, str],
+        payload: dict[str, Any],
+        kind: str,
+        started: float,
+    ) -> tuple[Sample, str | None]:
+        session_id = payload.get("session_id")
+        async with client.stream("POST", "/api/v1/chat/stream", json=payload, headers=headers) as response:
+            sample = Sample(kind=kind, status=response.status_code, latency_ms=0.0)
+            if response.status_code != 200:
+                await response.aread()
+                sample.error = error_class(response)
+            event = ""
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line.removeprefix("event:").strip()
+                    if event == "token" and sample.ttft_ms is None:
+                        sample.ttft_ms = (time.perf_counter() - started) * 1000
+                elif line.startswith("data:") and event in {"done", "error"}:
+                    data = json.loads(line.removeprefix("data:").strip())
+                    if event == "error":
+                        sample.error = str(data.get("type") or "stream_error")
+                    else:
+                        meta = data.get("meta") or {}
+                        sample.provider = meta.get("provider")
+                        sample.cache_hit = bool(meta.get("cache_hit"))
+                        sample.coalesced = bool(meta.get("coalesced"))
+                        sample.fallback_used = bool(meta.get("fallback_used"))
+                        session_id = data.get("session_id") or session_id
+            sample.stages = parse_server_timing(response.headers.get("server-timing"))
+            sample.db_queries = _db_queries(response)
+        sample.latency_ms = (time.perf_counter() - started) * 1000
+        return sample, session_id
+
+    async def run_session(self, client: httpx.AsyncClient, token: str) -> None:
+        session_id: str | None = None
+        for _ in range(self._rng.randint(self.config.min_turns, self.config.max_turns)):
+            kind, prompt = self.pick_prompt()
+            sample, session_id = await self.chat(client, token, session_id, kind, prompt)
+            self.samples.append(sample)
+
+    async def run(self) -> dict[str, Any]:
+        config = self.config
+        limits = httpx.Limits(max_connections=config.concurrency * 2, max_keepalive_connections=config.concurrency)
+        async with httpx.AsyncClient(base_url=config.base_url, timeout=config.timeout, limits=limits) as client:
+            mock_before = await self._mock_call(client, "POST", "/_mock/reset")
+            setup_started = time.perf_counter()
+            semaphore = asyncio.Semaphore(config.concurrency)
+
+            async def register(index: int) -> str | None:
+                async with semaphore:
+                    return await self.register(client, index)
+
+            tokens = [token for token in await asyncio.gather(*map(register, range(config.users))) if token]
+            setup_seconds = time.perf_counter() - setup_started
+            if not tokens:
+                raise SystemExit(f"Nie udało się przygotować żadnego użytkownika: {dict(self.setup_errors)}")
+
+            queue: asyncio.Queue[str] = asyncio.Queue()
+            for _ in range(config.sessions_per_user):
+                for token in tokens:
+                    queue.put_nowait(token)
+
+            async def worker() -> None:
+                while not queue.empty():
+                    await self.run_session(client, queue.get_nowait())
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(config.concurrency)))
+            elapsed = time.perf_counter() - started
+            mock_stats = await self._mock_call(client, "GET", "/_mock/stats") if mock_before is not None else None
+
+        return self.report(elapsed, setup_seconds, len(tokens), mock_stats)
+
+    async def _mock_call(self, client: httpx.AsyncClient, method: str, path: str) -> Any:
+        if not self.config.mock_url:
+            return None
+        try:
+            response = await client.request(method, f"{self.config.mock_url.rstrip('/')}{path}")
+            return response.json() if response.status_code == 200 else None
+        except (httpx.HTTPError, ValueError):
+            return None
+
+    def report(self, elapsed: float, setup_seconds: float, users: int, mock_stats: Any) -> dict[str, Any]:
+        ok = [sample for sample in self.samples if sample.error is None]
+        stages: dict[str, list[float]] = defaultdict(list)
+        for sample in ok:
+            for name, duration in sample.stages.items():
+                stages[name].append(duration)
+        db_queries = [float(sample.db_queries) for sample in self.samples if sample.db_queries is not None]
+        by_kind: dict[str, list[float]] = defaultdict(list)
+        for sample in ok:
+            by_kind[sample.kind].append(sample.latency_ms)
+
+        return {
+            "started_at": datetime.now(tz=UTC).isoformat(),
+            "config": asdict(self.config),
+            "users": users,
+            "setup_seconds": round(setup_seconds, 3),
+            "duration_seconds": round(elapsed, 3),
+            "requests": len(self.samples),
+            "succeeded": len(ok),
+            "throughput_rps": round(len(ok) / elapsed, 2) if elapsed > 0 else 0.0,
+            "latency_ms": distribution([sample.latency_ms for sample in ok]),
+            "ttft_ms": distribution([sample.ttft_ms for sample in ok if sample.ttft_ms is not None]),
+            "latency_by_prompt_kind_ms": {kind: distribution(values) for kind, values in sorted(by_kind.items())},
+            "stages_ms": {name: distribution(values) for name, values in sorted(stages.items())},
+            "db_queries_per_request": distribution(db_queries),
+            "errors": dict(Counter(sample.error for sample in self.samples if sample.error).most_common()),
+            "setup_errors": dict(self.setup_errors),
+            "providers": dict(Counter(sample.provider for sample in ok if sample.provider).most_common()),
+            "cache_hits": sum(sample.cache_hit for sample in ok),
+            "coalesced": sum(sample.coalesced for sample in ok),
+            "fallbacks": sum(sample.fallback_used for sample in ok),
+            "mock_provider_stats": mock_stats,
+        }
+
+
+def print_report(report: dict[str, Any], baseline: dict[str, Any] | None) -> None:
+    latency = report["latency_ms"]
+    print(
+        f"Żądania: {report['requests']} (udane {report['succeeded']}) w {report['duration_seconds']} s, "
+        f"przepustowość {report['throughput_rps']} req/s"
+    )
+    print(f"Latencja [ms]: p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} max={latency['max']}")
+    if report["ttft_ms"]["count"]:
+        ttft = report["ttft_ms"]
+        print(f"Pierwszy token [ms]: p50={ttft['p50']} p95={ttft['p95']} p99={ttft['p99']}")
+    for name, stage in report["stages_ms"].items():
+        print(f"  etap {name:<16} p50={stage['p50']} p95={stage['p95']} p99={stage['p99']}")
+    if report["db_queries_per_request"]["count"]:
+        queries = report["db_queries_per_request"]
+        print(f"Zapytania SQL na żądanie: średnio {queries['mean']}, p95={queries['p95']}, max={queries['max']}")
+    if report["errors"] or report["setup_errors"]:
+        print(f"Błędy: {report['errors']} przygotowanie: {report['setup_errors']}")
+    if baseline:
+        for label, current, previous in (
+            ("przepustowość", report["throughput_rps"], baseline.get("throughput_rps")),
+            ("p95", latency["p95"], (baseline.get("latency_ms") or {}).get("p95")),
+            ("p99", latency["p99"], (baseline.get("latency_ms") or {}).get("p99")),
+        ):
+            if current is not None and previous:
+                print(
+                    f"Względem poprzedniego przebiegu {label}: {previous} -> {current} ({current / previous - 1:+.1%})"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Test obciążenia ścieżki czatu (najlepiej z python -m app.mock_provider)"
+    )
+    parser.add_argument("--base-url", default=os.getenv("BACKEND_URL", "http://localhost:8000"))
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--sessions-per-user", type=int, default=1)
+    parser.add_argument("--turns", default="3-6", help="Długość sesji: N albo MIN-MAX tur")
+    parser.add_argument("--mix", default="short=3,question=4,code=2,long=1", help="Wagi rodzajów promptów")
+    parser.add_argument("--mode", default="eco")
+    parser.add_argument("--provider", default=None)
+    parser.add_argument("--stream", action="store_true", help="Używaj /api/v1/chat/stream")
+    parser.add_argument("--telegram-id-base", type=int, default=9_000_000_000)
+    parser.add_argument("--unlock-code", default=os.getenv("DEMO_UNLOCK_CODE", ""))
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mock-url", default=None, help="Adres serwera mock_provider (reset i statystyki)")
+    parser.add_argument("--report", type=Path, default=None, help="Plik JSON z raportem")
+    parser.add_argument("--compare", type=Path, default=None, help="Raport JSON z poprzedniego przebiegu")
+    parser.add_argument(
+        "--max-db-queries",
+        type=int,
+        default=None,
+        help="Budżet zapytań SQL na żądanie czatu (wymaga DB_QUERY_STATS_HEADERS=true w backendzie)",
+    )
+    args = parser.parse_args()
+
+    low, _, high = args.turns.partition("-")
+    config = LoadConfig(
+        base_url=args.base_url,
+        users=args.users,
+        concurrency=max(args.concurrency, 1),
+        sessions_per_user=max(args.sessions_per_user, 1),
+        min_turns=max(int(low), 1),
+        max_turns=max(int(high or low), int(low), 1),
+        mix=parse_mix(args.mix),
+        mode=args.mode,
+        provider=args.provider,
+        stream=args.stream,
+        telegram_id_base=args.telegram_id_base,
+        unlock_code=args.unlock_code,
+        timeout=args.timeout,
+        seed=args.seed,
+        mock_url=args.mock_url,
+    )
+    report = asyncio.run(LoadTest(config).run())
+    baseline = json.loads(args.compare.read_text(encoding="utf-8")) if args.compare else None
+    print_report(report, baseline)
+    if args.report:
+        args.report.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.max_db_queries is not None:
+        queries = report["db_queries_per_request"]
+        if not queries["count"]:
+            raise SystemExit("Backend nie zwraca nagłówka X-DB-Queries (ustaw DB_QUERY_STATS_HEADERS=true)")
+        if queries["max"] > args.max_db_queries:
+            raise SystemExit(f"Przekroczony budżet zapytań SQL: max {queries['max']} > {args.max_db_queries}")
+
+
+if __name__ == "__main__":
+    main()
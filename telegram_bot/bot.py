@@ -2,8 +2,9 @@ from __future__ import annotations
 
 import sys
 
-from config import settings
+from config import BotSettings, settings
 from handlers import register_all_handlers
+from middleware.logging_mw import TracedApplication
 from services.backend_client import BackendClient
 from telegram.ext import Application, ApplicationBuilder
 
@@ -18,21 +19,26 @@ async def _post_shutdown(app: Application) -> None:
         await backend_client.close()
 
 
-def main() -> None:
-    if not settings:
-        sys.exit(1)
-
+def build_application(bot_settings: BotSettings) -> Application:
     app = (
         ApplicationBuilder()
-        .token(settings.telegram_bot_token)
+        .application_class(TracedApplication)
+        .token(bot_settings.telegram_bot_token)
         .post_init(_post_init)
         .post_shutdown(_post_shutdown)
         .build()
     )
-    app.bot_data["settings"] = settings
+    app.bot_data["settings"] = bot_settings
 
     register_all_handlers(app)
-    app.run_polling()
+    return app
+
+
+def main() -> None:
+    if not settings:
+        sys.exit(1)
+
+    build_application(settings).run_polling()
 
 
 if __name__ == "__main__":
@@ -29,6 +29,8 @@ class BotSettings(BaseSettings):
     inline_enabled: bool = True
     image_gen_enabled: bool = True
     notebook_mode_enabled: bool = True
+    stream_replies_enabled: bool = True
+    stream_edit_interval: float = Field(1.2, description="Minimum seconds between streamed message edits")
     provider_policy_json: str = Field(
         '{"default":{"providers":{"gemini":{"enabled":true},"deepseek":{"enabled":true},"groq":{"enabled":true,"daily_usd_cap":1.0}}}}'
     )
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+from typing import Any
+
 from middleware.access_control import access_gate
 from services.backend_client import BackendClient
-from telegram import Update
+from telegram import Message, Update
 from telegram.ext import ContextTypes
+from utils.stream_editor import DEFAULT_EDIT_INTERVAL, StreamingReply
 
 MAX_MESSAGE_LEN = 4096
+UNAVAILABLE_TEXT = "Serwer chwilowo niedostępny. Spróbuj za chwilę."
 
 
 def _split_message(text: str, chunk_size: int = MAX_MESSAGE_LEN) -> list[str]:
@@ -26,7 +30,7 @@ async def handle(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     backend_client = context.bot_data.get("backend_client")
     if not isinstance(backend_client, BackendClient):
-        await message.reply_text("Serwer chwilowo niedostępny. Spróbuj za chwilę.")
+        await message.reply_text(UNAVAILABLE_TEXT)
         return
 
     token = context.user_data.get("backend_token")
@@ -38,25 +42,65 @@ async def handle(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     session_id = context.user_data.get("session_id")
     session_value = session_id if isinstance(session_id, str) else None
 
+    settings = context.bot_data.get("settings")
+    if getattr(settings, "stream_replies_enabled", True):
+        edit_interval = float(getattr(settings, "stream_edit_interval", DEFAULT_EDIT_INTERVAL))
+        await _reply_streamed(message, context, backend_client, token, session_value, mode, edit_interval)
+        return
+
     result = await backend_client.chat(token, message.text, session_value, None, mode)
     if result.get("ok") is False:
-        error_message = str(result.get("error", "Serwer chwilowo niedostępny. Spróbuj za chwilę."))
-        if "niedostępny" in error_message.lower():
-            await message.reply_text("Serwer chwilowo niedostępny. Spróbuj za chwilę.")
-            return
-        await message.reply_text("Brak dostępu. Użyj /unlock <kod>")
+        await message.reply_text(_error_text(result))
         return
 
     if isinstance(result.get("session_id"), str):
         context.user_data["session_id"] = result["session_id"]
 
-    answer = str(result.get("response", ""))
-    model = str(result.get("model", result.get("model_name", "model")))
-    cost = float(result.get("cost", result.get("cost_usd", 0.0)))
-    tokens = int(result.get("tokens", result.get("total_tokens", 0)))
-    latency = int(result.get("latency", result.get("latency_ms", 0)))
-    footer = f"\n\n🤖 {model} | 💳 ${cost:.4f} | ⚡ {tokens} tok | ⏱ {latency}ms"
-    full_message = f"{answer}{footer}"
-
+    full_message = f"{result.get('response', '')}{_format_footer(result)}"
     for chunk in _split_message(full_message):
         await message.reply_text(chunk)
+
+
+async def _reply_streamed(
+    message: Message,
+    context: ContextTypes.DEFAULT_TYPE,
+    backend_client: BackendClient,
+    token: str,
+    session_value: str | None,
+    mode: str,
+    edit_interval: float,
+) -> None:
+    reply = StreamingReply(message, edit_interval=edit_interval)
+    await reply.start()
+    async for event in backend_client.chat_stream(token, str(message.text), session_value, None, mode):
+        data = event.get("data")
+        data = data if isinstance(data, dict) else {}
+        if event.get("event") == "token":
+            await reply.append(str(data.get("delta", "")))
+        elif event.get("event") == "done":
+            if isinstance(data.get("session_id"), str):
+                context.user_data["session_id"] = data["session_id"]
+            await reply.finish(_format_footer(data))
+            return
+        elif event.get("event") == "error":
+            await reply.fail(_error_text(data))
+            return
+    await reply.fail(UNAVAILABLE_TEXT)
+
+
+def _error_text(result: dict[str, Any]) -> str:
+    error_message = str(result.get("error", UNAVAILABLE_TEXT))
+    if "niedostępny" in error_message.lower():
+        return UNAVAILABLE_TEXT
+    return "Brak dostępu. Użyj /unlock <kod>"
+
+
+def _format_footer(result: dict[str, Any]) -> str:
+    meta = result.get("meta") if isinstance(result.get("meta"), dict) else result
+    model = str(meta.get("model", meta.get("model_name", "model")))
+    cost = float(meta.get("cost", meta.get("cost_usd", 0.0)))
+    tokens = int(meta.get("tokens", meta.get("total_tokens", 0)))
+    if not tokens:
+        tokens = int(meta.get("input_tokens", 0)) + int(meta.get("output_tokens", 0))
+    latency = int(meta.get("latency", meta.get("latency_ms", 0)))
+    return f"\n\n🤖 {model} | 💳 ${cost:.4f} | ⚡ {tokens} tok | ⏱ {latency}ms"
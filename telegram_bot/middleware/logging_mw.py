@@ -3,16 +3,27 @@ from __future__ import annotations
 import logging
 import time
 
+from telegram.ext import Application
+from utils.tracing import trace_scope
+
 logger = logging.getLogger(__name__)
 
 
 async def logging_middleware(update, context, next_handler):
     start = time.time()
-    logger.info(f"Update {update.update_id} start")
-    try:
-        res = await next_handler(update, context)
-        logger.info(f"Update {update.update_id} end in {time.time() - start:.3f}s")
-        return res
-    except Exception as e:
-        logger.exception(f"Update {update.update_id} failed: {e}")
-        raise
+    update_id = getattr(update, "update_id", None)
+    with trace_scope() as trace_id:
+        logger.info(f"Update {update_id} start (trace {trace_id})")
+        try:
+            res = await next_handler(update, context)
+            logger.info(f"Update {update_id} end in {time.time() - start:.3f}s")
+            return res
+        except Exception as e:
+            logger.exception(f"Update {update_id} failed: {e}")
+            raise
+
+
+class TracedApplication(Application):
+    async def process_update(self, update: object) -> None:
+        dispatch = super().process_update
+        await logging_middleware(update, None, lambda pending, _context: dispatch(pending))
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import json
+from collections.abc import AsyncIterator
 from typing import Any
 
 import httpx
+from utils.tracing import trace_headers
 
 
 class BackendClient:
@@ -23,7 +26,7 @@ class BackendClient:
         params: dict[str, Any] | None = None,
     ) -> dict[str, Any]:
         url = f"{self.base_url}{path}"
-        headers: dict[str, str] = {}
+        headers = trace_headers()
         if token:
             headers["Authorization"] = f"Bearer {token}"
 
@@ -101,6 +104,72 @@ class BackendClient:
             },
         )
 
+    async def chat_stream(
+        self,
+        token: str,
+        prompt: str,
+        session_id: str | None,
+        provider: str | None,
+        mode: str,
+    ) -> AsyncIterator[dict[str, Any]]:
+        url = f"{self.base_url}/api/v1/chat/stream"
+        payload = {
+            "prompt": prompt,
+            "session_id": session_id,
+            "provider": provider,
+            "mode": mode,
+        }
+        headers = {**trace_headers(), "Authorization": f"Bearer {token}", "Accept": "text/event-stream"}
+        try:
+            async with self._client.stream(
+                "POST",
+                url,
+                headers=headers,
+                json=payload,
+                timeout=httpx.Timeout(30.0, read=120.0),
+            ) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    yield self._stream_error(response)
+                    return
+                event_name = "message"
+                async for line in response.aiter_lines():
+                    if line.startswith("event:"):
+                        event_name = line[6:].strip()
+                    elif line.startswith("data:"):
+                        data = json.loads(line[5:].strip())
+                        if event_name == "error":
+                            data = {
+                                "ok": False,
+                                "error": data.get("detail", "Błąd backendu"),
+                                "type": data.get("type"),
+                            }
+                        yield {"event": event_name, "data": data}
+                    elif not line:
+                        event_name = "message"
+        except (httpx.HTTPError, ValueError):
+            yield {
+                "event": "error",
+                "data": {"ok": False, "error": "Serwer chwilowo niedostępny. Spróbuj za chwilę."},
+            }
+
+    @staticmethod
+    def _stream_error(response: httpx.Response) -> dict[str, Any]:
+        error: Any = "Błąd backendu"
+        try:
+            payload = response.json()
+            if isinstance(payload, dict):
+                nested = payload.get("error")
+                if isinstance(nested, dict):
+                    error = nested.get("detail", error)
+                error = payload.get("detail", error)
+        except ValueError:
+            pass
+        return {
+            "event": "error",
+            "data": {"ok": False, "error": error, "status_code": response.status_code},
+        }
+
     async def get_usage(self, token: str, days: int) -> dict[str, Any]:
         return await self._request("GET", "/api/v1/usage/summary", token=token, params={"days": days})
 
@@ -4,6 +4,7 @@ import logging
 from typing import Any
 
 import httpx
+from utils.tracing import trace_headers
 
 logger = logging.getLogger(__name__)
 
@@ -45,7 +46,7 @@ class BaseService:
         self._client = httpx.AsyncClient(base_url=base_url, timeout=timeout)
 
     async def _request(self, method: str, path: str, token: str | None = None, **kwargs: Any) -> Any:
-        headers = kwargs.pop("headers", {})
+        headers = {**trace_headers(), **kwargs.pop("headers", {})}
         if token:
             headers["Authorization"] = f"Bearer {token}"
         try:
@@ -2,8 +2,13 @@ from __future__ import annotations
 
 import pytest
 import respx
+from bot import build_application
+from config import BotSettings
 from httpx import Response
 from services.backend_client import BackendClient
+from telegram import Update
+from telegram.ext import TypeHandler
+from utils.tracing import trace_scope
 
 
 @pytest.mark.asyncio
@@ -44,3 +49,102 @@ async def test_chat_backend_down_graceful() -> None:
 
     assert result["ok"] is False
     assert "niedostępny" in result["error"].lower()
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_parses_events() -> None:
+    body = 'event: token\ndata: {"delta": "Hej"}\n\nevent: done\ndata: {"response": "Hej", "session_id": "s"}\n\n'
+    async with respx.mock:
+        respx.post("http://b/api/v1/chat/stream").mock(
+            return_value=Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+        )
+        client = BackendClient("http://b")
+        events = [event async for event in client.chat_stream("tok", "hej", None, None, "smart")]
+        await client.close()
+
+    assert [event["event"] for event in events] == ["token", "done"]
+    assert events[0]["data"]["delta"] == "Hej"
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_http_error_becomes_error_event() -> None:
+    async with respx.mock:
+        respx.post("http://b/api/v1/chat/stream").mock(
+            return_value=Response(403, json={"error": {"type": "PolicyDeniedError", "detail": "Brak dostępu"}})
+        )
+        client = BackendClient("http://b")
+        events = [event async for event in client.chat_stream("tok", "hej", None, None, "smart")]
+        await client.close()
+
+    assert events == [
+        {"event": "error", "data": {"ok": False, "error": "Brak dostępu", "status_code": 403}},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_requests_carry_trace_context() -> None:
+    async with respx.mock:
+        route = respx.get("http://b/api/v1/auth/me").mock(return_value=Response(200, json={"id": "u"}))
+        client = BackendClient("http://b")
+        with trace_scope() as trace_id:
+            await client.get_me("tok")
+            await client.get_me("tok")
+        await client.close()
+
+    first, second = (call.request.headers for call in route.calls)
+    assert first["traceparent"].split("-")[1] == trace_id
+    assert second["traceparent"].split("-")[1] == trace_id
+    assert first["traceparent"] != second["traceparent"]
+    assert first["x-request-id"] == second["x-request-id"] == trace_id
+
+
+@pytest.mark.asyncio
+async def test_backend_calls_from_one_update_share_trace() -> None:
+    app = build_application(BotSettings())
+    client = BackendClient("http://b")
+
+    async def probe(update: Update, context) -> None:
+        await client.register(123)
+        await client.chat("tok", "hej", None, None, "smart")
+
+    app.add_handler(TypeHandler(Update, probe), group=1)
+    async with respx.mock:
+        respx.post("https://api.telegram.org/bott/getMe").mock(
+            return_value=Response(
+                200, json={"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "b", "username": "b"}}
+            )
+        )
+        register = respx.post("http://b/api/v1/auth/register").mock(
+            return_value=Response(200, json={"access_token": "tok"})
+        )
+        chat = respx.post("http://b/api/v1/chat/").mock(return_value=Response(200, json={"response": "ok"}))
+        await app.initialize()
+        try:
+            for update_id in (1, 2):
+                update = Update.de_json(
+                    {
+                        "update_id": update_id,
+                        "callback_query": {
+                            "id": str(update_id),
+                            "from": {"id": 123, "is_bot": False, "first_name": "u"},
+                            "chat_instance": "c",
+                            "data": "sonda",
+                        },
+                    },
+                    app.bot,
+                )
+                await app.process_update(update)
+        finally:
+            await app.shutdown()
+            await client.close()
+
+    traces = [
+        (
+            register.calls[index].request.headers["traceparent"].split("-")[1],
+            chat.calls[index].request.headers["traceparent"].split("-")[1],
+        )
+        for index in range(2)
+    ]
+    assert traces[0][0] == traces[0][1]
+    assert traces[1][0] == traces[1][1]
+    assert traces[0][0] != traces[1][0]
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from handlers import chat_handler
+from services.backend_client import BackendClient
+from utils.stream_editor import StreamingReply
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class SentMessage:
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.edits: list[str] = []
+
+    async def edit_text(self, text: str) -> None:
+        self.text = text
+        self.edits.append(text)
+
+
+class IncomingMessage:
+    def __init__(self, text: str = "") -> None:
+        self.text = text
+        self.sent: list[SentMessage] = []
+
+    async def reply_text(self, text: str, **_: Any) -> SentMessage:
+        sent = SentMessage(text)
+        self.sent.append(sent)
+        return sent
+
+
+@pytest.mark.asyncio
+async def test_edits_are_throttled() -> None:
+    clock = FakeClock()
+    incoming = IncomingMessage()
+    reply = StreamingReply(incoming, edit_interval=1.0, clock=clock)
+    await reply.start()
+
+    await reply.append("Ala ")
+    await reply.append("ma ")
+    clock.now = 1.5
+    await reply.append("kota")
+    await reply.append("!")
+    await reply.finish()
+
+    placeholder = incoming.sent[0]
+    assert placeholder.edits == ["Ala ma kota", "Ala ma kota!"]
+
+
+@pytest.mark.asyncio
+async def test_rolls_over_to_new_message_at_limit() -> None:
+    clock = FakeClock()
+    incoming = IncomingMessage()
+    reply = StreamingReply(incoming, edit_interval=1.0, limit=20, clock=clock)
+    await reply.start()
+
+    for word in ["jeden ", "dwa ", "trzy ", "cztery ", "pięć ", "sześć"]:
+        await reply.append(word)
+    await reply.finish()
+
+    assert len(incoming.sent) == 2
+    assert all(len(item.text) <= 20 for item in incoming.sent)
+    assert " ".join(item.text for item in incoming.sent) == "jeden dwa trzy cztery pięć sześć"
+
+
+@pytest.mark.asyncio
+async def test_handler_streams_backend_reply(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def fake_gate(*_: Any) -> bool:
+        return True
+
+    async def fake_stream(*_: Any) -> Any:
+        yield {"event": "token", "data": {"delta": "Cześć"}}
+        yield {
+            "event": "done",
+            "data": {
+                "response": "Cześć",
+                "session_id": "s-1",
+                "meta": {"model": "gemini", "cost_usd": 0.0, "input_tokens": 3, "output_tokens": 2},
+            },
+        }
+
+    monkeypatch.setattr(chat_handler, "access_gate", fake_gate)
+    backend = BackendClient("http://b")
+    backend.chat_stream = fake_stream  # type: ignore[method-assign]
+    incoming = IncomingMessage("Hej")
+    update = SimpleNamespace(effective_message=incoming)
+    context = SimpleNamespace(
+        user_data={"is_authorized": True, "backend_token": "tok"},
+        bot_data={"backend_client": backend},
+    )
+
+    await chat_handler.handle(update, context)
+    await backend.close()
+
+    assert len(incoming.sent) == 1
+    assert incoming.sent[0].text.startswith("Cześć\n\n🤖 gemini")
+    assert "5 tok" in incoming.sent[0].text
+    assert context.user_data["session_id"] == "s-1"
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Callable
+from typing import Any
+
+from telegram.error import BadRequest, RetryAfter, TelegramError
+from utils.message_splitter import split_message
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+DEFAULT_EDIT_INTERVAL = 1.2
+PLACEHOLDER = "⏳"
+
+
+class StreamingReply:
+    def __init__(
+        self,
+        reply_to: Any,
+        *,
+        edit_interval: float = DEFAULT_EDIT_INTERVAL,
+        limit: int = TELEGRAM_MESSAGE_LIMIT,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._reply_to = reply_to
+        self._edit_interval = edit_interval
+        self._limit = limit
+        self._clock = clock
+        self._current: Any = None
+        self._buffer = ""
+        self._shown = ""
+        self._next_edit_at = 0.0
+        self.messages: list[Any] = []
+
+    @property
+    def has_text(self) -> bool:
+        return bool(self._buffer.strip()) or len(self.messages) > 1
+
+    async def start(self, placeholder: str = PLACEHOLDER) -> None:
+        self._current = await self._reply_to.reply_text(placeholder)
+        self._shown = placeholder
+        self.messages.append(self._current)
+        self._next_edit_at = self._clock() + self._edit_interval
+
+    async def append(self, delta: str) -> None:
+        self._buffer += delta
+        await self._roll_over()
+        if self._clock() >= self._next_edit_at:
+            await self._edit(self._buffer)
+
+    async def finish(self, suffix: str = "") -> None:
+        self._buffer += suffix
+        await self._roll_over()
+        await self._edit(self._buffer or PLACEHOLDER, final=True)
+
+    async def fail(self, text: str) -> None:
+        if self.has_text:
+            await self.finish(f"\n\n{text}")
+            return
+        self._buffer = text
+        await self._edit(text, final=True)
+
+    async def _roll_over(self) -> None:
+        while len(self._buffer) > self._limit:
+            head = split_message(self._buffer, self._limit)[0]
+            self._buffer = self._buffer[len(head) :].lstrip()
+            await self._edit(head, final=True)
+            self._current = await self._reply_to.reply_text(self._buffer[: self._limit] or PLACEHOLDER)
+            self._shown = self._buffer[: self._limit] or PLACEHOLDER
+            self.messages.append(self._current)
+            self._next_edit_at = self._clock() + self._edit_interval
+
+    async def _edit(self, text: str, final: bool = False) -> None:
+        if self._current is None:
+            await self.start()
+        if text == self._shown:
+            return
+        for attempt in range(2):
+            try:
+                await self._current.edit_text(text)
+            except RetryAfter as exc:
+                delay = _retry_delay(exc)
+                self._next_edit_at = self._clock() + delay
+                if final and attempt == 0:
+                    await asyncio.sleep(delay)
+                    continue
+                if final:
+                    raise
+                return
+            except BadRequest as exc:
+                if "not modified" not in str(exc).lower() and final:
+                    raise
+                return
+            except TelegramError:
+                if final:
+                    raise
+                return
+            self._shown = text
+            self._next_edit_at = self._clock() + self._edit_interval
+            return
+
+
+def _retry_delay(exc: RetryAfter) -> float:
+    retry_after = exc.retry_after
+    if hasattr(retry_after, "total_seconds"):
+        return float(retry_after.total_seconds())
+    return float(retry_after)
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import secrets
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_trace_id: ContextVar[str | None] = ContextVar("bot_trace_id", default=None)
+
+
+@contextmanager
+def trace_scope(trace_id: str | None = None) -> Iterator[str]:
+    value = trace_id or secrets.token_hex(16)
+    token = _trace_id.set(value)
+    try:
+        yield value
+    finally:
+        _trace_id.reset(token)
+
+
+def current_trace_id() -> str | None:
+    return _trace_id.get()
+
+
+def trace_headers() -> dict[str, str]:
+    trace_id = _trace_id.get() or secrets.token_hex(16)
+    span_id = secrets.token_hex(8)
+    return {"traceparent": f"00-{trace_id}-{span_id}-01", "X-Request-ID": trace_id}